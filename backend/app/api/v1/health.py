@@ -1,4 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+from fastapi.responses import JSONResponse
+from ...db.embeddings import embedding_cache
+from ...utils.metrics import CONTENT_TYPE, registry
+from ...utils.warmup import warmup
 
 
 router = APIRouter(prefix='', tags=['health'])
@@ -12,3 +16,21 @@ async def main():
 @router.get("/health")
 async def read_root():
     return {"status": "healthy"}
+
+
+@router.get("/ready")
+async def ready():
+    """Readiness: 200 once startup warmup (database, vector index, OpenAI client) has finished, else 503"""
+    ready = await warmup.check()
+    return JSONResponse(warmup.status(), status_code=200 if ready else 503)
+
+
+@router.get("/health/embedding-cache")
+async def embedding_cache_stats():
+    return embedding_cache.stats()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: request and per-stage latency histograms, stage errors and LLM token usage"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from typing import Optional
+from app.schemas import JobStatus, JobSubmitted
+from ...utils.processing import job_queue, read_transcript_inputs, resolve_tenant, submit_report_job
+from ...utils.scheduler import BATCH, lane
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+router = APIRouter(prefix="/api/v1", tags=["jobs"])
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(
+    text: Optional[str] = Form(""),
+    file: Optional[UploadFile] = File(None),
+    tenant: Optional[str] = Form(None),
+) -> JobSubmitted:
+    """Queue a transcript for processing. Poll `/jobs/{job_id}` for the result."""
+    tenant = await resolve_tenant(tenant)
+    textarea_text, file_text = await read_transcript_inputs(text, file)
+    # Polled jobs aren't waited on interactively, so they yield to /transcript for OpenAI capacity
+    with lane(BATCH):
+        job_id = await submit_report_job(textarea_text, file_text, tenant)
+    logger.info(f"Queued transcript job {job_id}")
+    return JobSubmitted(job_id=job_id, status="queued")
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> JobStatus:
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatus(job_id=job.pop("id"), **job)
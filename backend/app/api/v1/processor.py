@@ -1,14 +1,22 @@
-from ...db.db import get_full_policy
-from fastapi import File, UploadFile, HTTPException, Form
-from typing import Optional
-from datetime import datetime
-from agents import Agent, Runner
-from app.schemas import PolicyProcessingResults, PolicyProcessingResultsWithFullPolicy
+from fastapi import File, UploadFile, HTTPException, Form, Header, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+from app import config
+from app.schemas import PolicyProcessingResultsWithFullPolicy
+from ...db.db import corpus_version
 from fastapi import APIRouter
-from ...utils.tools import search_policies
-from ...utils.file_processing import process_uploaded_file
+from ...utils.processing import (
+    generate_report,
+    generate_reports,
+    read_batch_inputs,
+    read_transcript,
+    resolve_tenant,
+    stream_report,
+)
+from ...utils.metrics import current_request
+from ...utils.result_cache import result_cache, result_key
+import json
 import logging
-import aiosqlite
 
 logger = logging.getLogger(__name__)
 
@@ -17,96 +25,39 @@ router = APIRouter(prefix="/api/v1",  tags=["report"])
 
 @router.post("/transcript")
 async def process_transcript(
+    response: Response,
     text: Optional[str] = Form(""),
-    file: Optional[UploadFile] = File(None)
+    file: Optional[UploadFile] = File(None),
+    tenant: Optional[str] = Form(None),
+    cache_control: Optional[str] = Header(None),
 ) -> PolicyProcessingResultsWithFullPolicy:
+    """
+    Only the policies of `tenant` (default DEFAULT_TENANT) are searched. Results are
+    cached per tenant, transcript and policy corpus version, and identical concurrent
+    submissions share one run. Send `Cache-Control: no-cache` to force a fresh run; the
+    `X-Cache` response header says how the result was served.
+    """
     try:
         logger.info("Processing transcript request")
-        textarea_text = text.strip() if text else ""
-        file_text = ""
-
-        # If file is provided, validate and extract content
-        if file:
-            try:
-                logger.info(f"Processing uploaded file: {file.filename}")
-                file_text = await process_uploaded_file(file)
-            except ValueError as e:
-                logger.warning(f"File validation error: {str(e)}")
-                raise HTTPException(status_code=400, detail=str(e))
-            except Exception as e:
-                logger.error(f"File processing error: {str(e)}", exc_info=True)
-                raise HTTPException(status_code=500, detail="Failed to process uploaded file")
-
-        # Ensure at least one source is provided
-        if not textarea_text and not file_text:
-            raise HTTPException(status_code=400, detail="Either text or file must be provided")
-
-        # Initialize agent
-        try:
-            agent = Agent(
-                name="Incident Reporter",
-                tools=[search_policies],
-                output_type=PolicyProcessingResults,
-            )
-        except Exception as e:
-            logger.error(f"Agent initialization error: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Failed to initialize processing agent")
-
-        current_time = datetime.now().isoformat()
-
-        # Build prompt with conditional logic
-        prompt_parts = [f"Current date and time: {current_time}\n"]
-        prompt_parts.append("Please find the associated policy using a summary description of the situation in this transcript and return the incident response form. Please fill out the incident report and draft any appropriate emails\n")
-
-        if textarea_text and file_text:
-            prompt_parts.append(f"Transcript from text area:\n{textarea_text}\n")
-            prompt_parts.append(f"Transcript from uploaded file:\n{file_text}")
-        elif file_text:
-            prompt_parts.append(f"Transcript: {file_text}")
-        else:
-            prompt_parts.append(f"Transcript: {textarea_text}")
-
-        prompt = "\n".join(prompt_parts)
-
-        # Run agent
-        try:
-            logger.info("Starting agent processing")
-            result = await Runner.run(agent, prompt)
-            final_output = result.final_output_as(PolicyProcessingResults)
-            logger.info(f"Agent processing complete. Policy IDs: {final_output.policy_ids}")
-        except Exception as e:
-            logger.error(f"Agent processing error: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Failed to process transcript with agent")
-
-        # Retrieve full policy texts
-        try:
-            if not final_output.policy_ids:
-                logger.warning("No policy IDs returned from agent processing")
-                policies_used = []
-                full_policy_texts = []
-            else:
-                policies_used = await get_full_policy(final_output.policy_ids)
-                full_policy_texts = [i["full_policy_text"] for i in policies_used]
-                logger.info(f"Retrieved {len(full_policy_texts)} unique policies")
-        except aiosqlite.Error as e:
-            logger.error(f"Database error retrieving policies: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Failed to retrieve policy information")
-        except KeyError as e:
-            logger.error(f"Missing expected field in policy data: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Invalid policy data structure")
-        except Exception as e:
-            logger.error(f"Unexpected error retrieving policies: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Failed to retrieve policy information")
-
-        logger.info("Transcript processing completed successfully")
-        return PolicyProcessingResultsWithFullPolicy(
-            policy_ids=final_output.policy_ids,
-            emails=final_output.emails,
-            report=final_output.report,
-            reasoning=final_output.reasoning,
-            full_policy_texts=full_policy_texts,
+        tenant = await resolve_tenant(tenant)
+        textarea_text, file_text, condensed = await read_transcript(text, file)
+
+        async def run() -> dict:
+            result = await generate_report(textarea_text, file_text, tenant, condensed)
+            logger.info("Transcript processing completed successfully")
+            return result.model_dump()
+
+        version = await corpus_version()
+        result, cache_status = await result_cache.get_or_run(
+            # A long upload was condensed while it was read; its condensed text is what the agent sees
+            result_key(textarea_text, file_text if condensed is None else condensed.text, version, tenant),
+            version,
+            run,
+            refresh="no-cache" in (cache_control or "").lower(),
         )
-
+        response.headers["X-Cache"] = cache_status
+        logger.info(f"Transcript result served with cache status {cache_status}")
+        return PolicyProcessingResultsWithFullPolicy.model_validate(result)
 
     except HTTPException:
         # Re-raise HTTPExceptions as-is
@@ -115,4 +66,83 @@ async def process_transcript(
         # Catch any unexpected errors
         logger.error(f"Unexpected error in process_transcript: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="An unexpected error occurred while processing the transcript")
-    
\ No newline at end of file
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post(
+    "/transcript/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def stream_transcript(
+    text: Optional[str] = Form(""),
+    file: Optional[UploadFile] = File(None),
+    tenant: Optional[str] = Form(None),
+):
+    """
+    Server-Sent Events variant of `/transcript`. Emits `transcript_condensed` (for a
+    long transcript), `tool_call`, `tool_result`, `report_field` and `email` events
+    while the agent runs, then a `final` event with
+    the same payload `/transcript` returns. Failures after the stream starts are sent
+    as an `error` event. With SERVER_TIMING on, a last `timing` event carries the
+    `Server-Timing` value for the whole request, as the header only covers the time to
+    the first byte.
+    """
+    logger.info("Processing streamed transcript request")
+    tenant = await resolve_tenant(tenant)
+    textarea_text, file_text, condensed = await read_transcript(text, file)
+
+    timings = current_request()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for event, data in stream_report(textarea_text, file_text, tenant, condensed):
+                yield sse_event(event, data)
+            logger.info("Streamed transcript processing completed successfully")
+        except HTTPException as e:
+            yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"Unexpected error in stream_transcript: {str(e)}", exc_info=True)
+            yield sse_event("error", {"status_code": 500, "detail": "An unexpected error occurred while processing the transcript"})
+        if config.SERVER_TIMING and timings is not None:
+            yield sse_event("timing", {"server_timing": timings.server_timing()})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/transcript/batch",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def process_transcript_batch(
+    files: list[UploadFile] = File(default=[]),
+    jsonl: Optional[UploadFile] = File(None),
+    tenant: Optional[str] = Form(None),
+):
+    """
+    Process many transcripts in one request. Accepts any number of .txt/.md `files`
+    and/or a `jsonl` upload with one `{"id": ..., "text": ...}` object per line.
+    Responds with NDJSON, one `BatchItemResult` per transcript in completion order;
+    a failing transcript produces a failed line instead of failing the batch. The
+    `Server-Timing` header only covers the time to the first line.
+    """
+    tenant = await resolve_tenant(tenant)
+    items = await read_batch_inputs(files, jsonl)
+    logger.info(f"Processing batch of {len(items)} transcripts")
+
+    async def lines() -> AsyncIterator[str]:
+        failed = 0
+        async for item in generate_reports(items, concurrency=config.BATCH_CONCURRENCY, tenant=tenant):
+            failed += item.status == "failed"
+            yield item.model_dump_json() + "\n"
+        logger.info(f"Batch complete: {len(items) - failed} succeeded, {failed} failed")
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
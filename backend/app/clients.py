@@ -1,3 +1,20 @@
-from openai import AsyncOpenAI
+from functools import cache
+from typing import TYPE_CHECKING
 
-client = AsyncOpenAI()
\ No newline at end of file
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+
+@cache
+def get_client() -> "AsyncOpenAI":
+    """
+    Shared OpenAI client, created on first use so importing the app doesn't load the SDK.
+    Every request it sends waits its turn in the app's rate-limit scheduler.
+    """
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    import httpx
+    from .utils.scheduled_transport import ScheduledTransport
+    from .utils.scheduler import scheduler
+
+    transport = ScheduledTransport(scheduler, httpx.AsyncHTTPTransport())
+    return AsyncOpenAI(http_client=DefaultAsyncHttpxClient(transport=transport))
@@ -0,0 +1,78 @@
+from os import getenv, path
+from os.path import join
+
+# Database
+DB_PATH = getenv("DB_PATH", join(path.dirname(__file__), "../db/askEmma.sqlite"))
+
+# Connection pool
+DB_POOL_SIZE = int(getenv("DB_POOL_SIZE", "4"))
+DB_POOL_TIMEOUT = float(getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+DB_POOL_IDLE_CHECK = float(getenv("DB_POOL_IDLE_CHECK", "30"))  # seconds idle before a connection is health-checked on checkout
+DB_MMAP_SIZE = int(getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+DB_CACHE_SIZE_KB = int(getenv("DB_CACHE_SIZE_KB", str(64 * 1024)))  # per connection
+DB_IMMUTABLE = getenv("DB_IMMUTABLE", "false").lower() in ("1", "true", "yes")  # open read-only + immutable; requires publish-swap ingestion
+
+# Tenants
+DEFAULT_TENANT = getenv("DEFAULT_TENANT", "default")  # corpus searched by requests without a tenant
+
+# Embeddings
+EMBEDDING_MODEL = getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_CACHE_PATH = getenv("EMBEDDING_CACHE_PATH", join(path.dirname(__file__), "../db/embedding_cache.sqlite"))
+EMBEDDING_CACHE_SIZE = int(getenv("EMBEDDING_CACHE_SIZE", "2048"))  # in-process LRU entries
+EMBEDDING_CACHE_MAX_ROWS = int(getenv("EMBEDDING_CACHE_MAX_ROWS", "100000"))  # persistent table rows
+EMBEDDING_CACHE_TTL = float(getenv("EMBEDDING_CACHE_TTL", str(30 * 24 * 60 * 60)))  # seconds
+
+# Search
+SEARCH_ENGINE = getenv("SEARCH_ENGINE", "vec0")  # "vec0" or "numpy" (requires the numpy extra)
+SEARCH_K = int(getenv("SEARCH_K", "10"))
+SEARCH_POLICIES = int(getenv("SEARCH_POLICIES", "0"))  # distinct policies per search, widening k as needed; 0 keeps the fixed SEARCH_K
+SEARCH_MATCHES_PER_POLICY = int(getenv("SEARCH_MATCHES_PER_POLICY", "3"))  # closest situations listed per policy when SEARCH_POLICIES is set
+SEARCH_K_GROWTH = int(getenv("SEARCH_K_GROWTH", "4"))  # factor k grows by while too few distinct policies are found
+SEARCH_MAX_QUERIES = int(getenv("SEARCH_MAX_QUERIES", "5"))  # descriptions searched per batched search_policies call
+SEARCH_MODE = getenv("SEARCH_MODE", "vector")  # "vector", "hybrid" (vector + FTS5 rank fusion) or "lexical" (FTS5 only)
+EMBEDDING_TIMEOUT = float(getenv("EMBEDDING_TIMEOUT", "2"))  # seconds hybrid search waits for vectors before answering lexically
+RRF_K = int(getenv("RRF_K", "60"))  # reciprocal rank fusion constant
+SEARCH_RERANK_FACTOR = int(getenv("SEARCH_RERANK_FACTOR", "4"))  # quantized shortlist size as a multiple of SEARCH_K
+SEARCH_CONTEXT_TOKENS = int(getenv("SEARCH_CONTEXT_TOKENS", "4000"))  # estimated tokens of policy text one search returns; 0 for no limit
+INDEX_REFRESH_INTERVAL = float(getenv("INDEX_REFRESH_INTERVAL", "5"))  # seconds between DB change checks
+
+# Retrieval
+RETRIEVAL_MODE = getenv("RETRIEVAL_MODE", "tool")  # "tool" (agent calls search_policies) or "pre" (search before the agent runs)
+PRE_RETRIEVAL_MAX_DISTANCE = float(getenv("PRE_RETRIEVAL_MAX_DISTANCE", "1.0"))  # worse best match falls back to tool calling
+PRE_RETRIEVAL_POLICIES = int(getenv("PRE_RETRIEVAL_POLICIES", "3"))  # matched policies put in the prompt
+PRE_RETRIEVAL_QUERY_CHARS = int(getenv("PRE_RETRIEVAL_QUERY_CHARS", "4000"))  # transcript prefix embedded as the query
+
+# Generation
+GENERATION_MODE = getenv("GENERATION_MODE", "single")  # "single" (one agent writes everything) or "parallel" (report, each email recipient and reasoning written concurrently)
+
+# Long transcripts
+TRANSCRIPT_COMPACTION = getenv("TRANSCRIPT_COMPACTION", "true").lower() in ("1", "true", "yes")  # strip timestamps, filler and duplicates before the model
+TRANSCRIPT_MAX_BYTES = int(getenv("TRANSCRIPT_MAX_BYTES", str(2_000_000)))  # uploaded transcript size limit
+TRANSCRIPT_CONDENSE_TOKENS = int(getenv("TRANSCRIPT_CONDENSE_TOKENS", "24000"))  # longer transcripts are condensed chunk by chunk first; 0 never condenses
+TRANSCRIPT_CHUNK_TOKENS = int(getenv("TRANSCRIPT_CHUNK_TOKENS", "4000"))
+TRANSCRIPT_MAP_CONCURRENCY = int(getenv("TRANSCRIPT_MAP_CONCURRENCY", "8"))  # chunks of one transcript condensed at once
+TRANSCRIPT_SUMMARY_MODEL = getenv("TRANSCRIPT_SUMMARY_MODEL", "gpt-4o-mini")
+
+# Job queue
+JOBS_DB_PATH = getenv("JOBS_DB_PATH", join(path.dirname(__file__), "../db/jobs.sqlite"))
+JOB_WORKERS = int(getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION = float(getenv("JOB_RETENTION", str(7 * 24 * 60 * 60)))  # seconds finished jobs are kept
+JOB_LEASE = float(getenv("JOB_LEASE", "30"))  # seconds a stopped worker's jobs wait before another takes them over
+
+# Batch processing
+BATCH_CONCURRENCY = int(getenv("BATCH_CONCURRENCY", "4"))  # transcripts processed at once per batch request
+BATCH_MAX_ITEMS = int(getenv("BATCH_MAX_ITEMS", "1000"))
+
+# OpenAI request scheduling (0 disables a limit)
+OPENAI_REQUESTS_PER_MINUTE = int(getenv("OPENAI_REQUESTS_PER_MINUTE", "0"))  # set to the account's limits; the tokens are estimates
+OPENAI_TOKENS_PER_MINUTE = int(getenv("OPENAI_TOKENS_PER_MINUTE", "0"))
+OPENAI_MAX_CONCURRENCY = int(getenv("OPENAI_MAX_CONCURRENCY", "0"))  # requests in flight at once
+OPENAI_OUTPUT_TOKENS_ESTIMATE = int(getenv("OPENAI_OUTPUT_TOKENS_ESTIMATE", "1500"))  # tokens budgeted per model response
+
+# Observability
+SERVER_TIMING = getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")  # per-stage Server-Timing response header
+
+# Transcript result cache
+RESULT_CACHE_SIZE = int(getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_TTL = float(getenv("RESULT_CACHE_TTL", str(60 * 60)))  # seconds
@@ -1,117 +1,577 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass
 import aiosqlite
-import sqlite_vec
-from os import path
-from os.path import join
-import struct
-import hashlib
-from ..clients import client
+from typing import Awaitable, Callable, Optional, Union
+from .. import config
+from .embeddings import deserialize, embed_many, serialize
+from .pool import pool
+from .vector_index import vector_index
+from ..utils.metrics import span
 import logging
 
 logger = logging.getLogger(__name__)
 
-db_path = join(path.dirname(__file__), "../../db/askEmma.sqlite")
+SEARCH_ENGINES = ("vec0", "numpy")
+SEARCH_MODES = ("vector", "hybrid", "lexical")
 
+# Words too common in transcripts to be worth matching on
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her his i in is it its me my of on or our she so "
+    "that the their them then there they this to was we were what when which who will with you your".split()
+)
+_MAX_QUERY_TERMS = 64
+
+# Quantizers matching the first-pass column ingestion builds in vec_situations_quantized
+QUANTIZERS = {"int8": "vec_quantize_int8(?, 'unit')", "binary": "vec_quantize_binary(?)"}
+
+# sqlite-vec's upper bound on k in a KNN query
+_MAX_KNN_K = 4096
+
+# Rough size of retrieved text, as ingestion estimates it
+_CHARS_PER_TOKEN = 4
+
+# Keeps the closest situations of each policy in `knn` (id, distance), as many per policy as
+# the trailing parameter allows, and attaches their policy text
+_BEST_PER_POLICY = """
+            ranked AS (
+                SELECT
+                    knn.id,
+                    knn.distance,
+                    situations.policy_id,
+                    situations.situation_description,
+                    ROW_NUMBER() OVER (PARTITION BY situations.policy_id ORDER BY knn.distance) AS policy_rank
+                FROM knn
+                JOIN situations ON situations.id = knn.id
+            )
+            SELECT
+                ranked.id,
+                ranked.distance,
+                ranked.policy_id,
+                policies.full_policy_text,
+                ranked.situation_description
+            FROM ranked
+            JOIN policies ON policies.id = ranked.policy_id
+            WHERE policy_rank <= ?
+            ORDER BY ranked.distance
+"""
+
+
+@dataclass(frozen=True)
+class CorpusSettings:
+    dimensions: Optional[int] = None  # None: the embedding model's default
+    quantization: str = "none"
+
+
+_corpus_settings: Optional[tuple[float, CorpusSettings]] = None
+_tenants: Optional[tuple[float, frozenset[str]]] = None
+
+
+async def corpus_settings() -> CorpusSettings:
+    """Embedding settings ingestion built the corpus with, re-read every INDEX_REFRESH_INTERVAL seconds"""
+    global _corpus_settings
+    now = time.monotonic()
+    if _corpus_settings is not None and now - _corpus_settings[0] < config.INDEX_REFRESH_INTERVAL:
+        return _corpus_settings[1]
 
-async def get_db():
-    """Get database connection with sqlite-vec loaded"""
     try:
-        if not path.exists(db_path):
-            logger.error(f"Database file not found at path: {db_path}")
-            raise FileNotFoundError(f"Database file not found: {db_path}")
-
-        conn = await aiosqlite.connect(db_path)
-        await conn.enable_load_extension(True)
-        await conn.load_extension(sqlite_vec.loadable_path())
-        await conn.enable_load_extension(False)
-        return conn
-    except aiosqlite.Error as e:
-        logger.error(f"Failed to connect to database: {str(e)}", exc_info=True)
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error in get_db: {str(e)}", exc_info=True)
-        raise
+        async with pool.acquire() as db, db.execute("SELECT key, value FROM corpus_settings") as cur:
+            stored = {r["key"]: r["value"] for r in await cur.fetchall()}
+    except aiosqlite.OperationalError:
+        # Database predates corpus settings: full-size float vectors only
+        stored = {}
+    settings = CorpusSettings(
+        dimensions=int(stored["embedding_dimensions"]) if "embedding_dimensions" in stored else None,
+        quantization=stored.get("quantization", "none"),
+    )
+    _corpus_settings = (now, settings)
+    return settings
+
+
+async def tenants() -> frozenset[str]:
+    """Tenants with at least one ingested policy, re-read every INDEX_REFRESH_INTERVAL seconds"""
+    global _tenants
+    now = time.monotonic()
+    if _tenants is not None and now - _tenants[0] < config.INDEX_REFRESH_INTERVAL:
+        return _tenants[1]
+
+    async with pool.acquire() as db, db.execute("SELECT DISTINCT tenant FROM policies") as cur:
+        found = frozenset(r["tenant"] for r in await cur.fetchall())
+    _tenants = (now, found)
+    return found
+
+
+async def vec0_search(
+    query_embedding: list[float],
+    k: int,
+    db: Optional[aiosqlite.Connection] = None,
+    per_policy: int = 1,
+    tenant: str = config.DEFAULT_TENANT,
+) -> list[dict]:
+    """
+    KNN over the vec0 virtual table, keeping the closest of the `k` situations for each
+    policy (or the closest `per_policy`). Deduplication happens on policy_id in SQL so
+    each policy text is read once. Runs on `db` when given, otherwise on a pooled connection.
+    The tenant is the table's partition key, so only that tenant's vectors are scanned.
+    """
+    if db is None:
+        async with pool.acquire() as db:
+            return await vec0_search(query_embedding, k, db, per_policy, tenant)
+    async with db.execute(
+        """
+            WITH knn AS (
+                SELECT id, distance
+                FROM vec_situations
+                WHERE situation_embedding MATCH ?
+                    AND k = ?
+                    AND tenant = ?
+            ),
+        """ + _BEST_PER_POLICY,
+        [serialize(query_embedding), k, tenant, per_policy],
+    ) as cur:
+        rows = await cur.fetchall()
+        return [dict(r) for r in rows]
+
+
+async def quantized_search(
+    query_embedding: list[float],
+    k: int,
+    quantization: str,
+    rerank_factor: int = config.SEARCH_RERANK_FACTOR,
+    db: Optional[aiosqlite.Connection] = None,
+    per_policy: int = 1,
+    tenant: str = config.DEFAULT_TENANT,
+) -> list[dict]:
+    """
+    Two-pass variant of `vec0_search`: a KNN over the int8 or binary quantized column
+    shortlists `k * rerank_factor` situations, which are re-ranked by exact L2 distance
+    against the full-precision vectors before the top `k` are deduplicated by policy.
+    """
+    if db is None:
+        async with pool.acquire() as db:
+            return await quantized_search(query_embedding, k, quantization, rerank_factor, db, per_policy, tenant)
+    query = serialize(query_embedding)
+    async with db.execute(
+        f"""
+            WITH shortlist AS (
+                SELECT id
+                FROM vec_situations_quantized
+                WHERE situation_embedding MATCH {QUANTIZERS[quantization]}
+                    AND k = ?
+                    AND tenant = ?
+            ),
+            knn AS (
+                SELECT shortlist.id, vec_distance_l2(vec_situations.situation_embedding, ?) AS distance
+                FROM shortlist
+                JOIN vec_situations ON vec_situations.id = shortlist.id
+                ORDER BY distance
+                LIMIT ?
+            ),
+        """ + _BEST_PER_POLICY,
+        [query, k * rerank_factor, tenant, query, k, per_policy],
+    ) as cur:
+        rows = await cur.fetchall()
+        return [dict(r) for r in rows]
+
+
+async def warm_index():
+    """
+    Run one KNN query per tenant with a stored vector so sqlite-vec's chunks are paged
+    into the mmap and SQLite caches before the first request pays for it.
+    """
+    started = time.perf_counter()
+    settings = await corpus_settings()
+    async with pool.acquire() as db:
+        for tenant in await tenants():
+            async with db.execute(
+                """
+                    SELECT situation_embedding FROM vec_situations
+                    WHERE id = (
+                        SELECT situations.id FROM situations
+                        JOIN policies ON policies.id = situations.policy_id
+                        WHERE policies.tenant = ?
+                        LIMIT 1
+                    )
+                """,
+                [tenant],
+            ) as cur:
+                row = await cur.fetchone()
+            if row is None:
+                continue
+            embedding = deserialize(row[0])
+            if settings.quantization in QUANTIZERS:
+                await quantized_search(embedding, k=config.SEARCH_K, quantization=settings.quantization, db=db, tenant=tenant)
+            else:
+                await vec0_search(embedding, k=config.SEARCH_K, db=db, tenant=tenant)
+    logger.info(f"Warmed vector index in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+def fts_query(text: str) -> str:
+    """OR of the distinct, non-trivial words of `text`, quoted so FTS5 syntax in the text is inert"""
+    terms = []
+    for word in re.findall(r"\w+", text.casefold()):
+        if len(word) > 2 and word not in _STOPWORDS and word not in terms:
+            terms.append(word)
+    return " OR ".join(f'"{term}"' for term in terms[:_MAX_QUERY_TERMS])
+
+
+async def lexical_search(description: str, k: int, tenant: str = config.DEFAULT_TENANT) -> list[dict]:
+    """
+    BM25 search over `fts_situations` and `fts_policies`, returning the top `k` policies
+    of `tenant` by reciprocal rank fusion of the two rankings. Each policy is represented
+    by its best matching situation, or its first situation if only the policy text
+    matched. Results have no vector distance.
+    """
+    query = fts_query(description)
+    if not query:
+        return []
+    async with pool.acquire() as db, db.execute(
+        """
+            WITH situation_hits AS (
+                SELECT fts_situations.rowid AS id, bm25(fts_situations) AS score
+                FROM fts_situations
+                JOIN situations ON situations.id = fts_situations.rowid
+                JOIN policies ON policies.id = situations.policy_id
+                WHERE fts_situations MATCH ?
+                    AND policies.tenant = ?
+                ORDER BY score
+                LIMIT ?
+            ),
+            best_situations AS (
+                SELECT
+                    situation_hits.id,
+                    situations.policy_id,
+                    situations.situation_description,
+                    ROW_NUMBER() OVER (PARTITION BY situations.policy_id ORDER BY situation_hits.score) AS policy_rank,
+                    situation_hits.score
+                FROM situation_hits
+                JOIN situations ON situations.id = situation_hits.id
+            ),
+            policy_hits AS (
+                SELECT fts_policies.rowid AS policy_id, bm25(fts_policies) AS score
+                FROM fts_policies
+                JOIN policies ON policies.id = fts_policies.rowid
+                WHERE fts_policies MATCH ?
+                    AND policies.tenant = ?
+                ORDER BY score
+                LIMIT ?
+            ),
+            fused AS (
+                SELECT policy_id, SUM(1.0 / (? + rank)) AS score
+                FROM (
+                    SELECT policy_id, ROW_NUMBER() OVER (ORDER BY score) AS rank FROM best_situations WHERE policy_rank = 1
+                    UNION ALL
+                    SELECT policy_id, ROW_NUMBER() OVER (ORDER BY score) AS rank FROM policy_hits
+                )
+                GROUP BY policy_id
+            )
+            SELECT
+                COALESCE(best_situations.id, first_situation.id) AS id,
+                NULL AS distance,
+                fused.policy_id,
+                policies.full_policy_text,
+                COALESCE(best_situations.situation_description, first_situation.situation_description) AS situation_description
+            FROM fused
+            JOIN policies ON policies.id = fused.policy_id
+            LEFT JOIN best_situations ON best_situations.policy_id = fused.policy_id AND best_situations.policy_rank = 1
+            LEFT JOIN situations AS first_situation ON first_situation.id = (
+                SELECT MIN(id) FROM situations WHERE situations.policy_id = fused.policy_id
+            )
+            ORDER BY fused.score DESC
+            LIMIT ?
+        """,
+        [query, tenant, k * 4, query, tenant, k, config.RRF_K, k],
+    ) as cur:
+        rows = await cur.fetchall()
+        return [dict(r) for r in rows if r["id"] is not None]
+
+
+def reciprocal_rank_fusion(rankings: list[list[dict]], k: int) -> list[dict]:
+    """
+    Merge per-policy result lists by summing 1 / (RRF_K + rank) for each policy. A policy
+    keeps the row from the first list it appears in, so vector rows keep their distance.
+    """
+    scores: dict[int, float] = {}
+    rows: dict[int, dict] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row["policy_id"]] = scores.get(row["policy_id"], 0.0) + 1.0 / (config.RRF_K + rank)
+            rows.setdefault(row["policy_id"], row)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [rows[policy_id] for policy_id in ordered[:k]]
 
 
-def serialize(vector: list[float]) -> bytes:
-    """serializes a list of floats into a compact "raw bytes" format"""
-    return struct.pack("%sf" % len(vector), *vector)
+def merge_results(result_lists: list[list[dict]], k: int) -> list[dict]:
+    """Union of several vector searches, keeping each policy's closest situation, top `k` by distance"""
+    best: dict[int, dict] = {}
+    for results in result_lists:
+        for row in results:
+            current = best.get(row["policy_id"])
+            if current is None or row["distance"] < current["distance"]:
+                best[row["policy_id"]] = row
+    return sorted(best.values(), key=lambda row: row["distance"])[:k]
 
 
-async def search_situation(description: str):
-    if not description or not description.strip():
+def group_by_policy(rows: list[dict], policies: int, per_policy: int) -> list[dict]:
+    """
+    Collapse situation rows (from one or several searches) into the `policies` closest
+    policies. Each is represented by its closest situation and lists up to `per_policy`
+    of its closest situations under `matches`.
+    """
+    best_rows: dict[int, dict] = {}
+    for row in rows:
+        if row["id"] not in best_rows or row["distance"] < best_rows[row["id"]]["distance"]:
+            best_rows[row["id"]] = row
+
+    grouped: dict[int, dict] = {}
+    for row in sorted(best_rows.values(), key=lambda row: row["distance"]):
+        policy = grouped.get(row["policy_id"])
+        if policy is None:
+            if len(grouped) == policies:
+                continue
+            policy = grouped[row["policy_id"]] = {**row, "matches": []}
+        if len(policy["matches"]) < per_policy:
+            policy["matches"].append(
+                {"id": row["id"], "distance": row["distance"], "situation_description": row["situation_description"]}
+            )
+    return list(grouped.values())
+
+
+async def expand_k(search: Callable[[int], Awaitable[list[dict]]], policies: int, situations: Callable[[], Awaitable[int]]) -> list[dict]:
+    """
+    Run `search(k)` with k growing by SEARCH_K_GROWTH until its rows cover `policies`
+    distinct policies, k covers every situation, or k reaches sqlite-vec's limit.
+    The situation count is only looked up if the first search falls short.
+    """
+    k = min(max(config.SEARCH_K, policies), _MAX_KNN_K)
+    total: Optional[int] = None
+    while True:
+        rows = await search(k)
+        if len({row["policy_id"] for row in rows}) >= policies or k >= _MAX_KNN_K:
+            return rows
+        if total is None:
+            total = await situations()
+        if k >= total:
+            return rows
+        k = min(k * config.SEARCH_K_GROWTH, total, _MAX_KNN_K)
+        logger.info(f"Fewer than {policies} distinct policies found, widening search to k={k}")
+
+
+async def search_situation(
+    description: Union[str, list[str]],
+    engine: Optional[str] = None,
+    mode: Optional[str] = None,
+    policies: Optional[int] = None,
+    tenant: Optional[str] = None,
+):
+    """
+    Find the policies of `tenant` (default DEFAULT_TENANT) closest to `description`, or
+    to any of several descriptions. Other tenants' policies are never searched.
+
+    `mode` is `vector` (embedding search only), `lexical` (FTS5 only, no OpenAI call) or
+    `hybrid`, which runs both concurrently and fuses them with reciprocal rank fusion.
+    In hybrid mode an embedding that fails or takes longer than EMBEDDING_TIMEOUT falls
+    back to the lexical results.
+
+    A list of descriptions is searched in one go: one embeddings request, every KNN
+    lookup on one connection, and results merged by policy with the best distance of
+    any description. Lexical search matches the terms of all of them at once.
+
+    `policies` (default SEARCH_POLICIES; 0 disables it) asks for that many distinct
+    policies instead of whatever the SEARCH_K nearest situations cover: vector search
+    widens k until enough policies are found, and each result lists its closest
+    situations under `matches`.
+    """
+    engine = engine or config.SEARCH_ENGINE
+    if engine not in SEARCH_ENGINES:
+        raise ValueError(f"Unknown search engine: {engine}")
+    mode = mode or config.SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+
+    descriptions = [description] if isinstance(description, str) else list(description or [])
+    descriptions = list(dict.fromkeys(d.strip() for d in descriptions if d and d.strip()))
+    if not descriptions:
         logger.warning("Empty description provided to search_situation")
         return []
+    if len(descriptions) > config.SEARCH_MAX_QUERIES:
+        logger.warning(f"Searching the first {config.SEARCH_MAX_QUERIES} of {len(descriptions)} descriptions")
+        descriptions = descriptions[:config.SEARCH_MAX_QUERIES]
+    text = "\n".join(descriptions)
+    policies = config.SEARCH_POLICIES if policies is None else policies
+    k = policies or config.SEARCH_K
+    tenant = tenant or config.DEFAULT_TENANT
+
+    if mode == "vector":
+        return await attach_sections(await vector_search(descriptions, engine, policies, tenant))
+    if mode == "lexical":
+        with span("lexical_query"):
+            result = await lexical_search(text, k=k, tenant=tenant)
+        logger.info(f"Lexical search returned {len(result)} unique policies")
+        return await attach_sections(result)
 
-    db = None
+    vector = asyncio.create_task(vector_search(descriptions, engine, policies, tenant))
     try:
-        # Generate embedding
+        with span("lexical_query"):
+            lexical = await lexical_search(text, k=k, tenant=tenant)
+    except aiosqlite.OperationalError as e:
+        # e.g. a database ingested before the full-text indexes existed
+        logger.warning(f"Lexical search unavailable, using vector search only: {str(e)}")
+        lexical = []
+    except BaseException:
+        # The search failed or the request went away: the vector half is wasted work
+        vector.cancel()
+        await asyncio.gather(vector, return_exceptions=True)
+        raise
+    try:
+        # Shielded so a slow embedding still completes and lands in the embedding cache.
+        # Without lexical results there is nothing to fall back to, so wait it out.
+        timeout = config.EMBEDDING_TIMEOUT if lexical else None
+        result = await asyncio.wait_for(asyncio.shield(vector), timeout=timeout)
+    except asyncio.CancelledError:
+        vector.cancel()
+        await asyncio.gather(vector, return_exceptions=True)
+        raise
+    except Exception as e:
+        if not lexical:
+            raise
+        vector.add_done_callback(lambda task: task.cancelled() or task.exception())
+        reason = "timed out" if isinstance(e, asyncio.TimeoutError) else "failed"
+        logger.warning(f"Vector search {reason}, serving {len(lexical)} lexical results")
+        return await attach_sections(lexical)
+
+    result = reciprocal_rank_fusion([result, lexical], k=k)
+    logger.info(f"Hybrid search returned {len(result)} unique policies")
+    return await attach_sections(result)
+
+
+async def attach_sections(results: list[dict], budget: Optional[int] = None) -> list[dict]:
+    """
+    Swap each result's full policy text for the sections its matched situations were
+    linked to at ingestion, in document order, and add the policy's path as a reference
+    to the whole policy. Results whose policy has no sections keep the full text.
+
+    Results are kept in rank order until their text would take the retrieved context
+    over `budget` estimated tokens (default SEARCH_CONTEXT_TOKENS; 0 for no limit). The
+    first result is always kept.
+    """
+    if not results:
+        return results
+    budget = config.SEARCH_CONTEXT_TOKENS if budget is None else budget
+    situation_ids = {m["id"] for r in results for m in [r, *(r.get("matches") or [])]}
+
+    try:
+        with span("section_lookup"):
+            async with pool.acquire() as db, db.execute(
+                """
+                    SELECT
+                        situations.id AS situation_id,
+                        policies.policy_path,
+                        policy_sections.id,
+                        policy_sections.position,
+                        policy_sections.heading,
+                        policy_sections.section_text
+                    FROM situations
+                    JOIN policies ON policies.id = situations.policy_id
+                    LEFT JOIN policy_sections ON policy_sections.id = situations.section_id
+                    WHERE situations.id IN ({})
+                """.format(",".join("?" * len(situation_ids))),
+                list(situation_ids),
+            ) as cur:
+                linked = {r["situation_id"]: dict(r) for r in await cur.fetchall()}
+    except aiosqlite.OperationalError as e:
+        # e.g. a database ingested before policies were split into sections
+        logger.warning(f"Policy sections unavailable, returning full policy texts: {str(e)}")
+        linked = {}
+
+    kept, used = [], 0
+    for result in results:
+        rows = [linked[m["id"]] for m in [result, *(result.get("matches") or [])] if m["id"] in linked]
+        sections = {row["id"]: row for row in rows if row["id"] is not None}
+        result = {**result, "policy_path": rows[0]["policy_path"] if rows else None}
+        if sections:
+            ordered = sorted(sections.values(), key=lambda row: row["position"])
+            result["sections"] = [
+                {"id": row["id"], "heading": row["heading"], "section_text": row["section_text"]} for row in ordered
+            ]
+            result["full_policy_text"] = None
+            size = sum(len(row["section_text"]) for row in ordered)
+        else:
+            size = len(result["full_policy_text"] or "")
+
+        cost = size // _CHARS_PER_TOKEN + 1
+        if budget and kept and used + cost > budget:
+            logger.info(f"Context budget of {budget} tokens reached, returning {len(kept)} of {len(results)} policies")
+            break
+        kept.append(result)
+        used += cost
+    return kept
+
+
+async def vector_search(descriptions: list[str], engine: str, policies: int = 0, tenant: str = config.DEFAULT_TENANT):
+    try:
+        settings = await corpus_settings()
+
+        # Generate embeddings
         try:
-            logger.info("Generating embedding for search")
-            response = await client.embeddings.create(
-                input=description, model="text-embedding-3-small"
-            )
-            query_embedding = response.data[0].embedding
+            logger.info(f"Generating {len(descriptions)} embeddings for search")
+            with span("embedding"):
+                query_embeddings = await embed_many(descriptions, dimensions=settings.dimensions)
         except Exception as e:
             logger.error(f"Failed to create embedding: {str(e)}", exc_info=True)
             raise RuntimeError(f"Embedding generation failed: {str(e)}")
 
-        # Connect to database
-        db = await get_db()
-        db.row_factory = aiosqlite.Row
+        # Execute queries
+        per_policy = config.SEARCH_MATCHES_PER_POLICY if policies else 1
+
+        async def run_queries(db: Optional[aiosqlite.Connection]) -> list[list[dict]]:
+            async def knn(embedding: list[float], k: int) -> list[dict]:
+                if engine == "numpy":
+                    return await vector_index.search(embedding, k=k, per_policy=per_policy, tenant=tenant)
+                if settings.quantization in QUANTIZERS:
+                    return await quantized_search(
+                        embedding, k=k, quantization=settings.quantization, db=db, per_policy=per_policy, tenant=tenant
+                    )
+                return await vec0_search(embedding, k=k, db=db, per_policy=per_policy, tenant=tenant)
+
+            async def situations() -> int:
+                if engine == "numpy":
+                    return vector_index.tenant_size(tenant)
+                async with db.execute(
+                    "SELECT COUNT(*) FROM situations JOIN policies ON policies.id = situations.policy_id WHERE policies.tenant = ?",
+                    [tenant],
+                ) as cur:
+                    return (await cur.fetchone())[0]
+
+            if not policies:
+                return [await knn(e, config.SEARCH_K) for e in query_embeddings]
+            return [await expand_k(lambda k, e=e: knn(e, k), policies, situations) for e in query_embeddings]
 
-        # Execute query
         try:
-            async with db.execute(
-                """
-                    SELECT
-                        vec_situations.id,
-                        distance,
-                        full_policy_text,
-                        situation_description
-                    FROM vec_situations
-                    LEFT JOIN situations ON situations.id = vec_situations.id
-                    WHERE situation_embedding MATCH ?
-                        AND k = 10
-                    ORDER BY distance
-                """,
-                [serialize(query_embedding)],
-            ) as cur:
-                rows = await cur.fetchall()
-                result = [dict(r) for r in rows]
-                logger.info(f"Vector search returned {len(result)} situations")
+            with span("vector_query"):
+                if engine == "numpy":
+                    results = await run_queries(None)
+                else:
+                    async with pool.acquire() as db:
+                        results = await run_queries(db)
+            if policies:
+                result = group_by_policy([row for rows in results for row in rows], policies, per_policy)
+            else:
+                result = results[0] if len(results) == 1 else merge_results(results, k=config.SEARCH_K)
+            logger.info(f"Vector search ({engine}) returned {len(result)} unique policies")
         except aiosqlite.Error as e:
             logger.error(f"Database query error in search_situation: {str(e)}", exc_info=True)
             raise
 
-        # Deduplicate results
-        unique_policies = []
-        seen = []
-        try:
-            for situation in result:
-                if not situation.get('full_policy_text'):
-                    logger.warning(f"Situation {situation.get('id')} missing full_policy_text")
-                    continue
-                hash_policy = int(hashlib.sha1(situation['full_policy_text'].encode("utf-8")).hexdigest(), 16) % (10 ** 8)
-                if hash_policy not in seen:
-                    seen.append(hash_policy)
-                    unique_policies.append(situation)
-        except Exception as e:
-            logger.error(f"Error deduplicating policies: {str(e)}", exc_info=True)
-            raise
-
-        return unique_policies
+        return result
     except Exception as e:
         logger.error(f"Error in search_situation: {str(e)}", exc_info=True)
         raise
-    finally:
-        if db:
-            try:
-                await db.close()
-            except Exception as e:
-                logger.warning(f"Error closing database connection: {str(e)}")
 
 
-async def get_full_policy(ids: list[int]):
+async def get_full_policy(ids: list[int], tenant: Optional[str] = None):
+    """Policies of the given situation ids, ignoring ids that belong to another tenant"""
     if not ids:
         logger.warning("Empty ids list provided to get_full_policy")
         return []
@@ -125,44 +585,29 @@ async def get_full_policy(ids: list[int]):
         logger.error(f"Invalid ID type in get_full_policy: {str(e)}")
         raise ValueError(f"All policy IDs must be integers: {str(e)}")
 
-    db = None
     try:
-        db = await get_db()
-        db.row_factory = aiosqlite.Row
-
         # Execute query
         try:
-            async with db.execute(
-                """
-                    SELECT
-                        full_policy_text
-                    FROM situations
-                    WHERE id in ({})
-                """.format(','.join(['?']*len(ids))),
-                ids,
-            ) as cur:
-                rows = await cur.fetchall()
-                result = [dict(r) for r in rows]
+            with span("get_full_policy"):
+                async with pool.acquire() as db, db.execute(
+                    """
+                        SELECT
+                            id AS policy_id,
+                            full_policy_text
+                        FROM policies
+                        WHERE tenant = ?
+                            AND id IN (
+                                SELECT policy_id FROM situations WHERE id IN ({})
+                            )
+                    """.format(','.join(['?']*len(ids))),
+                    [tenant or config.DEFAULT_TENANT, *ids],
+                ) as cur:
+                    rows = await cur.fetchall()
+                    unique_policies = [dict(r) for r in rows]
         except aiosqlite.Error as e:
             logger.error(f"Database query error in get_full_policy: {str(e)}", exc_info=True)
             raise
 
-        # Deduplicate results
-        unique_policies: list[dict[str, str],] = []
-        seen = []
-        try:
-            for situation in result:
-                if not situation.get('full_policy_text'):
-                    logger.warning(f"Situation missing full_policy_text in result")
-                    continue
-                hash_policy = int(hashlib.sha1(situation['full_policy_text'].encode("utf-8")).hexdigest(), 16) % (10 ** 8)
-                if hash_policy not in seen:
-                    seen.append(hash_policy)
-                    unique_policies.append(situation)
-        except Exception as e:
-            logger.error(f"Error deduplicating policies: {str(e)}", exc_info=True)
-            raise
-
         if not unique_policies:
             logger.warning(f"No policies found for IDs: {ids}")
 
@@ -170,9 +615,12 @@ async def get_full_policy(ids: list[int]):
     except Exception as e:
         logger.error(f"Error in get_full_policy: {str(e)}", exc_info=True)
         raise
-    finally:
-        if db:
-            try:
-                await db.close()
-            except Exception as e:
-                logger.warning(f"Error closing database connection: {str(e)}")
\ No newline at end of file
+
+
+async def corpus_version() -> str:
+    """Stamp that changes whenever ingestion adds, changes or removes a policy of any tenant"""
+    async with pool.acquire() as db, db.execute(
+        "SELECT COUNT(*), COALESCE(SUM(version), 0), COALESCE(MAX(ingested_at), 0) FROM policies"
+    ) as cur:
+        count, versions, ingested_at = await cur.fetchone()
+    return f"{count}:{versions}:{ingested_at}"
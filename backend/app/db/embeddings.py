@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import struct
+import time
+from collections import OrderedDict
+from os import makedirs, path
+from typing import Optional
+import aiosqlite
+import logging
+from .. import config
+from ..clients import get_client
+
+logger = logging.getLogger(__name__)
+
+# Size of each model's embeddings when no `dimensions` is requested
+DEFAULT_DIMENSIONS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+
+
+def serialize(vector: list[float]) -> bytes:
+    """serializes a list of floats into a compact "raw bytes" format"""
+    return struct.pack("%sf" % len(vector), *vector)
+
+
+def deserialize(blob: bytes) -> list[float]:
+    """inverse of `serialize`"""
+    return list(struct.unpack("%sf" % (len(blob) // 4), blob))
+
+
+def normalize(text: str) -> str:
+    """Collapse whitespace and case so trivially different wordings share a cache entry"""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize(text)}".encode("utf-8")).hexdigest()
+
+
+def embedding_space(model: str, dimensions: Optional[int] = None) -> str:
+    """
+    The cache namespace of `model`'s embeddings at `dimensions`. Shortened embeddings are
+    a different vector space, so the effective size is always part of it, and a request
+    for the default size shares entries with one that leaves `dimensions` out.
+    """
+    size = dimensions or DEFAULT_DIMENSIONS.get(model)
+    return f"{model}:{size}" if size else model
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache.
+
+    Tier one is an in-process LRU bounded to `max_entries`. Tier two is a SQLite table
+    keyed by the hash of (model, normalized text) whose rows expire after `ttl` seconds
+    and are trimmed to `max_rows` by last access. Failures in the persistent tier are
+    logged and treated as misses so they never break a search.
+    """
+
+    def __init__(self, db_path: str, max_entries: int, max_rows: int, ttl: float):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def open(self):
+        async with self._lock:
+            if self._db is not None:
+                return
+            makedirs(path.dirname(path.abspath(self.db_path)), exist_ok=True)
+            db = await aiosqlite.connect(self.db_path)
+            try:
+                await db.execute("PRAGMA journal_mode = WAL")
+                await db.execute("PRAGMA synchronous = NORMAL")
+                await db.execute(
+                    """
+                        CREATE TABLE IF NOT EXISTS embedding_cache (
+                          key TEXT PRIMARY KEY,
+                          model TEXT NOT NULL,
+                          embedding BLOB NOT NULL,
+                          created_at REAL NOT NULL,
+                          accessed_at REAL NOT NULL
+                        )
+                    """
+                )
+                await db.execute(
+                    "CREATE INDEX IF NOT EXISTS embedding_cache_accessed_at ON embedding_cache(accessed_at)"
+                )
+                await db.commit()
+            except Exception:
+                await db.close()
+                raise
+            self._db = db
+        await self.evict()
+
+    async def close(self):
+        async with self._lock:
+            if self._db is not None:
+                try:
+                    await self._db.close()
+                except Exception as e:
+                    logger.warning(f"Error closing embedding cache: {str(e)}")
+                self._db = None
+
+    async def _connection(self) -> Optional[aiosqlite.Connection]:
+        if self._db is None:
+            try:
+                await self.open()
+            except Exception as e:
+                logger.warning(f"Embedding cache unavailable: {str(e)}")
+        return self._db
+
+    def _remember(self, key: str, embedding: list[float]):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, model: str, text: str) -> Optional[list[float]]:
+        return (await self.get_many(model, [text]))[0]
+
+    async def get_many(self, model: str, texts: list[str]) -> list[Optional[list[float]]]:
+        """The cached embedding of each text, or None; texts not in memory are looked up in one query"""
+        embeddings: list[Optional[list[float]]] = [None] * len(texts)
+        missing: dict[str, list[int]] = {}
+        for index, text in enumerate(texts):
+            key = cache_key(model, text)
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                embeddings[index] = embedding
+            else:
+                missing.setdefault(key, []).append(index)
+
+        db = await self._connection() if missing else None
+        if db is not None:
+            try:
+                now = time.time()
+                placeholders = ", ".join("?" * len(missing))
+                async with db.execute(
+                    f"SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders}) AND created_at > ?",
+                    [*missing, now - self.ttl],
+                ) as cur:
+                    rows = await cur.fetchall()
+                if rows:
+                    await db.execute(
+                        f"UPDATE embedding_cache SET accessed_at = ? WHERE key IN ({', '.join('?' * len(rows))})",
+                        [now, *(key for key, _ in rows)],
+                    )
+                    await db.commit()
+                for key, blob in rows:
+                    embedding = deserialize(blob)
+                    self._remember(key, embedding)
+                    for index in missing.pop(key):
+                        embeddings[index] = embedding
+                        self.disk_hits += 1
+            except aiosqlite.Error as e:
+                logger.warning(f"Embedding cache read failed: {str(e)}")
+
+        self.misses += sum(len(indexes) for indexes in missing.values())
+        return embeddings
+
+    async def set(self, model: str, text: str, embedding: list[float]):
+        await self.set_many(model, {text: embedding})
+
+    async def set_many(self, model: str, embeddings: dict[str, list[float]]):
+        """Cache the embedding of each text, writing them in one transaction"""
+        rows = []
+        now = time.time()
+        for text, embedding in embeddings.items():
+            key = cache_key(model, text)
+            self._remember(key, embedding)
+            rows.append((key, model, serialize(embedding), now, now))
+
+        db = await self._connection()
+        if db is None or not rows:
+            return
+        try:
+            await db.executemany(
+                """
+                    INSERT OR REPLACE INTO embedding_cache(key, model, embedding, created_at, accessed_at)
+                    VALUES(?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            await db.commit()
+        except aiosqlite.Error as e:
+            logger.warning(f"Embedding cache write failed: {str(e)}")
+            return
+
+        self._writes += len(rows)
+        if self._writes >= 100:
+            self._writes = 0
+            await self.evict()
+
+    async def evict(self):
+        """Drop expired rows and trim the table to `max_rows` least recently used"""
+        db = self._db
+        if db is None:
+            return
+        try:
+            await db.execute("DELETE FROM embedding_cache WHERE created_at <= ?", [time.time() - self.ttl])
+            await db.execute(
+                """
+                    DELETE FROM embedding_cache WHERE key IN (
+                        SELECT key FROM embedding_cache
+                        ORDER BY accessed_at DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                """,
+                [self.max_rows],
+            )
+            await db.commit()
+        except aiosqlite.Error as e:
+            logger.warning(f"Embedding cache eviction failed: {str(e)}")
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+embedding_cache = EmbeddingCache(
+    config.EMBEDDING_CACHE_PATH,
+    max_entries=config.EMBEDDING_CACHE_SIZE,
+    max_rows=config.EMBEDDING_CACHE_MAX_ROWS,
+    ttl=config.EMBEDDING_CACHE_TTL,
+)
+
+
+async def embed(text: str, model: str = config.EMBEDDING_MODEL, dimensions: Optional[int] = None) -> list[float]:
+    """
+    Embed `text`, skipping the API call when the embedding is cached. `dimensions`
+    requests a shortened embedding; None uses the model's default size.
+    """
+    cache_model = embedding_space(model, dimensions)
+    embedding = await embedding_cache.get(cache_model, text)
+    if embedding is not None:
+        return embedding
+
+    if dimensions:
+        response = await get_client().embeddings.create(input=text, model=model, dimensions=dimensions)
+    else:
+        response = await get_client().embeddings.create(input=text, model=model)
+    embedding = response.data[0].embedding
+    await embedding_cache.set(cache_model, text, embedding)
+    return embedding
+
+
+async def embed_many(texts: list[str], model: str = config.EMBEDDING_MODEL, dimensions: Optional[int] = None) -> list[list[float]]:
+    """Batched `embed`: every text missing from the cache is embedded in a single API call"""
+    cache_model = embedding_space(model, dimensions)
+    embeddings = await embedding_cache.get_many(cache_model, texts)
+    missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+    if not missing:
+        return embeddings
+
+    if dimensions:
+        response = await get_client().embeddings.create(input=missing, model=model, dimensions=dimensions)
+    else:
+        response = await get_client().embeddings.create(input=missing, model=model)
+    created = {missing[item.index]: item.embedding for item in response.data}
+    await embedding_cache.set_many(cache_model, created)
+    return [embedding if embedding is not None else created[text] for text, embedding in zip(texts, embeddings)]
@@ -0,0 +1,313 @@
+import asyncio
+import contextvars
+import json
+import time
+import uuid
+from os import makedirs, path
+from typing import Any, Awaitable, Callable, Optional
+import aiosqlite
+from fastapi import HTTPException
+import logging
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict], Awaitable[dict]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    SQLite-backed job queue drained by a pool of in-process async workers.
+
+    Payloads and results are JSON. Large values, such as transcripts, can be passed as
+    `inputs` instead: they are kept in their own table rather than the job row, handed to
+    the handler merged into the payload, and deleted once the job finishes. Each queue owns the jobs it submits or takes over, and
+    renews a `lease` on them while it is running. Queues sharing the database (one per
+    server worker) only take over jobs whose lease has expired, so a job is never run by
+    two live queues; jobs of a stopped process are picked up once their lease runs out.
+    A job that has been started `max_attempts` times without finishing is marked failed
+    instead. A handler that raises `HTTPException` fails the job with that status code
+    and detail.
+
+    Handlers run in a copy of the context `submit()` was called from, so context
+    variables such as request timings follow the job; recovered jobs get a fresh one.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        workers: int,
+        handler: JobHandler,
+        max_attempts: int = 3,
+        retention: float = 7 * 24 * 60 * 60,
+        lease: float = 30,
+    ):
+        self.db_path = db_path
+        self.workers = workers
+        self.handler = handler
+        self.max_attempts = max_attempts
+        self.retention = retention
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self._db: Optional[aiosqlite.Connection] = None
+        self._pending: asyncio.Queue[str] = asyncio.Queue()
+        self._waiters: dict[str, list[asyncio.Future]] = {}
+        self._contexts: dict[str, contextvars.Context] = {}
+        self._tasks: list[asyncio.Task] = []
+        self._lock = asyncio.Lock()
+        # One connection is shared by every request and worker; a commit while another
+        # coroutine's statement is still open fails, so statements run one at a time
+        self._db_lock = asyncio.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._db is not None
+
+    @property
+    def depth(self) -> int:
+        return self._pending.qsize()
+
+    async def start(self):
+        async with self._lock:
+            if self._db is not None:
+                return
+            makedirs(path.dirname(path.abspath(self.db_path)), exist_ok=True)
+            db = await aiosqlite.connect(self.db_path)
+            try:
+                db.row_factory = aiosqlite.Row
+                await db.execute("PRAGMA journal_mode = WAL")
+                await db.execute(
+                    """
+                        CREATE TABLE IF NOT EXISTS jobs (
+                          id TEXT PRIMARY KEY,
+                          status TEXT NOT NULL,
+                          payload TEXT NOT NULL,
+                          result TEXT,
+                          status_code INTEGER,
+                          error TEXT,
+                          attempts INTEGER NOT NULL DEFAULT 0,
+                          created_at REAL NOT NULL,
+                          started_at REAL,
+                          finished_at REAL,
+                          owner TEXT,
+                          lease_until REAL
+                        )
+                    """
+                )
+                columns = {row[1] for row in await db.execute_fetchall("PRAGMA table_info(jobs)")}
+                for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+                    if column not in columns:
+                        await db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+                await db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+                await db.execute(
+                    """
+                        CREATE TABLE IF NOT EXISTS job_inputs (
+                          job_id TEXT NOT NULL,
+                          name TEXT NOT NULL,
+                          value TEXT NOT NULL,
+                          PRIMARY KEY (job_id, name)
+                        )
+                    """
+                )
+                await db.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                    [SUCCEEDED, FAILED, time.time() - self.retention],
+                )
+                await db.commit()
+            except Exception:
+                await db.close()
+                raise
+            self._db = db
+
+            await self._recover()
+            self._tasks = [asyncio.create_task(self._work(), name=f"job-worker-{i}") for i in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._heartbeat(), name="job-heartbeat"))
+            logger.info(f"Started job queue with {self.workers} workers")
+
+    async def _recover(self):
+        """Take over queued or running jobs whose owner stopped renewing their lease"""
+        now = time.time()
+        async with self._db_lock:
+            # Leases expire in one statement, so two queues can never take over the same job
+            async with self._db.execute(
+                """
+                    UPDATE jobs SET status = ?, owner = ?, lease_until = ?
+                    WHERE status IN (?, ?) AND (lease_until IS NULL OR lease_until < ?)
+                    RETURNING id, created_at
+                """,
+                [QUEUED, self.owner, now + self.lease, QUEUED, RUNNING, now],
+            ) as cur:
+                rows = await cur.fetchall()
+            await self._db.commit()
+        if not rows:
+            return
+        for row in sorted(rows, key=lambda row: row["created_at"]):
+            self._pending.put_nowait(row["id"])
+        logger.info(f"Recovered {len(rows)} unfinished jobs")
+
+    async def _heartbeat(self):
+        """Renew the leases of this queue's jobs and take over jobs of stopped queues"""
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                async with self._db_lock:
+                    await self._db.execute(
+                        "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN (?, ?)",
+                        [time.time() + self.lease, self.owner, QUEUED, RUNNING],
+                    )
+                    await self._db.commit()
+                await self._recover()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job lease renewal error: {str(e)}", exc_info=True)
+
+    async def close(self):
+        """Stop the workers. Jobs in flight stay running in the table and are recovered once their lease expires."""
+        async with self._lock:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            for futures in self._waiters.values():
+                for future in futures:
+                    if not future.done():
+                        future.cancel()
+            self._waiters.clear()
+            self._contexts.clear()
+            while not self._pending.empty():
+                self._pending.get_nowait()
+            if self._db is not None:
+                await self._db.close()
+                self._db = None
+            logger.info("Stopped job queue")
+
+    async def submit(self, payload: dict, inputs: Optional[dict[str, str]] = None) -> str:
+        if self._db is None:
+            await self.start()
+        job_id = uuid.uuid4().hex
+        async with self._db_lock:
+            now = time.time()
+            await self._db.execute(
+                "INSERT INTO jobs(id, status, payload, created_at, owner, lease_until) VALUES(?, ?, ?, ?, ?, ?)",
+                [job_id, QUEUED, json.dumps(payload), now, self.owner, now + self.lease],
+            )
+            if inputs:
+                await self._db.executemany(
+                    "INSERT INTO job_inputs(job_id, name, value) VALUES(?, ?, ?)",
+                    [(job_id, name, value) for name, value in inputs.items()],
+                )
+            await self._db.commit()
+        self._contexts[job_id] = contextvars.copy_context()
+        self._pending.put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        if self._db is None:
+            await self.start()
+        async with self._db_lock, self._db.execute(
+            """
+                SELECT id, status, result, status_code, error, attempts, created_at, started_at, finished_at
+                FROM jobs WHERE id = ?
+            """,
+            [job_id],
+        ) as cur:
+            row = await cur.fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    async def wait(self, job_id: str) -> dict:
+        """Wait for a job to finish and return its result, raising HTTPException if it failed"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(future)
+
+        # The job may have finished before we started waiting
+        job = await self.get(job_id)
+        if job is None:
+            self._waiters[job_id].remove(future)
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] in (SUCCEEDED, FAILED):
+            self._resolve(job_id, job)
+
+        try:
+            job = await future
+        finally:
+            waiters = self._waiters.get(job_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(job_id, None)
+
+        if job["status"] == FAILED:
+            raise HTTPException(status_code=job["status_code"] or 500, detail=job["error"])
+        return job["result"]
+
+    def _resolve(self, job_id: str, job: dict):
+        for future in self._waiters.get(job_id, []):
+            if not future.done():
+                future.set_result(job)
+
+    async def _claim(self, job_id: str) -> Optional[dict]:
+        now = time.time()
+        async with self._db_lock:
+            async with self._db.execute(
+                """
+                    UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_until = ?
+                    WHERE id = ? AND status = ? AND owner = ?
+                    RETURNING payload, attempts
+                """,
+                [RUNNING, now, now + self.lease, job_id, QUEUED, self.owner],
+            ) as cur:
+                row = await cur.fetchone()
+            await self._db.commit()
+            if row is None:
+                return None
+            async with self._db.execute("SELECT name, value FROM job_inputs WHERE job_id = ?", [job_id]) as cur:
+                inputs = {name: value for name, value in await cur.fetchall()}
+        return {"payload": {**json.loads(row["payload"]), **inputs}, "attempts": row["attempts"]}
+
+    async def _finish(self, job_id: str, status: str, result: Any = None, status_code: Optional[int] = None, error: Optional[str] = None):
+        async with self._db_lock:
+            await self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, status_code = ?, error = ?, finished_at = ? WHERE id = ?",
+                [status, json.dumps(result) if result is not None else None, status_code, error, time.time(), job_id],
+            )
+            await self._db.execute("DELETE FROM job_inputs WHERE job_id = ?", [job_id])
+            await self._db.commit()
+        self._resolve(job_id, {"status": status, "result": result, "status_code": status_code, "error": error})
+
+    async def _work(self):
+        while True:
+            job_id = await self._pending.get()
+            context = self._contexts.pop(job_id, None) or contextvars.Context()
+            try:
+                claimed = await self._claim(job_id)
+                if claimed is None:
+                    continue
+                if claimed["attempts"] > self.max_attempts:
+                    logger.error(f"Job {job_id} abandoned after {self.max_attempts} attempts")
+                    await self._finish(job_id, FAILED, status_code=500, error="Job did not complete after repeated attempts")
+                    continue
+
+                logger.info(f"Running job {job_id}")
+                try:
+                    result = await asyncio.create_task(self.handler(claimed["payload"]), context=context)
+                except HTTPException as e:
+                    await self._finish(job_id, FAILED, status_code=e.status_code, error=str(e.detail))
+                except Exception as e:
+                    logger.error(f"Job {job_id} failed: {str(e)}", exc_info=True)
+                    await self._finish(job_id, FAILED, status_code=500, error="An unexpected error occurred while processing the job")
+                else:
+                    await self._finish(job_id, SUCCEEDED, result=result)
+                    logger.info(f"Job {job_id} succeeded")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker error on {job_id}: {str(e)}", exc_info=True)
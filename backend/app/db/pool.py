@@ -0,0 +1,250 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from os import path, stat
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+import aiosqlite
+import logging
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+
+def file_id(db_path: str) -> Optional[tuple[int, int]]:
+    """Identity of the file currently at `db_path`, which changes when it is replaced"""
+    try:
+        st = stat(db_path)
+    except FileNotFoundError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+async def open_connection(db_path: str, immutable: bool = False) -> aiosqlite.Connection:
+    """
+    Open a read-tuned connection with sqlite-vec loaded. `immutable` opens the file
+    read-only with SQLite's immutable flag, which skips locking and change detection;
+    only use it when the file is never written in place (see `ingestion --publish`).
+    """
+    if not path.exists(db_path):
+        logger.error(f"Database file not found at path: {db_path}")
+        raise FileNotFoundError(f"Database file not found: {db_path}")
+
+    # Imported here: sqlite_vec pulls in numpy when it's installed, which only the first connection should pay for
+    import sqlite_vec
+
+    if immutable:
+        conn = await aiosqlite.connect(f"file:{quote(path.abspath(db_path))}?mode=ro&immutable=1", uri=True)
+    else:
+        conn = await aiosqlite.connect(db_path)
+    try:
+        await conn.enable_load_extension(True)
+        await conn.load_extension(sqlite_vec.loadable_path())
+        await conn.enable_load_extension(False)
+
+        await conn.execute(f"PRAGMA mmap_size = {config.DB_MMAP_SIZE}")
+        await conn.execute(f"PRAGMA cache_size = -{config.DB_CACHE_SIZE_KB}")
+        await conn.execute("PRAGMA query_only = ON")
+        conn.row_factory = aiosqlite.Row
+        return conn
+    except Exception:
+        await conn.close()
+        raise
+
+
+class ConnectionPool:
+    """
+    Bounded pool of pre-warmed aiosqlite connections.
+
+    Every connection is opened once with sqlite-vec loaded and read pragmas applied,
+    then lent out via `acquire()`. A connection that has been idle for more than
+    `idle_check` seconds, or was given back by a borrower that raised, is health-checked
+    on checkout and closed and replaced if it fails; others are lent out unchecked.
+
+    Connections keep reading the file they were opened on, so the pool checks every
+    `refresh_interval` seconds whether the file at `db_path` has been replaced (as
+    `ingestion --publish` does) and if so opens a fresh set of connections. Connections
+    borrowed at the time finish their query on the old file and are closed on return.
+    """
+
+    def __init__(
+        self, db_path: str, size: int, timeout: float, immutable: bool = False, refresh_interval: float = 5, idle_check: float = 30
+    ):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.immutable = immutable
+        self.refresh_interval = refresh_interval
+        self.idle_check = idle_check
+        self._file_id: Optional[tuple[int, int]] = None
+        self._checked_at = 0.0
+        # Idle connections; a None entry is a slot whose connection must be reopened
+        self._idle: asyncio.Queue[Optional[aiosqlite.Connection]] = asyncio.Queue()
+        self._all: set[aiosqlite.Connection] = set()
+        # When each idle connection was given back; -inf after an error. New connections have no entry.
+        self._returned: dict[aiosqlite.Connection, float] = {}
+        self._lock = asyncio.Lock()
+        self._opened = False
+        self._closed = False
+
+    async def open(self):
+        """Open and warm all connections. Safe to call more than once."""
+        async with self._lock:
+            if self._opened:
+                return
+            self._closed = False
+            self._file_id = file_id(self.db_path)
+            try:
+                for _ in range(self.size):
+                    conn = await open_connection(self.db_path, self.immutable)
+                    self._all.add(conn)
+                    self._idle.put_nowait(conn)
+            except Exception:
+                await self._close_all()
+                raise
+            self._opened = True
+            self._checked_at = time.monotonic()
+            mode = "immutable" if self.immutable else "read-only"
+            logger.info(f"Opened database pool with {self.size} {mode} connections")
+
+    async def _reopen_if_replaced(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        current = file_id(self.db_path)
+        if current is None or current == self._file_id:
+            return
+
+        async with self._lock:
+            if current == self._file_id or not self._opened:
+                return
+            fresh = []
+            try:
+                for _ in range(self.size):
+                    fresh.append(await open_connection(self.db_path, self.immutable))
+            except Exception as e:
+                # Keep serving from the old file and try again on the next check
+                logger.error(f"Failed to reopen replaced database file: {str(e)}", exc_info=True)
+                for conn in fresh:
+                    await conn.close()
+                return
+
+            stale = []
+            while not self._idle.empty():
+                conn = self._idle.get_nowait()
+                if conn is not None:
+                    self._returned.pop(conn, None)
+                    stale.append(conn)
+            self._all = set(fresh)
+            for conn in fresh:
+                self._idle.put_nowait(conn)
+            self._file_id = current
+            for conn in stale:
+                await self._close_quietly(conn)
+            logger.info(f"Database file at {self.db_path} was replaced, reopened {self.size} connections")
+
+    async def close(self):
+        """Close every connection. Connections still borrowed are closed on return."""
+        async with self._lock:
+            self._closed = True
+            self._opened = False
+            await self._close_all()
+            logger.info("Closed database pool")
+
+    async def _close_all(self):
+        while not self._idle.empty():
+            self._idle.get_nowait()
+        for conn in list(self._all):
+            await self._discard(conn)
+
+    async def _discard(self, conn: aiosqlite.Connection):
+        self._all.discard(conn)
+        self._returned.pop(conn, None)
+        await self._close_quietly(conn)
+
+    @staticmethod
+    async def _close_quietly(conn: aiosqlite.Connection):
+        try:
+            await conn.close()
+        except Exception as e:
+            logger.warning(f"Error closing database connection: {str(e)}")
+
+    async def _is_healthy(self, conn: aiosqlite.Connection) -> bool:
+        try:
+            async with conn.execute("SELECT 1") as cur:
+                await cur.fetchone()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled database connection failed health check: {str(e)}")
+            return False
+
+    async def _checkout(self) -> aiosqlite.Connection:
+        try:
+            conn = await asyncio.wait_for(self._idle.get(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out after {self.timeout}s waiting for a database connection")
+            raise TimeoutError("Timed out waiting for a database connection")
+
+        if conn is not None:
+            # Fresh connections and ones that just worked aren't worth a query
+            returned = self._returned.pop(conn, None)
+            if returned is None or time.monotonic() - returned < self.idle_check or await self._is_healthy(conn):
+                return conn
+            await self._discard(conn)
+
+        # Empty slot (a previous replacement failed) or unhealthy connection: reopen it
+        try:
+            conn = await open_connection(self.db_path, self.immutable)
+        except Exception:
+            logger.error("Failed to open replacement database connection", exc_info=True)
+            self._idle.put_nowait(None)
+            raise
+        self._all.add(conn)
+        return conn
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a connection for the duration of the context"""
+        if self._closed:
+            raise RuntimeError("Database pool is closed")
+        if not self._opened:
+            await self.open()
+        await self._reopen_if_replaced()
+
+        conn = await self._checkout()
+        failed = False
+        try:
+            yield conn
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            if self._closed or conn not in self._all:
+                await self._discard(conn)
+            else:
+                self._returned[conn] = float("-inf") if failed else time.monotonic()
+                self._idle.put_nowait(conn)
+
+    async def healthcheck(self) -> bool:
+        """Check a connection can be borrowed and queried"""
+        try:
+            async with self.acquire() as conn:
+                async with conn.execute("SELECT vec_version()") as cur:
+                    await cur.fetchone()
+            return True
+        except Exception as e:
+            logger.warning(f"Database pool health check failed: {str(e)}")
+            return False
+
+
+pool = ConnectionPool(
+    config.DB_PATH,
+    size=config.DB_POOL_SIZE,
+    timeout=config.DB_POOL_TIMEOUT,
+    immutable=config.DB_IMMUTABLE,
+    refresh_interval=config.INDEX_REFRESH_INTERVAL,
+    idle_check=config.DB_POOL_IDLE_CHECK,
+)
@@ -0,0 +1,203 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from os import path, stat
+from typing import Optional
+import logging
+from .. import config
+from .pool import open_connection
+
+# numpy is an optional dependency, only needed for SEARCH_ENGINE=numpy; imported by `load()`
+np = None
+
+logger = logging.getLogger(__name__)
+
+# Above this many rows the matmul runs in a worker thread to keep the event loop free
+_OFFLOAD_ROWS = 20_000
+
+
+def db_version(db_path: str) -> tuple:
+    """Cheap change stamp for the database file (and its WAL, if any)"""
+    stamp = []
+    for file in (db_path, db_path + "-wal"):
+        if path.exists(file):
+            st = stat(file)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        else:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    ids: "np.ndarray"
+    policy_ids: "np.ndarray"
+    matrix: "np.ndarray"
+    norms: "np.ndarray"
+    situation_descriptions: list[Optional[str]]
+    policy_texts: dict[int, str]
+    # Rows are ordered by tenant; each tenant's rows are the slice [start, end)
+    tenants: dict[str, tuple[int, int]]
+    version: tuple
+
+
+class VectorIndex:
+    """
+    In-memory copy of `vec_situations` for exact top-k search with NumPy.
+
+    All embeddings live in one contiguous float32 matrix, grouped by tenant. Queries are
+    answered with a single matmul over the rows of one tenant and argpartition, then
+    deduplicated by policy_id like `vec0_search`. Policy texts are held once per policy,
+    not per situation. When the database file changes, the next query rebuilds the
+    snapshot and swaps it in with a single assignment, so readers always see a
+    complete index.
+    """
+
+    def __init__(self, db_path: str, refresh_interval: float):
+        self.db_path = db_path
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = asyncio.Lock()
+        self._checked_at = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def size(self) -> int:
+        return len(self._snapshot.ids) if self._snapshot is not None else 0
+
+    def tenant_size(self, tenant: str) -> int:
+        if self._snapshot is None or tenant not in self._snapshot.tenants:
+            return 0
+        start, end = self._snapshot.tenants[tenant]
+        return end - start
+
+    @property
+    def dimensions(self) -> int:
+        return self._snapshot.matrix.shape[1] if self._snapshot is not None else 0
+
+    async def load(self):
+        """(Re)build the index from the database"""
+        global np
+        if np is None:
+            try:
+                import numpy as np
+            except ImportError:
+                raise RuntimeError("The numpy search engine requires numpy: uv sync --extra numpy")
+
+        async with self._lock:
+            version = db_version(self.db_path)
+            if self._snapshot is not None and self._snapshot.version == version:
+                return
+
+            started = time.perf_counter()
+            # Not a pooled connection: after a publish swap those may still read the old
+            # file for up to a refresh interval, and the snapshot would be stamped with
+            # the new file's version. Opened after taking the stamp, so it is never older.
+            db = await open_connection(self.db_path, config.DB_IMMUTABLE)
+            try:
+                async with db.execute(
+                    """
+                        SELECT
+                            vec_situations.id,
+                            situation_embedding,
+                            situations.policy_id,
+                            situation_description,
+                            policies.tenant
+                        FROM vec_situations
+                        JOIN situations ON situations.id = vec_situations.id
+                        JOIN policies ON policies.id = situations.policy_id
+                        ORDER BY policies.tenant
+                    """
+                ) as cur:
+                    rows = await cur.fetchall()
+                async with db.execute("SELECT id, full_policy_text FROM policies") as cur:
+                    policy_texts = {r["id"]: r["full_policy_text"] for r in await cur.fetchall()}
+            finally:
+                await db.close()
+
+            tenants: dict[str, tuple[int, int]] = {}
+            for i, row in enumerate(rows):
+                start, _ = tenants.get(row["tenant"], (i, i))
+                tenants[row["tenant"]] = (start, i + 1)
+
+            if rows:
+                matrix = np.frombuffer(b"".join(r["situation_embedding"] for r in rows), dtype=np.float32)
+                matrix = matrix.reshape(len(rows), -1)
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+
+            self._snapshot = _Snapshot(
+                ids=np.fromiter((r["id"] for r in rows), dtype=np.int64, count=len(rows)),
+                policy_ids=np.fromiter((r["policy_id"] for r in rows), dtype=np.int64, count=len(rows)),
+                matrix=matrix,
+                norms=np.einsum("ij,ij->i", matrix, matrix),
+                situation_descriptions=[r["situation_description"] for r in rows],
+                policy_texts=policy_texts,
+                tenants=tenants,
+                version=version,
+            )
+            self._checked_at = time.monotonic()
+            logger.info(
+                f"Loaded vector index with {len(rows)} situations of {len(tenants)} tenants in {(time.perf_counter() - started) * 1000:.1f}ms"
+            )
+
+    async def _refresh_if_changed(self):
+        if self._snapshot is None:
+            await self.load()
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        if db_version(self.db_path) != self._snapshot.version:
+            logger.info("Policy database changed, rebuilding vector index")
+            await self.load()
+
+    @staticmethod
+    def _top_k(snapshot: _Snapshot, query: "np.ndarray", k: int, per_policy: int, start: int, end: int) -> list[dict]:
+        # Squared L2 via |x|^2 - 2x.q + |q|^2; vec0's default metric is the (unsquared) L2 distance
+        distances = snapshot.norms[start:end] - 2.0 * (snapshot.matrix[start:end] @ query) + float(query @ query)
+        k = min(k, len(distances))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+
+        results = []
+        seen: dict[int, int] = {}
+        for j in nearest:
+            i = start + j
+            policy_id = int(snapshot.policy_ids[i])
+            if seen.get(policy_id, 0) >= per_policy:
+                continue
+            seen[policy_id] = seen.get(policy_id, 0) + 1
+            results.append(
+                {
+                    "id": int(snapshot.ids[i]),
+                    "distance": float(np.sqrt(max(distances[j], 0.0))),
+                    "policy_id": policy_id,
+                    "full_policy_text": snapshot.policy_texts.get(policy_id),
+                    "situation_description": snapshot.situation_descriptions[i],
+                }
+            )
+        return results
+
+    async def search(self, query_embedding: list[float], k: int, per_policy: int = 1, tenant: str = config.DEFAULT_TENANT) -> list[dict]:
+        await self._refresh_if_changed()
+        snapshot = self._snapshot
+        if snapshot is None or tenant not in snapshot.tenants or k < 1:
+            return []
+        start, end = snapshot.tenants[tenant]
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.shape[0] != snapshot.matrix.shape[1]:
+            raise ValueError(
+                f"Query embedding has {query.shape[0]} dimensions, index has {snapshot.matrix.shape[1]}"
+            )
+        if end - start > _OFFLOAD_ROWS:
+            return await asyncio.to_thread(self._top_k, snapshot, query, k, per_policy, start, end)
+        return self._top_k(snapshot, query, k, per_policy, start, end)
+
+
+vector_index = VectorIndex(config.DB_PATH, refresh_interval=config.INDEX_REFRESH_INTERVAL)
@@ -1,13 +1,24 @@
-from .incident import IncidentReport, PolicyProcessingResults, PolicyProcessingResultsWithFullPolicy
-from .transcript import Transcript
+from .incident import IncidentReport, PolicyProcessingResults, PolicyProcessingResultsWithFullPolicy, PolicyReasoning, PolicySelection, RecipientEmails
+from .transcript import Transcript, TranscriptNotes
 from .email import Email
-from .policy import SituationSearchResult
+from .policy import PolicySection, SituationMatch, SituationSearchResult
+from .job import JobStatus, JobSubmitted
+from .batch import BatchItemResult
 
 __all__ = [
     "IncidentReport",
     "PolicyProcessingResults",
     "PolicyProcessingResultsWithFullPolicy",
+    "PolicyReasoning",
+    "PolicySelection",
+    "RecipientEmails",
     "Email",
+    "PolicySection",
+    "SituationMatch",
     "SituationSearchResult",
     "Transcript",
+    "TranscriptNotes",
+    "JobStatus",
+    "JobSubmitted",
+    "BatchItemResult",
 ]
\ No newline at end of file
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from .incident import PolicyProcessingResultsWithFullPolicy
+
+
+class BatchItemResult(BaseModel):
+    index: int = Field(
+        description="Position of the transcript in the request: uploaded files first, then JSONL lines"
+    )
+    id: Optional[str] = Field(
+        default=None,
+        description="The file name, or the `id` field of the JSONL line"
+    )
+    status: Literal["succeeded", "failed"]
+    result: Optional[PolicyProcessingResultsWithFullPolicy] = None
+    status_code: Optional[int] = None
+    error: Optional[str] = None
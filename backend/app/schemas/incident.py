@@ -63,5 +63,23 @@ class PolicyProcessingResults(BaseModel):
     )
 
 
+class RecipientEmails(BaseModel):
+    emails: list[Email] = Field(
+        description="Emails to this recipient that the policies call for. Leave empty if the policies do not require contacting them."
+    )
+
+
+class PolicySelection(BaseModel):
+    policy_ids: list[str] = Field(
+        description="The IDs of the matched situations whose policies apply to this incident."
+    )
+
+
+class PolicyReasoning(BaseModel):
+    reasoning: list[str] = Field(
+        description="A list of reasons why the outputs are in line with policy, specifically which parts of the text are related to specificaly parts of the policy. Please use quotations and please use markdown"
+    )
+
+
 class PolicyProcessingResultsWithFullPolicy(PolicyProcessingResults):
     full_policy_texts: list[str]
@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+from .incident import PolicyProcessingResultsWithFullPolicy
+
+JobState = Literal["queued", "running", "succeeded", "failed"]
+
+
+class JobSubmitted(BaseModel):
+    job_id: str
+    status: JobState
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: JobState
+    result: Optional[PolicyProcessingResultsWithFullPolicy] = Field(
+        default=None,
+        description="The processed transcript, once the job has succeeded"
+    )
+    status_code: Optional[int] = Field(
+        default=None,
+        description="HTTP status code describing the failure, if the job failed"
+    )
+    error: Optional[str] = None
+    attempts: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
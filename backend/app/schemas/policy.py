@@ -1,8 +1,25 @@
+from typing import Optional
 from pydantic import BaseModel
 
 
-class SituationSearchResult(BaseModel):
+class SituationMatch(BaseModel):
     id: int
     distance: float
-    full_policy_text: str
-    situation_description: str
\ No newline at end of file
+    situation_description: str
+
+
+class PolicySection(BaseModel):
+    id: int
+    heading: Optional[str]
+    section_text: str
+
+
+class SituationSearchResult(BaseModel):
+    id: int
+    distance: Optional[float]  # None for lexical-only matches
+    policy_id: int
+    policy_path: Optional[str] = None
+    full_policy_text: Optional[str] = None  # None when the matched sections are given instead
+    sections: Optional[list[PolicySection]] = None  # sections of the policy linked to the matched situations
+    situation_description: str
+    matches: Optional[list[SituationMatch]] = None  # closest situations of the policy, when searching for distinct policies
\ No newline at end of file
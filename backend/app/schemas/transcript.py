@@ -1,5 +1,14 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Transcript(BaseModel):
-    text: str
\ No newline at end of file
+    text: str
+
+
+class TranscriptNotes(BaseModel):
+    incidents: list[str] = Field(
+        description="One or two sentence summary of each incident or concern in this part of the transcript"
+    )
+    details: list[str] = Field(
+        description="Facts an incident report would need: names, dates and times, locations, injuries, actions taken, who was informed"
+    )
\ No newline at end of file
@@ -0,0 +1,29 @@
+import time
+from typing import Optional
+from agents import RunHooks
+from .metrics import record, record_tokens
+
+
+class AgentMetricsHooks(RunHooks):
+    """Times every agent model turn and tool call of a run and counts its token usage"""
+
+    def __init__(self):
+        self._turn_started: Optional[float] = None
+        self._tools_started: dict[str, list[float]] = {}
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items) -> None:
+        self._turn_started = time.perf_counter()
+
+    async def on_llm_end(self, context, agent, response) -> None:
+        if self._turn_started is not None:
+            record("agent_turn", time.perf_counter() - self._turn_started)
+            self._turn_started = None
+        record_tokens(response.usage)
+
+    async def on_tool_start(self, context, agent, tool) -> None:
+        self._tools_started.setdefault(tool.name, []).append(time.perf_counter())
+
+    async def on_tool_end(self, context, agent, tool, result) -> None:
+        started = self._tools_started.get(tool.name)
+        if started:
+            record(f"tool.{tool.name}", time.perf_counter() - started.pop(0))
@@ -1,8 +1,16 @@
+import codecs
+import json
+from typing import AsyncIterator
 from fastapi import UploadFile, HTTPException
+from .. import config
 
 ALLOWED_EXTS = {"txt", "md"}
 ALLOWED_CT = {"text/plain", "text/markdown", "text/x-markdown"}
-MAX_BYTES = 1_000_000  # 1MB
+MAX_BYTES = config.TRANSCRIPT_MAX_BYTES
+
+JSONL_EXTS = {"jsonl", "ndjson"}
+JSONL_CT = {"application/jsonl", "application/x-ndjson", "application/x-jsonlines", "application/json", "application/octet-stream", "text/plain"}
+JSONL_MAX_BYTES = 50_000_000  # 50MB
 
 
 def ext_of(name: str) -> str:
@@ -12,18 +20,58 @@ def ext_of(name: str) -> str:
     return name.rsplit(".", 1)[1].lower()
 
 
-async def process_uploaded_file(file: UploadFile) -> str:
+async def read_limited(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an upload in chunks, failing with 413 as soon as it exceeds `max_bytes`."""
+    size = 0
+    chunks = []
+    while True:
+        chunk = await file.read(64 * 1024)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail="File too large")
+        chunks.append(chunk)
+
+    return b"".join(chunks)
+
+
+async def iter_text_limited(file: UploadFile, max_bytes: int) -> AsyncIterator[str]:
     """
-    Validate and extract text content from an uploaded file.
+    Read and UTF-8 decode an upload chunk by chunk, yielding the text of each chunk as it
+    is read. Fails with 413 past `max_bytes`, 400 on invalid UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    size = 0
+    while True:
+        chunk = await file.read(64 * 1024)
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail="File too large")
+        try:
+            text = decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="File must be UTF-8 text")
+        if text:
+            yield text
+        if not chunk:
+            break
 
-    Args:
-        file: The uploaded file to process
 
-    Returns:
-        The decoded text content of the file
+async def read_text_limited(file: UploadFile, max_bytes: int) -> str:
+    """
+    Read and UTF-8 decode an upload chunk by chunk, so a large transcript is never held
+    as bytes and text at once. Fails with 413 past `max_bytes`, 400 on invalid UTF-8.
+    """
+    return "".join([text async for text in iter_text_limited(file, max_bytes)])
+
+
+def validate_upload(file: UploadFile):
+    """
+    Check an uploaded transcript's extension and content type.
 
     Raises:
-        HTTPException: If validation fails (invalid extension, content-type, size, or encoding)
+        HTTPException: If the file is not a .txt or .md text file
     """
     # 1) Extension check
     ext = ext_of(file.filename or "")
@@ -34,24 +82,75 @@ async def process_uploaded_file(file: UploadFile) -> str:
     if file.content_type and file.content_type not in ALLOWED_CT:
         raise HTTPException(status_code=400, detail=f"Invalid content type: {file.content_type}")
 
-    # 3) Size limit (streamed)
-    size = 0
-    chunks = []
-    while True:
-        chunk = await file.read(64 * 1024)
-        if not chunk:
-            break
-        size += len(chunk)
-        if size > MAX_BYTES:
-            raise HTTPException(status_code=413, detail="File too large")
-        chunks.append(chunk)
 
-    data = b"".join(chunks)
+async def process_uploaded_file(file: UploadFile) -> str:
+    """
+    Validate and extract text content from an uploaded file.
+
+    Args:
+        file: The uploaded file to process
+
+    Returns:
+        The decoded text content of the file
+
+    Raises:
+        HTTPException: If validation fails (invalid extension, content-type, size, or encoding)
+    """
+    validate_upload(file)
+
+    # Size limit and UTF-8 decode check (streamed)
+    return (await read_text_limited(file, MAX_BYTES)).strip()
+
+
+def iter_uploaded_file(file: UploadFile) -> AsyncIterator[str]:
+    """
+    Validate an uploaded file and return its text as it is read, one decoded chunk at a
+    time. Extension and content type are checked right away; size and encoding as the
+    file is read.
+
+    Raises:
+        HTTPException: If validation fails (invalid extension, content-type, size, or encoding)
+    """
+    validate_upload(file)
+    return iter_text_limited(file, MAX_BYTES)
+
+
+async def process_uploaded_jsonl(file: UploadFile) -> list[dict]:
+    """
+    Validate a JSONL batch upload and parse it into one object per non-empty line.
+
+    Args:
+        file: The uploaded .jsonl file
+
+    Returns:
+        The parsed lines
+
+    Raises:
+        HTTPException: If validation fails (extension, content-type, size, encoding or a line is not a JSON object)
+    """
+    if ext_of(file.filename or "") not in JSONL_EXTS:
+        raise HTTPException(status_code=400, detail="Only .jsonl files allowed for batch uploads")
+
+    if file.content_type and file.content_type not in JSONL_CT:
+        raise HTTPException(status_code=400, detail=f"Invalid content type: {file.content_type}")
+
+    data = await read_limited(file, JSONL_MAX_BYTES)
 
-    # 4) Ensure it's text (UTF-8 decode check)
     try:
-        file_text = data.decode("utf-8").strip()
+        lines = data.decode("utf-8").splitlines()
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="File must be UTF-8 text")
 
-    return file_text
+    items = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail=f"Line {number} is not valid JSON")
+        if not isinstance(item, dict):
+            raise HTTPException(status_code=400, detail=f"Line {number} must be a JSON object")
+        items.append(item)
+
+    return items
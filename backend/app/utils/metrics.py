@@ -0,0 +1,278 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional, TypeVar
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers everything from a cached SQLite lookup to a multi-turn agent run
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: (non-cumulative bucket counts, sum)
+        self._values: dict[tuple[str, ...], tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def totals(self) -> tuple[int, float]:
+        """Observation count and sum over every label set"""
+        with self._lock:
+            return sum(sum(counts) for counts, _ in self._values.values()), sum(total for _, total in self._values.values())
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: M) -> M:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_seconds = registry.register(Histogram(
+    "askemma_http_request_duration_seconds",
+    "Time until the response starts, by route",
+    ("method", "route", "status"),
+))
+stage_seconds = registry.register(Histogram(
+    "askemma_stage_duration_seconds",
+    "Time spent in each processing stage",
+    ("stage",),
+))
+stage_errors = registry.register(Counter(
+    "askemma_stage_errors_total",
+    "Processing stages that raised",
+    ("stage",),
+))
+llm_tokens = registry.register(Counter(
+    "askemma_llm_tokens_total",
+    "Tokens used by agent model calls",
+    ("kind",),
+))
+transcript_chars = registry.register(Counter(
+    "askemma_transcript_chars_total",
+    "Transcript characters received, and left after compaction",
+    ("stage",),
+))
+openai_queue_depth = registry.register(Gauge(
+    "askemma_openai_queue_depth",
+    "OpenAI requests waiting for the scheduler, by priority lane",
+    ("lane",),
+))
+openai_queue_wait_seconds = registry.register(Histogram(
+    "askemma_openai_queue_wait_seconds",
+    "Time OpenAI requests waited for the scheduler, by priority lane",
+    ("lane",),
+))
+openai_requests = registry.register(Counter(
+    "askemma_openai_requests_total",
+    "OpenAI requests sent, by priority lane and response status",
+    ("lane", "status"),
+))
+
+
+class RequestTimings:
+    """Stage timings, token usage and transcript size collected while serving one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: list[tuple[str, float]] = []
+        self.tokens: dict[str, int] = {}
+        self.transcript_chars: Optional[tuple[int, int]] = None  # (received, after compaction)
+
+    def server_timing(self) -> str:
+        """
+        `Server-Timing` header value: one entry per stage with its total duration in
+        milliseconds and, when it ran more than once, the number of times it ran.
+        """
+        totals: dict[str, list[float]] = {}
+        for stage, seconds in self.spans:
+            totals.setdefault(stage, []).append(seconds)
+        entries = []
+        for stage, durations in totals.items():
+            entry = f"{stage};dur={sum(durations) * 1000:.1f}"
+            if len(durations) > 1:
+                entry += f';desc="{len(durations)} calls"'
+            entries.append(entry)
+        if self.tokens:
+            usage = " ".join(f"{kind}={count}" for kind, count in self.tokens.items())
+            entries.append(f'llm_tokens;desc="{usage}"')
+        if self.transcript_chars:
+            received, compacted = self.transcript_chars
+            entries.append(f'transcript_chars;desc="received={received} compacted={compacted}"')
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def start_request() -> RequestTimings:
+    """Collect the spans of the current context (and tasks started from it) into a new RequestTimings"""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def current_request() -> Optional[RequestTimings]:
+    """The RequestTimings of the request being served, if any"""
+    return _current.get()
+
+
+def record(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage=stage)
+    timings = _current.get()
+    if timings is not None:
+        timings.spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time the enclosed block as `stage`, counting it as an error if it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def record_compaction(received: int, compacted: int):
+    """Count one transcript's size before and after compaction"""
+    transcript_chars.inc(received, stage="received")
+    transcript_chars.inc(compacted, stage="compacted")
+    timings = _current.get()
+    if timings is not None:
+        before, after = timings.transcript_chars or (0, 0)
+        timings.transcript_chars = (before + received, after + compacted)
+
+
+def record_tokens(usage: Any):
+    """Count the token usage of one model response"""
+    counts = {
+        "input": usage.input_tokens,
+        "output": usage.output_tokens,
+        "cached": getattr(usage.input_tokens_details, "cached_tokens", 0) or 0,
+        "reasoning": getattr(usage.output_tokens_details, "reasoning_tokens", 0) or 0,
+    }
+    timings = _current.get()
+    for kind, count in counts.items():
+        if not count:
+            continue
+        llm_tokens.inc(count, kind=kind)
+        if timings is not None:
+            timings.tokens[kind] = timings.tokens.get(kind, 0) + count
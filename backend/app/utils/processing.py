@@ -0,0 +1,727 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from contextlib import aclosing
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
+import json
+import logging
+import re
+import aiosqlite
+from fastapi import HTTPException, UploadFile
+from pydantic import ValidationError
+from pydantic_core import from_json
+from .. import config
+from ..clients import get_client
+from ..db.db import get_full_policy, search_situation, tenants
+from ..db.jobs import JobQueue
+from ..schemas import (
+    BatchItemResult,
+    Email,
+    IncidentReport,
+    PolicyProcessingResults,
+    PolicyProcessingResultsWithFullPolicy,
+    PolicyReasoning,
+    PolicySelection,
+    RecipientEmails,
+)
+from .file_processing import iter_uploaded_file, process_uploaded_file, process_uploaded_jsonl
+from .metrics import span
+from .scheduler import BATCH, lane
+from .transcripts import CondensedTranscript, compact_transcript, condense_pieces, condense_transcript, estimate_tokens
+
+if TYPE_CHECKING:
+    from agents import Agent
+
+logger = logging.getLogger(__name__)
+
+# Same rule ingestion's --tenant enforces
+_TENANT_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+# Transcripts longer than this are compacted in a worker thread
+_OFFLOAD_CHARS = 100_000
+# Uploads up to this many times TRANSCRIPT_CONDENSE_TOKENS are read whole, as compaction may still
+# bring them under it; longer ones are condensed while they are read
+_WHOLE_UPLOAD_FACTOR = 2
+
+# GENERATION_MODE=parallel: which policies apply is decided first, then each part of the output is written by its
+# own, smaller structured-output call
+_SELECTION_INSTRUCTIONS = (
+    "You decide which of the matched policies apply to the incident in a care transcript. Return the situation IDs "
+    "of those that apply, and none if no policy applies."
+)
+_PART_INSTRUCTIONS = (
+    "You are one of several assistants that together turn a care transcript and the policies that apply to it into "
+    "an incident response, each writing one part of it at the same time. {task} Follow every policy given, and no "
+    "others, and only use facts from the transcript."
+)
+EMAIL_RECIPIENTS = {
+    "supervisor": "the carer's supervisor or manager",
+    "risk_assessor": "the risk assessor",
+    "family": "the service user's family or next of kin",
+}
+
+
+async def compact(textarea_text: str, file_text: str) -> tuple[str, str]:
+    """The (textarea, file) texts after `compact_transcript`, if TRANSCRIPT_COMPACTION is on"""
+    if not config.TRANSCRIPT_COMPACTION:
+        return textarea_text, file_text
+    with span("compaction"):
+        # Compaction is pure Python; a large upload would otherwise stall every other request
+        if len(textarea_text) + len(file_text) > _OFFLOAD_CHARS:
+            compaction = await asyncio.to_thread(compact_transcript, textarea_text, file_text)
+        else:
+            compaction = compact_transcript(textarea_text, file_text)
+    logger.info(f"Compacted transcript from {compaction.original_chars} to {compaction.chars} characters")
+    return compaction.textarea_text, compaction.file_text
+
+
+async def read_transcript_inputs(text: Optional[str], file: Optional[UploadFile]) -> tuple[str, str]:
+    """Validate the request and return the compacted (textarea, file) transcript texts"""
+    textarea_text = text.strip() if text else ""
+    file_text = ""
+
+    # If file is provided, validate and extract content
+    if file:
+        try:
+            logger.info(f"Processing uploaded file: {file.filename}")
+            with span("file_validation"):
+                file_text = await process_uploaded_file(file)
+        except HTTPException:
+            raise
+        except ValueError as e:
+            logger.warning(f"File validation error: {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"File processing error: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=500, detail="Failed to process uploaded file")
+
+    return await _compacted_inputs(textarea_text, file_text)
+
+
+async def _compacted_inputs(textarea_text: str, file_text: str) -> tuple[str, str]:
+    # Ensure at least one source is provided
+    if not textarea_text and not file_text:
+        raise HTTPException(status_code=400, detail="Either text or file must be provided")
+
+    textarea_text, file_text = await compact(textarea_text, file_text)
+    if not textarea_text and not file_text:
+        raise HTTPException(status_code=400, detail="Transcript has no content after removing timestamps and filler")
+    return textarea_text, file_text
+
+
+async def read_transcript(text: Optional[str], file: Optional[UploadFile]) -> tuple[str, str, Optional[CondensedTranscript]]:
+    """
+    `read_transcript_inputs` for requests answered right away. An upload too long to
+    prompt with is condensed while it is read, holding only the chunks being worked on
+    rather than the whole transcript; the texts are then empty and the condensed
+    transcript, which includes any pasted text, stands in for them.
+    """
+    whole_tokens = config.TRANSCRIPT_CONDENSE_TOKENS * _WHOLE_UPLOAD_FACTOR
+    if not file or not whole_tokens:
+        return *await read_transcript_inputs(text, file), None
+
+    textarea_text = text.strip() if text else ""
+    logger.info(f"Processing uploaded file: {file.filename}")
+    try:
+        async with aclosing(iter_uploaded_file(file)) as pieces:
+            head: list[str] = []
+            tokens = 0
+            with span("file_validation"):
+                async for piece in pieces:
+                    head.append(piece)
+                    tokens += estimate_tokens(piece)
+                    if tokens > whole_tokens:
+                        break
+                else:
+                    file_text = "".join(head).strip()
+                    return *await _compacted_inputs(textarea_text, file_text), None
+
+            async def transcript() -> AsyncIterator[str]:
+                if textarea_text:
+                    yield textarea_text + "\n\n"
+                while head:
+                    yield head.pop(0)
+                async for piece in pieces:
+                    yield piece
+
+            with span("condense_transcript"):
+                condensed = await condense_pieces(transcript())
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Transcript condensing error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to condense long transcript")
+
+    if not condensed.chunks:
+        raise HTTPException(status_code=400, detail="Transcript has no content after removing timestamps and filler")
+    return "", "", condensed
+
+
+async def resolve_tenant(tenant: Optional[str]) -> str:
+    """The tenant whose policies a request is answered from: the one it names, else DEFAULT_TENANT"""
+    tenant = (tenant or "").strip() or config.DEFAULT_TENANT
+    if not _TENANT_PATTERN.fullmatch(tenant):
+        raise HTTPException(status_code=400, detail="Invalid tenant")
+    try:
+        known = await tenants()
+    except aiosqlite.Error as e:
+        logger.error(f"Database error listing tenants: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to retrieve policy information")
+    # The default tenant is always accepted so an empty database still answers
+    if tenant != config.DEFAULT_TENANT and tenant not in known:
+        raise HTTPException(status_code=404, detail="Unknown tenant")
+    return tenant
+
+
+def create_agent(tools: bool = True) -> "Agent":
+    # The agents SDK is imported on first use (or by the startup warmup), not with the app
+    from agents import Agent, set_default_openai_client
+    from .tools import search_policies
+
+    # Agent model calls go through the app's client, and so its rate-limit scheduler
+    set_default_openai_client(get_client(), use_for_tracing=False)
+    try:
+        return Agent(
+            name="Incident Reporter",
+            tools=[search_policies] if tools else [],
+            output_type=PolicyProcessingResults,
+        )
+    except Exception as e:
+        logger.error(f"Agent initialization error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to initialize processing agent")
+
+
+def create_part_agents() -> dict[str, "Agent"]:
+    """
+    Agents for GENERATION_MODE=parallel: the policy selection, then the report, the
+    reasoning, and the emails to each recipient type
+    """
+    from agents import Agent, set_default_openai_client
+
+    set_default_openai_client(get_client(), use_for_tracing=False)
+    parts = {
+        "report": ("Fill out the incident report only.", IncidentReport),
+        "reasoning": (
+            "Explain why the response is in line with the policies. Do not write the report or any emails.",
+            PolicyReasoning,
+        ),
+    }
+    for recipient, description in EMAIL_RECIPIENTS.items():
+        parts[f"email.{recipient}"] = (
+            f"Draft only the emails to {description} that the policies call for, if any. Do not write the report.",
+            RecipientEmails,
+        )
+    try:
+        agents = {"policies": Agent(name="Incident Reporter: policies", instructions=_SELECTION_INSTRUCTIONS, output_type=PolicySelection)}
+        agents.update(
+            (part, Agent(name=f"Incident Reporter: {part}", instructions=_PART_INSTRUCTIONS.format(task=task), output_type=output_type))
+            for part, (task, output_type) in parts.items()
+        )
+        return agents
+    except Exception as e:
+        logger.error(f"Agent initialization error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to initialize processing agent")
+
+
+def build_prompt(
+    textarea_text: str,
+    file_text: str,
+    policies: Optional[list[dict]] = None,
+    condensed: Optional[CondensedTranscript] = None,
+) -> str:
+    current_time = datetime.now().isoformat()
+
+    # Build prompt with conditional logic
+    prompt_parts = [f"Current date and time: {current_time}\n"]
+    if policies:
+        prompt_parts.append("Please use the matched policies below, which were found by searching with this transcript, and return the incident response form. Please fill out the incident report and draft any appropriate emails. Use the situation IDs of the policies you relied on as the policy IDs\n")
+        for match in policies:
+            if match.get("sections"):
+                policy = "\n\n".join(section["section_text"] for section in match["sections"])
+                policy = f"Policy {match['policy_path']} (matched sections):\n{policy}\n"
+            else:
+                policy = f"Policy:\n{match['full_policy_text']}\n"
+            prompt_parts.append(
+                f"Situation ID: {match['id']}\n"
+                f"Matched situation: {match['situation_description']}\n"
+                + policy
+            )
+    else:
+        prompt_parts.append("Please find the associated policy using summary descriptions of the situation in this transcript and return the incident response form. Please fill out the incident report and draft any appropriate emails\n")
+
+    if condensed is not None:
+        prompt_parts.append(
+            f"The transcript was too long to include in full. These are the incidents and details found in each of its "
+            f"{condensed.chunks} parts, in order:\n{condensed.text}"
+        )
+    elif textarea_text and file_text:
+        prompt_parts.append(f"Transcript from text area:\n{textarea_text}\n")
+        prompt_parts.append(f"Transcript from uploaded file:\n{file_text}")
+    elif file_text:
+        prompt_parts.append(f"Transcript: {file_text}")
+    else:
+        prompt_parts.append(f"Transcript: {textarea_text}")
+
+    return "\n".join(prompt_parts)
+
+
+async def with_full_policies(final_output: PolicyProcessingResults, tenant: str) -> PolicyProcessingResultsWithFullPolicy:
+    """Attach the full text of every policy of `tenant` the agent used"""
+    try:
+        if not final_output.policy_ids:
+            logger.warning("No policy IDs returned from agent processing")
+            full_policy_texts = []
+        else:
+            policies_used = await get_full_policy(final_output.policy_ids, tenant)
+            full_policy_texts = [i["full_policy_text"] for i in policies_used]
+            logger.info(f"Retrieved {len(full_policy_texts)} unique policies")
+    except aiosqlite.Error as e:
+        logger.error(f"Database error retrieving policies: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to retrieve policy information")
+    except KeyError as e:
+        logger.error(f"Missing expected field in policy data: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Invalid policy data structure")
+    except Exception as e:
+        logger.error(f"Unexpected error retrieving policies: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to retrieve policy information")
+
+    return PolicyProcessingResultsWithFullPolicy(
+        policy_ids=final_output.policy_ids,
+        emails=final_output.emails,
+        report=final_output.report,
+        reasoning=final_output.reasoning,
+        full_policy_texts=full_policy_texts,
+    )
+
+
+async def pre_retrieve(textarea_text: str, file_text: str, tenant: str, condensed: Optional[CondensedTranscript] = None) -> Optional[list[dict]]:
+    """
+    Search for policies with the transcript itself, or the incidents of a condensed
+    one, so the agent can answer in a single turn instead of first calling
+    `search_policies`. Returns None when the closest match is further than
+    PRE_RETRIEVAL_MAX_DISTANCE, or the search fails, so the caller can fall back to
+    tool calling.
+    """
+    if condensed is not None and condensed.incidents:
+        query = condensed.incidents[:config.SEARCH_MAX_QUERIES]
+    else:
+        text = condensed.text if condensed is not None else "\n".join(t for t in (textarea_text, file_text) if t)
+        query = text[:config.PRE_RETRIEVAL_QUERY_CHARS]
+    try:
+        with span("pre_retrieval"):
+            results = await search_situation(description=query, policies=config.PRE_RETRIEVAL_POLICIES, tenant=tenant)
+    except Exception as e:
+        logger.warning(f"Pre-retrieval failed, falling back to tool calling: {str(e)}")
+        return None
+
+    # Lexical-only results carry no distance and are accepted as they are
+    distances = [r["distance"] for r in results if r["distance"] is not None]
+    if not results or (distances and min(distances) > config.PRE_RETRIEVAL_MAX_DISTANCE):
+        best = f"{min(distances):.3f}" if distances else "none"
+        logger.info(f"Pre-retrieval best distance {best} above {config.PRE_RETRIEVAL_MAX_DISTANCE}, falling back to tool calling")
+        return None
+    return results[:config.PRE_RETRIEVAL_POLICIES]
+
+
+async def condense(textarea_text: str, file_text: str) -> Optional[CondensedTranscript]:
+    """The transcript condensed chunk by chunk if it is too long to prompt with, else None"""
+    try:
+        with span("condense_transcript"):
+            return await condense_transcript("\n\n".join(t for t in (textarea_text, file_text) if t))
+    except Exception as e:
+        logger.error(f"Transcript condensing error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to condense long transcript")
+
+
+async def prepare_agent(
+    textarea_text: str, file_text: str, tenant: str, condensed: Optional[CondensedTranscript] = None
+) -> tuple["Agent", str, Optional[list[dict]], Optional[CondensedTranscript]]:
+    """
+    Build the agent and prompt for the configured RETRIEVAL_MODE, with any pre-retrieved
+    policies and, for a long transcript, its condensed version. A transcript already
+    condensed by `read_transcript` is passed as `condensed`.
+    """
+    if condensed is None:
+        condensed = await condense(textarea_text, file_text)
+    # Parallel generation has no tool calling, so it needs the policies up front
+    retrieve = config.RETRIEVAL_MODE == "pre" or config.GENERATION_MODE == "parallel"
+    policies = await pre_retrieve(textarea_text, file_text, tenant, condensed) if retrieve else None
+    agent = create_agent(tools=policies is None)
+    return agent, build_prompt(textarea_text, file_text, policies, condensed), policies, condensed
+
+
+async def _run_part(part: str, agent: "Agent", prompt: str, tenant: str) -> Any:
+    from agents import Runner
+    from .agent_hooks import AgentMetricsHooks
+    from .tools import ReportContext
+
+    with span(f"agent_part.{part}"):
+        result = await Runner.run(agent, prompt, context=ReportContext(tenant), hooks=AgentMetricsHooks())
+    return result.final_output_as(agent.output_type)
+
+
+@dataclass
+class PartsPlan:
+    agents: dict[str, "Agent"]
+    prompt: str  # the prompt with only the policies that apply
+    policy_ids: list[str]
+    tasks: dict[str, asyncio.Task] = field(default_factory=dict)  # parts already running
+
+
+async def plan_parts(
+    textarea_text: str, file_text: str, prompt: str, policies: list[dict], condensed: Optional[CondensedTranscript], tenant: str
+) -> Optional[PartsPlan]:
+    """
+    GENERATION_MODE=parallel, first step: fix which matched policies apply, so the report,
+    reasoning and every email follow the same ones. Returns None when none of them apply,
+    for the single agent to handle instead.
+
+    The parts start with every matched policy while the selection runs, and keep running
+    if it picks them all; otherwise they are cancelled and started again with those that
+    apply.
+    """
+    agents = create_part_agents()
+    selector = agents.pop("policies")
+    plan = PartsPlan(agents=agents, prompt=prompt, policy_ids=[str(match["id"]) for match in policies])
+    run_parts(plan, tenant)
+    try:
+        selection: PolicySelection = await _run_part("policies", selector, prompt, tenant)
+    except Exception as e:
+        await cancel_parts(plan)
+        logger.error(f"Agent processing error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to process transcript with agent")
+    selected = set(selection.policy_ids)
+    applying = [match for match in policies if str(match["id"]) in selected]
+    if len(applying) == len(policies):
+        return plan
+    await cancel_parts(plan)
+    if not applying:
+        logger.info("No matched policy applies, falling back to single agent generation")
+        return None
+    logger.info(f"{len(applying)} of {len(policies)} matched policies apply, restarting the parts with them")
+    return PartsPlan(
+        agents=agents,
+        prompt=build_prompt(textarea_text, file_text, applying, condensed),
+        policy_ids=[str(match["id"]) for match in applying],
+    )
+
+
+def run_parts(plan: PartsPlan, tenant: str) -> dict[str, asyncio.Task]:
+    """Start every part of `plan` not running yet, all at once"""
+    for part, agent in plan.agents.items():
+        if part not in plan.tasks:
+            plan.tasks[part] = asyncio.create_task(_run_part(part, agent, plan.prompt, tenant))
+    return plan.tasks
+
+
+async def cancel_parts(plan: PartsPlan):
+    """Cancel the parts of `plan` still running and wait for them to stop"""
+    for task in plan.tasks.values():
+        task.cancel()
+    await asyncio.gather(*plan.tasks.values(), return_exceptions=True)
+
+
+def assemble_parts(plan: PartsPlan, outputs: dict[str, Any]) -> PolicyProcessingResults:
+    """The single agent's output from the parts, emails in the order of `outputs`"""
+    return PolicyProcessingResults(
+        emails=[email for part, output in outputs.items() if part.startswith("email.") for email in output.emails],
+        report=outputs["report"],
+        policy_ids=plan.policy_ids,
+        reasoning=outputs["reasoning"].reasoning,
+    )
+
+
+async def generate_parts(plan: PartsPlan, tenant: str) -> PolicyProcessingResults:
+    """GENERATION_MODE=parallel: wall-clock time is that of the slowest part, not the sum of them"""
+    tasks = run_parts(plan, tenant)
+    try:
+        await asyncio.gather(*tasks.values())
+    finally:
+        # One part failed: the others are wasted work
+        await cancel_parts(plan)
+    return assemble_parts(plan, {part: task.result() for part, task in tasks.items()})
+
+
+async def generate_report(
+    textarea_text: str, file_text: str, tenant: str = config.DEFAULT_TENANT, condensed: Optional[CondensedTranscript] = None
+) -> PolicyProcessingResultsWithFullPolicy:
+    """Run the incident reporter agent over a validated transcript, using `tenant`'s policies"""
+    from agents import Runner
+    from .agent_hooks import AgentMetricsHooks
+    from .tools import ReportContext
+
+    agent, prompt, policies, condensed = await prepare_agent(textarea_text, file_text, tenant, condensed)
+
+    # Run agent
+    try:
+        with span("agent_run"):
+            plan = None
+            if policies and config.GENERATION_MODE == "parallel":
+                plan = await plan_parts(textarea_text, file_text, prompt, policies, condensed, tenant)
+            if plan is not None:
+                logger.info(f"Starting parallel agent processing. Policy IDs: {plan.policy_ids}")
+                final_output = await generate_parts(plan, tenant)
+            else:
+                logger.info("Starting agent processing")
+                result = await Runner.run(agent, prompt, context=ReportContext(tenant), hooks=AgentMetricsHooks())
+                final_output = result.final_output_as(PolicyProcessingResults)
+        logger.info(f"Agent processing complete. Policy IDs: {final_output.policy_ids}")
+    except Exception as e:
+        logger.error(f"Agent processing error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to process transcript with agent")
+
+    return await with_full_policies(final_output, tenant)
+
+
+class PartialOutputParser:
+    """
+    Incrementally parses the streamed JSON of a `PolicyProcessingResults` output and
+    reports report fields and emails as soon as they are complete.
+
+    Incomplete trailing strings are dropped by the partial parser, so a report field
+    appears only once its value is final. Emails are emitted once their last field
+    (`body`) is complete and the email validates.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.report_fields: dict[str, Any] = {}
+        self.emails_sent = 0
+
+    def reset(self):
+        self.buffer = ""
+
+    def feed(self, delta: str) -> list[tuple[str, dict]]:
+        self.buffer += delta
+        try:
+            partial = from_json(self.buffer, allow_partial=True)
+        except ValueError:
+            return []
+        if not isinstance(partial, dict):
+            return []
+
+        events = []
+        report = partial.get("report")
+        if isinstance(report, dict):
+            for field, value in report.items():
+                if field not in self.report_fields:
+                    self.report_fields[field] = value
+                    events.append(("report_field", {"field": field, "value": value}))
+
+        emails = partial.get("emails")
+        if isinstance(emails, list):
+            while self.emails_sent < len(emails):
+                candidate = emails[self.emails_sent]
+                if not isinstance(candidate, dict) or "body" not in candidate:
+                    break
+                try:
+                    email = Email.model_validate(candidate)
+                except ValidationError:
+                    break
+                events.append(("email", {"index": self.emails_sent, "email": email.model_dump()}))
+                self.emails_sent += 1
+        return events
+
+
+def _tool_result_event(output: Any) -> dict:
+    results = output if isinstance(output, list) else []
+    return {
+        "situation_ids": [r.get("id") for r in results if isinstance(r, dict)],
+        "policy_ids": [r.get("policy_id") for r in results if isinstance(r, dict)],
+    }
+
+
+async def stream_report(
+    textarea_text: str, file_text: str, tenant: str = config.DEFAULT_TENANT, condensed: Optional[CondensedTranscript] = None
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Streamed variant of `generate_report`, yielding (event, data) pairs:
+
+    - transcript_condensed: a long transcript was condensed before the agent ran, with
+      its chunk count and token counts before and after
+    - tool_call: a policy search was issued, with its descriptions
+    - tool_result: situation and policy ids the search matched
+    - report_field: one completed incident report field
+    - email: one completed email
+    - final: the full `PolicyProcessingResultsWithFullPolicy` payload
+
+    In pre-retrieval mode the up-front search is reported as a single `tool_result`.
+    In parallel generation mode report fields arrive together once the report is
+    written, and emails are numbered, and listed in `final`, in the order they finish.
+    """
+    from agents import Runner
+    from .agent_hooks import AgentMetricsHooks
+    from .tools import ReportContext
+
+    agent, prompt, policies, condensed = await prepare_agent(textarea_text, file_text, tenant, condensed)
+    parser = PartialOutputParser()
+    if condensed is not None:
+        yield "transcript_condensed", {"chunks": condensed.chunks, "tokens": condensed.original_tokens, "condensed_tokens": condensed.tokens}
+    if policies:
+        yield "tool_result", _tool_result_event(policies)
+
+    plan = None
+    if policies and config.GENERATION_MODE == "parallel":
+        plan = await plan_parts(textarea_text, file_text, prompt, policies, condensed, tenant)
+    if plan is not None:
+        outputs: dict[str, Any] = {}
+        async for item in stream_parts(plan, tenant, outputs):
+            yield item
+        final_output = assemble_parts(plan, outputs)
+    else:
+        try:
+            logger.info("Starting streamed agent processing")
+            result = Runner.run_streamed(agent, prompt, context=ReportContext(tenant), hooks=AgentMetricsHooks())
+            async for event in result.stream_events():
+                if event.type == "raw_response_event":
+                    if event.data.type == "response.created":
+                        parser.reset()
+                    elif event.data.type == "response.output_text.delta":
+                        for item in parser.feed(event.data.delta):
+                            yield item
+                elif event.type == "run_item_stream_event":
+                    if event.name == "tool_called":
+                        try:
+                            arguments = json.loads(getattr(event.item.raw_item, "arguments", "") or "{}")
+                        except json.JSONDecodeError:
+                            arguments = {}
+                        yield "tool_call", {"descriptions": arguments.get("descriptions")}
+                    elif event.name == "tool_output":
+                        yield "tool_result", _tool_result_event(event.item.output)
+            final_output = result.final_output_as(PolicyProcessingResults)
+            logger.info(f"Streamed agent processing complete. Policy IDs: {final_output.policy_ids}")
+        except Exception as e:
+            logger.error(f"Agent processing error: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=500, detail="Failed to process transcript with agent")
+
+    response = await with_full_policies(final_output, tenant)
+    yield "final", response.model_dump()
+
+
+async def stream_parts(plan: PartsPlan, tenant: str, outputs: dict[str, Any]) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Run the parallel generation parts, yielding `report_field` and `email` events as
+    each part finishes and collecting the part outputs into `outputs` in that order
+    """
+    logger.info(f"Starting streamed parallel agent processing. Policy IDs: {plan.policy_ids}")
+    tasks = run_parts(plan, tenant)
+    parts = {task: part for part, task in tasks.items()}
+    emails = 0
+    try:
+        pending = set(tasks.values())
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                part, output = parts[task], task.result()
+                outputs[part] = output
+                if part == "report":
+                    for field, value in output.model_dump().items():
+                        yield "report_field", {"field": field, "value": value}
+                elif part.startswith("email."):
+                    for email in output.emails:
+                        yield "email", {"index": emails, "email": email.model_dump()}
+                        emails += 1
+        logger.info("Streamed parallel agent processing complete")
+    except Exception as e:
+        logger.error(f"Agent processing error: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to process transcript with agent")
+    finally:
+        await cancel_parts(plan)
+
+
+async def _run_report_job(payload: dict) -> dict:
+    # Jobs queued before tenants existed have none
+    result = await generate_report(payload["textarea_text"], payload["file_text"], payload.get("tenant", config.DEFAULT_TENANT))
+    return result.model_dump()
+
+
+job_queue = JobQueue(
+    config.JOBS_DB_PATH,
+    workers=config.JOB_WORKERS,
+    handler=_run_report_job,
+    max_attempts=config.JOB_MAX_ATTEMPTS,
+    retention=config.JOB_RETENTION,
+    lease=config.JOB_LEASE,
+)
+
+
+async def submit_report_job(textarea_text: str, file_text: str, tenant: str = config.DEFAULT_TENANT) -> str:
+    # Transcripts are job inputs, kept out of the job row and dropped once the job finishes
+    return await job_queue.submit({"tenant": tenant}, inputs={"textarea_text": textarea_text, "file_text": file_text})
+
+
+@dataclass
+class BatchItem:
+    index: int
+    id: Optional[str]
+    textarea_text: str = ""
+    file_text: str = ""
+    error: Optional[HTTPException] = None
+
+
+async def read_batch_inputs(files: list[UploadFile], jsonl: Optional[UploadFile]) -> list[BatchItem]:
+    """
+    Validate every transcript of a batch request up front. A file that fails validation
+    becomes a failed item rather than failing the batch; a malformed JSONL upload
+    fails the whole request.
+    """
+    items: list[BatchItem] = []
+    for file in files:
+        item = BatchItem(index=len(items), id=file.filename)
+        try:
+            _, item.file_text = await compact("", await process_uploaded_file(file))
+            if not item.file_text:
+                raise HTTPException(status_code=400, detail="File is empty")
+        except HTTPException as e:
+            item.error = e
+        except Exception as e:
+            logger.error(f"File processing error: {str(e)}", exc_info=True)
+            item.error = HTTPException(status_code=500, detail="Failed to process uploaded file")
+        items.append(item)
+
+    if jsonl:
+        for line in await process_uploaded_jsonl(jsonl):
+            item = BatchItem(index=len(items), id=str(line["id"]) if line.get("id") is not None else None)
+            text = line.get("text")
+            if isinstance(text, str) and text.strip():
+                item.textarea_text, _ = await compact(text.strip(), "")
+                if not item.textarea_text:
+                    item.error = HTTPException(status_code=400, detail="Transcript has no content after removing timestamps and filler")
+            else:
+                item.error = HTTPException(status_code=400, detail="Line must have a non-empty \"text\" field")
+            items.append(item)
+
+    if not items:
+        raise HTTPException(status_code=400, detail="At least one file or a JSONL upload must be provided")
+    if len(items) > config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {config.BATCH_MAX_ITEMS} transcripts")
+    return items
+
+
+async def generate_reports(items: list[BatchItem], concurrency: int, tenant: str = config.DEFAULT_TENANT) -> AsyncIterator[BatchItemResult]:
+    """Run `generate_report` over a batch, at most `concurrency` at a time, yielding results as they finish"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(item: BatchItem) -> BatchItemResult:
+        if item.error is not None:
+            return BatchItemResult(index=item.index, id=item.id, status="failed", status_code=item.error.status_code, error=str(item.error.detail))
+        async with semaphore:
+            try:
+                result = await generate_report(item.textarea_text, item.file_text, tenant)
+            except HTTPException as e:
+                return BatchItemResult(index=item.index, id=item.id, status="failed", status_code=e.status_code, error=str(e.detail))
+            except Exception as e:
+                logger.error(f"Unexpected error processing batch item {item.index}: {str(e)}", exc_info=True)
+                return BatchItemResult(index=item.index, id=item.id, status="failed", status_code=500, error="An unexpected error occurred while processing the transcript")
+        return BatchItemResult(index=item.index, id=item.id, status="succeeded", result=result)
+
+    # Batch traffic yields to interactive requests for OpenAI capacity
+    with lane(BATCH):
+        tasks = [asyncio.create_task(process(item)) for item in items]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # Client went away or the consumer stopped early: don't keep spending on the rest
+        for task in tasks:
+            task.cancel()
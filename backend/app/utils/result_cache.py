@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+import logging
+from .. import config
+
+logger = logging.getLogger(__name__)
+
+HIT = "HIT"
+MISS = "MISS"
+COALESCED = "COALESCED"
+BYPASS = "BYPASS"
+
+
+def normalize_transcript(text: str) -> str:
+    """Normalize line endings and runs of whitespace so resubmissions hash identically"""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(" ".join(line.split()) for line in lines).strip()
+
+
+def result_key(textarea_text: str, file_text: str, corpus_version: str, tenant: str) -> str:
+    parts = [normalize_transcript(textarea_text), normalize_transcript(file_text), corpus_version, tenant]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of processed transcripts that also coalesces concurrent identical
+    submissions into a single run.
+
+    Keys include the policy corpus version, and entries from an older version are
+    dropped the first time a newer version is seen.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._version: Optional[str] = None
+
+    def _check_version(self, corpus_version: str):
+        if self._version != corpus_version:
+            if self._version is not None and self._entries:
+                logger.info(f"Policy corpus changed, dropping {len(self._entries)} cached results")
+            self._entries.clear()
+            self._version = corpus_version
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: dict):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_run(
+        self,
+        key: str,
+        corpus_version: str,
+        run: Callable[[], Awaitable[dict]],
+        refresh: bool = False,
+    ) -> tuple[dict, str]:
+        """
+        Return the cached result for `key` or compute it with `run`. Returns the result
+        and how it was served (HIT, MISS, COALESCED or BYPASS). `refresh` skips both the
+        cache and any in-flight run, and stores the fresh result.
+        """
+        self._check_version(corpus_version)
+
+        if not refresh:
+            cached = self.get(key)
+            if cached is not None:
+                return cached, HIT
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                # Shield so one caller disconnecting doesn't cancel the shared run
+                return await asyncio.shield(inflight), COALESCED
+
+        async def run_and_store() -> dict:
+            try:
+                result = await run()
+                if self._version == corpus_version:
+                    self.set(key, result)
+                return result
+            finally:
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+
+        task = asyncio.create_task(run_and_store())
+        self._inflight[key] = task
+        return await asyncio.shield(task), BYPASS if refresh else MISS
+
+
+result_cache = ResultCache(max_entries=config.RESULT_CACHE_SIZE, ttl=config.RESULT_CACHE_TTL)
@@ -0,0 +1,59 @@
+import httpx
+from .. import config
+from .scheduler import RequestScheduler
+
+# Rough prompt size from the request body; the scheduler only needs an estimate
+_BYTES_PER_TOKEN = 4
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    try:
+        tokens = len(request.content) // _BYTES_PER_TOKEN
+    except httpx.RequestNotRead:
+        # Streamed upload; only the output allowance applies
+        tokens = 0
+    if request.url.path.endswith(("/responses", "/chat/completions")):
+        tokens += config.OPENAI_OUTPUT_TOKENS_ESTIMATE
+    return max(1, tokens)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the scheduler slot back once it has been read or closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """httpx transport that admits every request through a `RequestScheduler` first"""
+
+    def __init__(self, scheduler: RequestScheduler, transport: httpx.AsyncBaseTransport):
+        self.scheduler = scheduler
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        lane = await self.scheduler.acquire(estimate_tokens(request))
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self.scheduler.release()
+            raise
+        self.scheduler.observe(lane, response.status_code, response.headers)
+        response.stream = _ReleasingStream(response.stream, self.scheduler.release)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,207 @@
+import asyncio
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Mapping, Optional
+import logging
+from .. import config
+from .metrics import openai_queue_depth, openai_queue_wait_seconds, openai_requests
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+# Highest priority first
+LANES = (INTERACTIVE, BATCH)
+
+_lane: ContextVar[str] = ContextVar("openai_lane", default=INTERACTIVE)
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_MAX_BACKOFF = 60.0
+
+
+@contextmanager
+def lane(name: str) -> Iterator[None]:
+    """Send the OpenAI requests made inside the block (and tasks started from it) through lane `name`"""
+    if name not in LANES:
+        raise ValueError(f"Unknown lane: {name}")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def set_lane(name: str):
+    """Like `lane`, for the rest of the current task"""
+    if name not in LANES:
+        raise ValueError(f"Unknown lane: {name}")
+    _lane.set(name)
+
+
+def current_lane() -> str:
+    return _lane.get()
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Seconds in an OpenAI reset header such as `20ms`, `1s` or `6m0s`"""
+    parts = _DURATION.findall(value or "")
+    if not parts:
+        return None
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """`per_minute` units, refilled continuously"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def limit(self, remaining: float, now: float):
+        """Never assume more budget than the server says is left"""
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+
+@dataclass
+class _Waiter:
+    tokens: int
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class RequestScheduler:
+    """
+    Admission control for every OpenAI request the app makes.
+
+    Requests wait in one FIFO queue per priority lane and are admitted highest lane
+    first, subject to a concurrency cap and token buckets for requests and tokens per
+    minute (a limit of 0 disables it, as does a cap of 0). Rate-limit response headers shrink the buckets
+    to what the server reports as remaining, and a 429 pauses every lane until the
+    server's retry or reset time, backing off further on consecutive 429s.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int, max_concurrency: int):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self._waiters: dict[str, deque[_Waiter]] = {name: deque() for name in LANES}
+        self._paused_until = 0.0
+        self._backoff = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def depth(self, name: Optional[str] = None) -> int:
+        if name is not None:
+            return len(self._waiters[name])
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def acquire(self, tokens: int) -> str:
+        """Wait for a slot for a request of about `tokens` tokens; returns the lane it ran in"""
+        name = current_lane()
+        waiter = _Waiter(tokens, asyncio.get_running_loop().create_future())
+        self._waiters[name].append(waiter)
+        openai_queue_depth.inc(lane=name)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release()
+            elif waiter in self._waiters[name]:
+                self._waiters[name].remove(waiter)
+                openai_queue_depth.dec(lane=name)
+            raise
+        openai_queue_wait_seconds.observe(time.monotonic() - waiter.enqueued, lane=name)
+        return name
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def _next(self) -> Optional[tuple[str, _Waiter]]:
+        for name in LANES:
+            waiters = self._waiters[name]
+            while waiters and waiters[0].future.done():
+                waiters.popleft()
+                openai_queue_depth.dec(lane=name)
+            if waiters:
+                return name, waiters[0]
+        return None
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.max_concurrency <= 0 or self.active < self.max_concurrency:
+            found = self._next()
+            if found is None:
+                return
+            name, waiter = found
+            now = time.monotonic()
+            delay = max(
+                self._paused_until - now,
+                self.requests.wait_time(1, now) if self.requests else 0.0,
+                self.tokens.wait_time(waiter.tokens, now) if self.tokens else 0.0,
+            )
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            if self.requests:
+                self.requests.take(1, now)
+            if self.tokens:
+                self.tokens.take(waiter.tokens, now)
+            self._waiters[name].popleft()
+            openai_queue_depth.dec(lane=name)
+            self.active += 1
+            waiter.future.set_result(None)
+
+    def observe(self, name: str, status: int, headers: Mapping[str, str]):
+        """Adapt to a response's status and rate-limit headers"""
+        openai_requests.inc(lane=name, status=str(status))
+        now = time.monotonic()
+        if self.requests and headers.get("x-ratelimit-remaining-requests"):
+            self.requests.limit(float(headers["x-ratelimit-remaining-requests"]), now)
+        if self.tokens and headers.get("x-ratelimit-remaining-tokens"):
+            self.tokens.limit(float(headers["x-ratelimit-remaining-tokens"]), now)
+
+        if status != 429:
+            self._backoff = 0.0
+            return
+        if headers.get("retry-after-ms"):
+            wait = float(headers["retry-after-ms"]) / 1000
+        elif headers.get("retry-after", "").replace(".", "", 1).isdigit():
+            wait = float(headers["retry-after"])
+        else:
+            resets = [parse_duration(headers.get(h, "")) for h in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+            wait = max((r for r in resets if r is not None), default=1.0)
+        self._backoff = min(_MAX_BACKOFF, max(wait, self._backoff * 2 or wait))
+        self._paused_until = max(self._paused_until, now + self._backoff)
+        logger.warning(f"OpenAI rate limited, pausing requests for {self._backoff:.2f}s")
+
+
+scheduler = RequestScheduler(
+    requests_per_minute=config.OPENAI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=config.OPENAI_TOKENS_PER_MINUTE,
+    max_concurrency=config.OPENAI_MAX_CONCURRENCY,
+)
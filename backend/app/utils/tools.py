@@ -1,19 +1,27 @@
-from agents import function_tool
+from dataclasses import dataclass
+from agents import RunContextWrapper, function_tool
 from ..db.db import search_situation
 from ..schemas import SituationSearchResult
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class ReportContext:
+    """Run context of the incident reporter; its tools only see this tenant's policies"""
+    tenant: str
+
+
 @function_tool
-async def search_policies(description: str) -> SituationSearchResult:
-    """Search for the associated policy of the incident using a summary description of the situation. This will return closely related policies.
+async def search_policies(ctx: RunContextWrapper[ReportContext], descriptions: list[str]) -> list[SituationSearchResult]:
+    """Search for the associated policy of the incident using summary descriptions of the situation. This will return closely related policies, the best match per policy across all descriptions, with the sections of each policy that match and the policy's path. To try several phrasings or aspects of the incident, pass them together in one call rather than calling this tool repeatedly.
 
     Args:
-        description: A couple sentence summary of the situation used to search.
+        descriptions: One or more couple sentence summaries of the situation used to search.
     """
-    logger.info(f"Searching policies for: {description[:100]}...")
-    results = await search_situation(description=description)
+    logger.info(f"Searching policies for {len(descriptions)} descriptions: {[d[:100] for d in descriptions]}")
+    results = await search_situation(description=descriptions, tenant=ctx.context.tenant)
     logger.info(f"Found {len(results)} matching policies")
     return results
 
@@ -0,0 +1,352 @@
+import asyncio
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Optional
+import logging
+from .. import config
+from ..clients import get_client
+from ..schemas import TranscriptNotes
+from .metrics import record_compaction, record_tokens, span
+
+logger = logging.getLogger(__name__)
+
+# Rough size of transcript text, as the scheduler estimates it
+_CHARS_PER_TOKEN = 4
+# Where a chunk may end, most preferred first: blank lines, line ends, sentence ends, spaces
+_BREAKS = ("\n\n", "\n", ". ", " ")
+# Condensed notes longer than the threshold are condensed again, at most this many times
+_MAX_ROUNDS = 3
+
+# Compaction. Subtitle scaffolding: the WEBVTT header, cue timings, and the cue numbers right above them
+_SUBTITLE_HEADER = re.compile(r"^WEBVTT\b")
+_CUE_TIMING = re.compile(r"^[\d:.,]+\s*-->\s*[\d:.,]+")
+_CUE_NUMBER = re.compile(r"^\d+$")
+# Recording offsets in brackets, anywhere in a line: [00:12], (1:02:03)
+_TIMESTAMP = re.compile(r"[\[(]\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d+)?[\])]\s*(?:-\s*)?")
+# Unbracketed offsets with seconds opening a line (00:01:23.456). Only stripped from subtitles and from
+# transcripts where at least half the lines open with one; otherwise "14:05:00" is likely when something happened.
+_LEADING_TIMESTAMP = re.compile(r"^\d{1,2}:\d{2}:\d{2}(?:[.,]\d+)?\s*(?:-\s*)?")
+# "Name:" or "Speaker 2:" opening a line
+_SPEAKER = re.compile(r"^([A-Z][\w.'-]*(?: [\w.'-]+){0,3}):\s+")
+# Headings of notes and emails that look like a speaker label but aren't one, matched on the label's first word
+_NOT_SPEAKERS = frozenset(
+    "note notes nb ps p.s re fw fwd subject action actions todo date time location summary update outcome agenda "
+    "attendees present reason".split()
+)
+# Hesitations only: "er" and "mm" are left alone as they also mean ER and millimetres
+_FILLER = re.compile(r"\b(?:u+m+|u+h+|e+r+m+|h+m+)\b[,.]?\s*", re.IGNORECASE)
+_WHITESPACE = re.compile(r"[ \t\u00a0]+")
+_ZERO_WIDTH = re.compile(r"[\u200b-\u200d\ufeff]")
+# An utterance made only of these words is a greeting or sign-off; only its first occurrence is kept
+_GREETING_WORDS = frozenset(
+    "hello hi hey hiya morning afternoon evening good can you hear me are there bye goodbye thanks thank".split()
+)
+# Word n-grams compared to spot the same transcript pasted and uploaded
+_SHINGLE = 5
+# Share of the shorter copy's n-grams found in the longer one for it to count as a duplicate
+_NEAR_DUPLICATE = 0.9
+
+_INSTRUCTIONS = """
+You are reading part {part} of a long care transcript. List every incident, concern or
+change in a service user's condition it describes, each as a one or two sentence summary that names
+who was involved. Separately list the facts an incident report would need: names, dates and times,
+locations, injuries, actions taken and who was informed. Leave both lists empty if there is nothing
+relevant. Do not invent anything the text does not say.
+"""
+
+
+@dataclass
+class CondensedTranscript:
+    text: str  # what the agent reads instead of the transcript
+    incidents: list[str]  # incident summaries in transcript order, used as search queries
+    chunks: int
+    original_tokens: int
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // _CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class Compaction:
+    textarea_text: str
+    file_text: str
+    original_chars: int
+    chars: int
+
+
+def _normalized(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+
+def _compact_lines(text: str) -> list[tuple[Optional[str], str]]:
+    """The (speaker, utterance) turns of a transcript, consecutive lines of one speaker merged"""
+    text = _ZERO_WIDTH.sub("", unicodedata.normalize("NFC", text))
+    lines = [line for line in (_WHITESPACE.sub(" ", line).strip() for line in text.splitlines()) if line]
+    cues = [bool(_CUE_TIMING.match(line)) for line in lines]
+    subtitles = any(cues) or bool(lines and _SUBTITLE_HEADER.match(lines[0]))
+    offsets = sum(1 for line in lines if _LEADING_TIMESTAMP.match(line))
+    strip_leading = subtitles or (offsets >= 2 and 2 * offsets >= len(lines))
+
+    turns: list[tuple[Optional[str], list[str]]] = []
+    greetings: set[str] = set()
+    previous: tuple[Optional[str], str] = (None, "")
+    for i, line in enumerate(lines):
+        if cues[i] or (i == 0 and _SUBTITLE_HEADER.match(line)):
+            continue
+        # A number is only a cue number when a cue timing follows; otherwise it is an answer, a room, a bed
+        if i + 1 < len(lines) and cues[i + 1] and _CUE_NUMBER.match(line):
+            continue
+        line = _TIMESTAMP.sub("", line)
+        if strip_leading:
+            line = _LEADING_TIMESTAMP.sub("", line)
+        labelled = _SPEAKER.match(line)
+        if labelled and labelled.group(1).split()[0].rstrip(".").casefold() in _NOT_SPEAKERS:
+            labelled = None
+        speaker = labelled.group(1) if labelled else None
+        utterance = _FILLER.sub("", line[labelled.end():] if labelled else line).strip(" ,")
+        words = _normalized(utterance)
+        if not words or (speaker, words) == previous:
+            continue
+        previous = (speaker, words)
+        if set(words.split()) <= _GREETING_WORDS:
+            if words in greetings:
+                continue
+            greetings.add(words)
+        if turns and speaker is not None and turns[-1][0] == speaker:
+            turns[-1][1].append(utterance)
+        else:
+            turns.append((speaker, [utterance]))
+    return [(speaker, " ".join(utterances)) for speaker, utterances in turns]
+
+
+def _render_turns(turns: list[tuple[Optional[str], str]]) -> str:
+    return "\n".join(f"{speaker}: {utterance}" if speaker else utterance for speaker, utterance in turns)
+
+
+def _shingles(text: str) -> set[str]:
+    words = _normalized(text).split()
+    return {" ".join(words[i:i + _SHINGLE]) for i in range(max(1, len(words) - _SHINGLE + 1))}
+
+
+def compact_transcript(textarea_text: str, file_text: str) -> Compaction:
+    """
+    Deterministically shrink a transcript before any model sees it: normalize
+    whitespace, drop subtitle scaffolding and timestamps, hesitation fillers, repeated
+    utterances and repeated greetings, and merge consecutive lines of one speaker.
+
+    When the same transcript arrives both pasted and uploaded, the shorter copy is
+    dropped if almost all of it appears in the other; otherwise pasted turns that
+    also occur in the file are dropped.
+    """
+    # The same text pasted and uploaded is only compacted once
+    textarea_turns = _compact_lines(textarea_text) if textarea_text.strip() != file_text.strip() else []
+    file_turns = _compact_lines(file_text)
+    if textarea_turns and file_turns:
+        shorter, longer = sorted((textarea_turns, file_turns), key=lambda turns: len(_render_turns(turns)))
+        small, large = _shingles(_render_turns(shorter)), _shingles(_render_turns(longer))
+        if len(small & large) >= _NEAR_DUPLICATE * len(small):
+            if shorter is textarea_turns:
+                textarea_turns = []
+            else:
+                file_turns = []
+        else:
+            in_file = {_normalized(utterance) for _, utterance in file_turns}
+            textarea_turns = [turn for turn in textarea_turns if _normalized(turn[1]) not in in_file]
+
+    compaction = Compaction(
+        textarea_text=_render_turns(textarea_turns),
+        file_text=_render_turns(file_turns),
+        original_chars=len(textarea_text) + len(file_text),
+        chars=0,
+    )
+    compaction.chars = len(compaction.textarea_text) + len(compaction.file_text)
+    record_compaction(compaction.original_chars, compaction.chars)
+    return compaction
+
+
+def _cut(text: str, max_chars: int) -> tuple[list[str], int]:
+    """The chunks `text` is cut into while more than `max_chars` of it is left, and where the rest starts"""
+    chunks = []
+    start = 0
+    while len(text) - start > max_chars:
+        cut = start + max_chars
+        for separator in _BREAKS:
+            found = text.rfind(separator, start + max_chars // 2, start + max_chars)
+            if found != -1:
+                cut = found + len(separator)
+                break
+        chunk = text[start:cut].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = cut
+    return chunks, start
+
+
+def segment(text: str, max_chars: int) -> list[str]:
+    """
+    Cut `text` into chunks of at most `max_chars`, ending each at the latest blank line,
+    line end, sentence end or space in its second half. Only the chunks are copied, never
+    the rest of the text.
+    """
+    chunks, start = _cut(text, max_chars)
+    if text[start:].strip():
+        chunks.append(text[start:].strip())
+    return chunks
+
+
+class Segmenter:
+    """
+    `segment` for text that arrives piece by piece, such as an upload being read: each
+    chunk is returned as soon as the text after it has arrived, and only the text not
+    yet in a chunk is kept. The chunks are the ones `segment` cuts the whole text into.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._rest = ""
+
+    def feed(self, text: str) -> list[str]:
+        self._rest += text
+        chunks, start = _cut(self._rest, self.max_chars)
+        self._rest = self._rest[start:]
+        return chunks
+
+    def finish(self) -> list[str]:
+        rest, self._rest = self._rest.strip(), ""
+        return [rest] if rest else []
+
+
+async def extract_notes(chunk: str, part: int) -> TranscriptNotes:
+    """Incidents and report details mentioned in one chunk of a transcript"""
+    response = await get_client().responses.parse(
+        model=config.TRANSCRIPT_SUMMARY_MODEL,
+        input=[
+            {"role": "system", "content": _INSTRUCTIONS.format(part=part)},
+            {"role": "user", "content": chunk},
+        ],
+        text_format=TranscriptNotes,
+    )
+    if response.usage is not None:
+        record_tokens(response.usage)
+    return response.output_parsed
+
+
+async def _iterate(chunks: list[str]) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def _map(chunks: AsyncIterable[str]) -> list[TranscriptNotes]:
+    """
+    Notes of every chunk, at most TRANSCRIPT_MAP_CONCURRENCY extracted at once. The next
+    chunk is only taken once one of those is done, so chunks cut from an upload being read
+    are held no faster than they are processed.
+    """
+    slots = asyncio.Semaphore(config.TRANSCRIPT_MAP_CONCURRENCY)
+    tasks: list[asyncio.Task] = []
+
+    async def extract(part: int, chunk: str) -> TranscriptNotes:
+        try:
+            with span("transcript_chunk"):
+                return await extract_notes(chunk, part)
+        finally:
+            slots.release()
+
+    try:
+        iterator = aiter(chunks)
+        while True:
+            await slots.acquire()
+            # One chunk failed: stop reading, the rest would be wasted work
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                break
+            tasks.append(asyncio.create_task(extract(len(tasks) + 1, chunk)))
+        return list(await asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _render(notes: list[TranscriptNotes]) -> str:
+    parts = []
+    for part, note in enumerate(notes, start=1):
+        if not note.incidents and not note.details:
+            continue
+        lines = [f"Part {part} of {len(notes)}:"]
+        lines += [f"- Incident: {incident}" for incident in note.incidents]
+        lines += [f"- Detail: {detail}" for detail in note.details]
+        parts.append("\n".join(lines))
+    return "\n\n".join(parts)
+
+
+async def condense_transcript(text: str) -> Optional[CondensedTranscript]:
+    """
+    Map-reduce a transcript longer than TRANSCRIPT_CONDENSE_TOKENS into the incidents and
+    report details of each of its chunks, extracted concurrently, so the agent's prompt
+    and latency stay bounded however long the transcript is. Notes that are still too
+    long are condensed again. Returns None when the transcript can be used as it is.
+    """
+    original_tokens = estimate_tokens(text)
+    if not config.TRANSCRIPT_CONDENSE_TOKENS or original_tokens <= config.TRANSCRIPT_CONDENSE_TOKENS:
+        return None
+    notes = await _map(_iterate(segment(text, config.TRANSCRIPT_CHUNK_TOKENS * _CHARS_PER_TOKEN)))
+    return await _reduce(notes, original_tokens)
+
+
+async def condense_pieces(pieces: AsyncIterable[str]) -> CondensedTranscript:
+    """
+    `condense_transcript` for a transcript that arrives piece by piece, such as an upload
+    being read. Each chunk is compacted (if TRANSCRIPT_COMPACTION is on) and condensed as
+    soon as it is complete, so only the chunks being worked on are held, never the whole
+    transcript. It is condensed whatever its length.
+    """
+    segmenter = Segmenter(config.TRANSCRIPT_CHUNK_TOKENS * _CHARS_PER_TOKEN)
+    chars = 0
+
+    def compacted(chunk: str) -> str:
+        nonlocal chars
+        if config.TRANSCRIPT_COMPACTION:
+            chunk = compact_transcript("", chunk).file_text
+        chars += len(chunk)
+        return chunk
+
+    async def chunks() -> AsyncIterator[str]:
+        async for piece in pieces:
+            for chunk in segmenter.feed(piece):
+                if chunk := compacted(chunk):
+                    yield chunk
+        for chunk in segmenter.finish():
+            if chunk := compacted(chunk):
+                yield chunk
+
+    notes = await _map(chunks())
+    return await _reduce(notes, chars // _CHARS_PER_TOKEN + 1)
+
+
+async def _reduce(notes: list[TranscriptNotes], original_tokens: int) -> CondensedTranscript:
+    chunks = len(notes)
+    incidents = [incident for note in notes for incident in note.incidents]
+    text = _render(notes)
+    for _ in range(_MAX_ROUNDS - 1):
+        if estimate_tokens(text) <= config.TRANSCRIPT_CONDENSE_TOKENS:
+            break
+        notes = await _map(_iterate(segment(text, config.TRANSCRIPT_CHUNK_TOKENS * _CHARS_PER_TOKEN)))
+        incidents = [incident for note in notes for incident in note.incidents]
+        text = _render(notes)
+    condensed = CondensedTranscript(text, incidents, chunks, original_tokens)
+    logger.info(
+        f"Condensed a {original_tokens}-token transcript in {chunks} chunks to {condensed.tokens} tokens "
+        f"with {len(incidents)} incidents"
+    )
+    return condensed
@@ -0,0 +1,112 @@
+import asyncio
+import importlib
+import time
+from typing import Awaitable, Callable, Optional
+import logging
+from .. import config
+from ..clients import get_client
+from ..db.db import warm_index
+from ..db.embeddings import embedding_cache
+from ..db.pool import pool
+from ..db.vector_index import vector_index
+
+logger = logging.getLogger(__name__)
+
+
+async def warm_database():
+    await pool.open()
+    if config.SEARCH_ENGINE == "numpy":
+        await vector_index.load()
+    else:
+        await warm_index()
+
+
+async def warm_openai():
+    """
+    Import the agents SDK off the event loop, have it share the app's OpenAI client, and
+    open that client's connection pool with one cheap request.
+    """
+    agents = await asyncio.to_thread(importlib.import_module, "agents")
+    await asyncio.to_thread(importlib.import_module, "app.utils.tools")
+    client = get_client()
+    agents.set_default_openai_client(client, use_for_tracing=False)
+    try:
+        await client.models.retrieve(config.EMBEDDING_MODEL)
+    except Exception as e:
+        # The connection is open either way; an unknown model or auth error shows up on first use
+        logger.warning(f"OpenAI warmup request failed: {str(e)}")
+
+
+class Warmup:
+    """
+    Startup work run in the background after the app starts accepting connections, so
+    `/health` answers immediately while `/ready` reports 503 until this finishes.
+
+    Steps run concurrently and failures are logged rather than raised: every step is
+    also done lazily on first use. Only the database step gates readiness.
+    """
+
+    def __init__(self, steps: dict[str, Callable[[], Awaitable[None]]], required: tuple[str, ...]):
+        self.steps = steps
+        self.required = required
+        self.results: dict[str, dict] = {}
+        self.duration: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.duration is not None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished and all(self.results[name]["ok"] for name in self.required)
+
+    def start(self):
+        self.results = {}
+        self.duration = None
+        self._task = asyncio.create_task(self.run(), name="warmup")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def wait(self):
+        if self._task is not None:
+            await asyncio.shield(self._task)
+
+    async def _step(self, name: str, step: Callable[[], Awaitable[None]]):
+        started = time.perf_counter()
+        try:
+            await step()
+            error = None
+        except Exception as e:
+            logger.error(f"Warmup step {name} failed: {str(e)}", exc_info=True)
+            error = str(e)
+        self.results[name] = {"ok": error is None, "ms": (time.perf_counter() - started) * 1000, "error": error}
+
+    async def run(self):
+        started = time.perf_counter()
+        await asyncio.gather(*(self._step(name, step) for name, step in self.steps.items()))
+        self.duration = time.perf_counter() - started
+        logger.info(f"Warmup finished in {self.duration * 1000:.1f}ms")
+
+    async def check(self) -> bool:
+        """Readiness, rechecking the database if its warmup step failed"""
+        if self.finished and not self.ready and await pool.healthcheck():
+            for name in self.required:
+                self.results[name]["ok"] = True
+        return self.ready
+
+    def status(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "starting" if not self.finished else "unavailable",
+            "warmup_ms": self.duration * 1000 if self.finished else None,
+            "steps": self.results,
+        }
+
+
+warmup = Warmup(
+    {"database": warm_database, "embedding_cache": embedding_cache.open, "openai": warm_openai},
+    required=("database",),
+)
@@ -0,0 +1,42 @@
+"""
+Compare two `benchmarks.run` reports scenario by scenario.
+
+    uv run python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+
+METRICS = ("throughput_per_s", "p50_ms", "p95_ms", "p99_ms", "scheduler_wait_ms")
+
+
+def load(file_path: str) -> dict:
+    with open(file_path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    baseline = {(r["scenario"], r["corpus_situations"]): r for r in before["results"]}
+    print(f"{before['commit'][:10]} -> {after['commit'][:10]}")
+    print(f"{'scenario':<12} {'situations':>10}  " + "  ".join(f"{m:>26}" for m in METRICS))
+    for result in after["results"]:
+        old = baseline.get((result["scenario"], result["corpus_situations"]))
+        if old is None:
+            continue
+        cells = []
+        for metric in METRICS:
+            if metric not in result or metric not in old:
+                cells.append(f"{'-':>26}")
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            cells.append(f"{old[metric]:>9.1f} -> {result[metric]:>9.1f} {change:+5.0f}%")
+        print(f"{result['scenario']:<12} {result['corpus_situations']:>10}  " + "  ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Synthetic policy corpora for benchmarks, built without any API calls.
+
+Each policy covers a handful of topic words. Its situations and the transcripts from
+`transcript()` mix topic words with common care vocabulary, and are embedded with the
+fake OpenAI server's `fake_embedding`, so benchmark queries find related policies the
+way real ones do.
+"""
+import random
+import time
+from ingestion.ingestion import (
+    DEFAULT_TENANT,
+    CorpusSettings,
+    GeneratedPolicy,
+    PolicyFile,
+    connect,
+    create_vector_tables,
+    insert_policies,
+    serialize,
+    setup_schema,
+    split_sections,
+    write_corpus_settings,
+)
+from .fake_openai import DEFAULT_DIMENSIONS, fake_embedding
+
+CARE_WORDS = (
+    "fall bruise medication missed dose safeguarding concern carer visit kitchen bathroom bedroom stairs "
+    "wheelchair hoist transfer skin pressure sore wound dressing fever infection confusion dementia wandering "
+    "family daughter son supervisor nurse doctor ambulance paramedic hospital discharge appetite fluids "
+    "choking allergy rash breathing chest pain dizzy faint seizure diabetes insulin blood sugar anxiety "
+    "aggression refusal consent capacity finance theft neglect abuse mobility frame walking stick"
+).split()
+
+_SYLLABLES = "ka lo mi ra te su no vi de pa ro li ma ne to ku sa re po di".split()
+
+
+def _vocabulary(size: int, rng: random.Random) -> list[str]:
+    words = set(CARE_WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+class SyntheticCorpus:
+    def __init__(self, policies: int, seed: int = 0, vocabulary: int = 2000):
+        self.rng = random.Random(seed)
+        self.words = _vocabulary(vocabulary, self.rng)
+        self.topics = [self.rng.sample(self.words, 6) for _ in range(policies)]
+
+    def sentence(self, topic: list[str], length: int = 14) -> str:
+        return " ".join(
+            self.rng.choice(topic) if self.rng.random() < 0.4 else self.rng.choice(self.words)
+            for _ in range(length)
+        ).capitalize() + "."
+
+    def policy_text(self, index: int, sections: int = 5) -> str:
+        topic = self.topics[index]
+        return f"# Policy {index}: {' '.join(topic[:3])}\n\n" + "\n\n".join(
+            f"## Section {section + 1}\n\n" + "\n".join(self.sentence(topic) for _ in range(6))
+            for section in range(sections)
+        )
+
+    def situations(self, index: int, count: int) -> list[str]:
+        return [self.sentence(self.topics[index]) for _ in range(count)]
+
+    def transcript(self, sentences: int = 20) -> str:
+        """A transcript about one random policy's topic"""
+        topic = self.rng.choice(self.topics)
+        return " ".join(self.sentence(topic) for _ in range(sentences))
+
+
+def tenant_name(index: int) -> str:
+    return DEFAULT_TENANT if index == 0 else f"tenant-{index}"
+
+
+def build_corpus(
+    db_path: str,
+    situations: int,
+    situations_per_policy: int = 10,
+    dimensions: int = DEFAULT_DIMENSIONS,
+    seed: int = 0,
+    batch_policies: int = 500,
+    tenants: int = 1,
+) -> SyntheticCorpus:
+    """
+    Write a corpus of `situations` situations to a fresh database at `db_path`, spread
+    evenly over `tenants` tenants: DEFAULT_TENANT, then `tenant-1`, `tenant-2` and so on
+    """
+    policies = max(1, situations // situations_per_policy)
+    corpus = SyntheticCorpus(policies, seed=seed)
+    settings = CorpusSettings(dimensions=dimensions)
+
+    db = connect(db_path)
+    try:
+        setup_schema(db)
+        create_vector_tables(db, settings)
+        with db:
+            write_corpus_settings(db, settings)
+
+        remaining = situations
+        for start in range(0, policies, batch_policies):
+            batches: dict[str, list[GeneratedPolicy]] = {}
+            for index in range(start, min(start + batch_policies, policies)):
+                count = remaining if index == policies - 1 else min(situations_per_policy, remaining)
+                remaining -= count
+                text = corpus.policy_text(index)
+                batches.setdefault(tenant_name(index % tenants), []).append(GeneratedPolicy(
+                    PolicyFile(file_path="", policy_path=f"synthetic/{index}.md", full_policy_text=text, content_hash=str(index)),
+                    corpus.situations(index, count),
+                    split_sections(text),
+                ))
+            for tenant, batch in batches.items():
+                embeddings = [
+                    serialize(fake_embedding(description, dimensions))
+                    for generated in batch
+                    for description in generated.situation_descriptions
+                ]
+                section_embeddings = [
+                    serialize(fake_embedding(section.text, dimensions))
+                    for generated in batch
+                    for section in generated.sections
+                ]
+                insert_policies(db, batch, embeddings, settings, tenant, section_embeddings)
+        db.execute("PRAGMA optimize")
+    finally:
+        db.close()
+    return corpus
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a synthetic policy database.")
+    parser.add_argument("db")
+    parser.add_argument("--situations", type=int, default=1000)
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument("--tenants", type=int, default=1)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    build_corpus(args.db, args.situations, dimensions=args.dimensions, tenants=args.tenants)
+    print(f"Built {args.situations} situations in {time.perf_counter() - started:.1f}s")
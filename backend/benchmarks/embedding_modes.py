@@ -0,0 +1,143 @@
+"""
+Compare recall and latency of reduced-dimension and quantized embedding storage.
+
+Each mode is built in a temporary copy of the policy database. Shortened embeddings
+are simulated by truncating and re-normalizing the stored vectors, which is what the
+embedding API's `dimensions` parameter does for text-embedding-3 models, so no OpenAI
+calls are made. Queries are stored situation vectors with added noise; recall@k is
+the share of the policies exact full-size search returns that each mode also returns.
+
+    uv run python -m benchmarks.embedding_modes --dimensions 1536 512 256 --queries 200
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from os import path
+import sqlite_vec
+from app.db.db import quantized_search, vec0_search
+from app.db.embeddings import deserialize, serialize
+from app.db.pool import pool
+from ingestion.ingestion import (
+    QUANTIZATIONS,
+    CorpusSettings,
+    connect,
+    create_vector_tables,
+    insert_vectors,
+    quantize_vectors,
+    setup_schema,
+)
+
+
+def shorten(vector: list[float], dimensions: int) -> list[float]:
+    vector = vector[:dimensions]
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def build_corpus(source: str, target: str, vectors: dict[int, list[float]], settings: CorpusSettings):
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+    db = connect(target)
+    try:
+        setup_schema(db)
+        with db:
+            db.execute("DROP TABLE IF EXISTS vec_situations")
+            db.execute("DROP TABLE IF EXISTS vec_situations_quantized")
+            create_vector_tables(db, CorpusSettings(settings.dimensions))
+            insert_vectors(
+                db,
+                list(vectors),
+                [serialize(shorten(v, settings.dimensions)) for v in vectors.values()],
+                CorpusSettings(settings.dimensions),
+            )
+        quantize_vectors(db, settings)
+    finally:
+        db.close()
+
+
+async def run_mode(db_path: str, search, queries: list[list[float]], truth: list[set[int]], dimensions: int, k: int) -> dict:
+    pool.db_path = db_path
+    await pool.open()
+    try:
+        timings, recalls = [], []
+        for query, expected in zip(queries, truth):
+            query = shorten(query, dimensions)
+            started = time.perf_counter()
+            results = await search(query, k)
+            timings.append((time.perf_counter() - started) * 1000)
+            found = {r["policy_id"] for r in results}
+            recalls.append(len(found & expected) / len(expected) if expected else 1.0)
+    finally:
+        await pool.close()
+    timings.sort()
+    return {
+        "queries": len(timings),
+        "recall": statistics.fmean(recalls),
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+        "db_bytes": path.getsize(db_path),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[1536, 512, 256])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.02, help="Per-component noise added to query vectors")
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    source = pool.db_path
+    db = sqlite3.connect(source)
+    db.enable_load_extension(True)
+    sqlite_vec.load(db)
+    vectors = {r[0]: deserialize(r[1]) for r in db.execute("SELECT id, situation_embedding FROM vec_situations")}
+    db.close()
+    if not vectors:
+        raise SystemExit(f"No vectors in {source}")
+
+    queries = []
+    for vector in random.choices(list(vectors.values()), k=args.queries):
+        queries.append(shorten([x + random.gauss(0, args.noise) for x in vector], len(vector)))
+
+    full = len(next(iter(vectors.values())))
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Ground truth: exact search over the full-size vectors
+        truth_path = path.join(tmp, "truth.sqlite")
+        build_corpus(source, truth_path, vectors, CorpusSettings(full))
+        truth = []
+        pool.db_path = truth_path
+        await pool.open()
+        try:
+            for query in queries:
+                truth.append({r["policy_id"] for r in await vec0_search(query, args.k)})
+        finally:
+            await pool.close()
+
+        for dimensions in args.dimensions:
+            if dimensions > full:
+                continue
+            for quantization in QUANTIZATIONS:
+                settings = CorpusSettings(dimensions, quantization)
+                db_path = path.join(tmp, f"{dimensions}-{quantization}.sqlite")
+                build_corpus(source, db_path, vectors, settings)
+                if quantization == "none":
+                    search = vec0_search
+                else:
+                    async def search(query, k, quantization=quantization):
+                        return await quantized_search(query, k, quantization, rerank_factor=args.rerank_factor)
+                results[f"{dimensions}/{quantization}"] = await run_mode(db_path, search, queries, truth, dimensions, args.k)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
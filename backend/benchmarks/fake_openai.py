@@ -0,0 +1,272 @@
+"""
+Local stand-in for the parts of the OpenAI API this backend uses, for offline benchmarks.
+
+- `POST /v1/embeddings` returns deterministic feature-hashed embeddings, so texts that
+  share words are close and the same text always embeds the same way.
+- `GET /v1/models/{model}` describes any model, for the app's startup warmup request.
+- `POST /v1/responses` returns a structured output generated from the request's JSON
+  schema. When the request offers tools and has no tool output yet, it first answers
+  with a call to the first tool, like the agent's search round trip.
+
+Latency per request is configurable. Streaming is not supported. Run it on its own with
+`python -m benchmarks.fake_openai --port 8100`, or from code with `FakeOpenAIServer`,
+which starts it in a separate process so it does not compete with the code under test.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import socket
+import struct
+import subprocess
+import sys
+import time
+import uuid
+from os import path
+from typing import Any, Optional
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+DEFAULT_DIMENSIONS = 1536
+# Dimensions each word is hashed onto; more spreads similarity, fewer makes it sharper
+_FEATURES_PER_WORD = 8
+_ID_PATTERN = re.compile(r"""(?:['"]id['"]:\s*|Situation ID:\s*)(\d+)""")
+
+
+def fake_embedding(text: str, dimensions: int = DEFAULT_DIMENSIONS) -> list[float]:
+    """Unit-length bag-of-words embedding built by hashing each word onto a few signed dimensions"""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.casefold()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=2 * _FEATURES_PER_WORD).digest()
+        for i in range(_FEATURES_PER_WORD):
+            bucket = int.from_bytes(digest[2 * i:2 * i + 2], "little")
+            vector[bucket % dimensions] += 1.0 if bucket & 0x8000 else -1.0
+    norm = math.sqrt(sum(x * x for x in vector))
+    if not norm:
+        vector[0], norm = 1.0, 1.0
+    return [x / norm for x in vector]
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(_text_of(part) for part in content)
+    if isinstance(content, dict):
+        return _text_of(content.get("text") or content.get("content") or content.get("output") or "")
+    return ""
+
+
+class _Context:
+    def __init__(self, text: str, ids: list[str], array_items: int):
+        self.words = re.findall(r"[A-Za-z]{3,}", text) or ["incident"]
+        self.ids = ids or ["1"]
+        self.array_items = array_items
+        self.rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+
+    def sentence(self, length: int = 12) -> str:
+        return " ".join(self.rng.choice(self.words) for _ in range(length))
+
+
+def fake_value(schema: dict, defs: dict, context: _Context, name: str = "") -> Any:
+    """Generate a value satisfying the subset of JSON Schema structured outputs use"""
+    if "$ref" in schema:
+        schema = defs[schema["$ref"].rsplit("/", 1)[-1]]
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"] or schema["anyOf"]
+        return fake_value(options[0], defs, context, name)
+    if "enum" in schema:
+        return schema["enum"][0]
+
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object":
+        return {key: fake_value(value, defs, context, key) for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        if name.endswith("_ids"):
+            return context.ids[:context.array_items]
+        return [fake_value(schema.get("items", {}), defs, context, name) for _ in range(context.array_items)]
+    if kind == "string":
+        return context.sentence()
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 1.0
+    if kind == "boolean":
+        return False
+    return None
+
+
+def _usage(text: str, output: str) -> dict:
+    input_tokens, output_tokens = len(text) // 4 + 1, len(output) // 4 + 1
+    return {
+        "input_tokens": input_tokens,
+        "input_tokens_details": {"cached_tokens": 0},
+        "output_tokens": output_tokens,
+        "output_tokens_details": {"reasoning_tokens": 0},
+        "total_tokens": input_tokens + output_tokens,
+    }
+
+
+def create_app(embedding_latency: float = 0.0, response_latency: float = 0.0, array_items: int = 5) -> FastAPI:
+    """Latencies are in seconds; `array_items` is the length of every generated array"""
+    app = FastAPI()
+    app.state.requests = {"embeddings": 0, "responses": 0}
+
+    @app.get("/v1/stats")
+    async def stats():
+        return app.state.requests
+
+    @app.get("/v1/models/{model}")
+    async def model(model: str):
+        return {"id": model, "object": "model", "created": 0, "owned_by": "fake"}
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        app.state.requests["embeddings"] += 1
+        await asyncio.sleep(embedding_latency)
+
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = body.get("dimensions") or DEFAULT_DIMENSIONS
+        data = []
+        for index, text in enumerate(inputs):
+            embedding = fake_embedding(text, dimensions)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(struct.pack("%sf" % len(embedding), *embedding)).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(text) // 4 + 1 for text in inputs)
+        return {
+            "object": "list",
+            "data": data,
+            "model": body["model"],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/responses")
+    async def responses(request: Request):
+        body = await request.json()
+        app.state.requests["responses"] += 1
+        await asyncio.sleep(response_latency)
+
+        items = body["input"] if isinstance(body["input"], list) else [{"role": "user", "content": body["input"]}]
+        text = " ".join(_text_of(item) for item in items) + " " + (body.get("instructions") or "")
+        context = _Context(text, list(dict.fromkeys(_ID_PATTERN.findall(text))), array_items)
+        has_tool_output = any(isinstance(item, dict) and item.get("type") == "function_call_output" for item in items)
+        tools = [tool for tool in body.get("tools") or [] if tool.get("type") == "function"]
+
+        if tools and not has_tool_output:
+            tool = tools[0]
+            arguments = json.dumps(fake_value(tool.get("parameters") or {}, (tool.get("parameters") or {}).get("$defs", {}), context))
+            output = [{
+                "type": "function_call",
+                "id": f"fc_{uuid.uuid4().hex}",
+                "call_id": f"call_{uuid.uuid4().hex}",
+                "name": tool["name"],
+                "arguments": arguments,
+                "status": "completed",
+            }]
+            generated = arguments
+        else:
+            text_format = (body.get("text") or {}).get("format") or {}
+            if text_format.get("type") == "json_schema":
+                schema = text_format["schema"]
+                generated = json.dumps(fake_value(schema, schema.get("$defs", {}), context))
+            else:
+                generated = context.sentence(40)
+            output = [{
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": generated, "annotations": []}],
+            }]
+
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": time.time(),
+            "status": "completed",
+            "model": body.get("model") or "fake",
+            "output": output,
+            "parallel_tool_calls": bool(body.get("parallel_tool_calls", True)),
+            "tool_choice": body.get("tool_choice") or "auto",
+            "tools": body.get("tools") or [],
+            "usage": _usage(text, generated),
+        }
+
+    return app
+
+
+class FakeOpenAIServer:
+    """Runs the fake server in a child process; use as a context manager"""
+
+    def __init__(self, embedding_latency: float = 0.0, response_latency: float = 0.0, array_items: int = 5, port: Optional[int] = None):
+        self.port = port or self._free_port()
+        self.command = [
+            sys.executable, "-m", "benchmarks.fake_openai",
+            "--port", str(self.port),
+            "--embedding-latency", str(embedding_latency),
+            "--response-latency", str(response_latency),
+            "--array-items", str(array_items),
+        ]
+        self._process: Optional[subprocess.Popen] = None
+
+    @staticmethod
+    def _free_port() -> int:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    @property
+    def requests(self) -> dict:
+        return httpx.get(f"{self.base_url}/stats").json()
+
+    def start(self, timeout: float = 30) -> "FakeOpenAIServer":
+        self._process = subprocess.Popen(self.command, cwd=path.dirname(path.dirname(path.abspath(__file__))))
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                httpx.get(f"{self.base_url}/stats")
+                return self
+            except httpx.TransportError:
+                if self._process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("Fake OpenAI server failed to start")
+                time.sleep(0.05)
+
+    def stop(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            self._process.wait(timeout=10)
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI stand-in for benchmarks.")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="Seconds per embedding request")
+    parser.add_argument("--response-latency", type=float, default=0.0, help="Seconds per model response")
+    parser.add_argument("--array-items", type=int, default=5)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.embedding_latency, args.response_latency, args.array_items),
+        host="127.0.0.1",
+        port=args.port,
+        log_level="warning",
+    )
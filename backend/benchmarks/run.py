@@ -0,0 +1,300 @@
+"""
+Offline end-to-end benchmarks against a local OpenAI stand-in.
+
+Starts `benchmarks.fake_openai` on a free port, points the app at it, builds a synthetic
+corpus for every `--sizes` entry and runs these scenarios against each:
+
+- search:       `search_situation` on fresh transcripts (embedding call + vector search)
+- full_policy:  `get_full_policy` for a few random situation ids
+- transcript:   `POST /api/v1/transcript` through the ASGI app, agent round trip included
+- ingestion:    `ingestion.ingest` of as many synthetic policies into an empty database
+- startup:      fresh `python -m benchmarks.startup` processes, timed from launch until the
+                app's warmup has finished, with the import and warmup parts reported
+
+With `--tenants N` each corpus is spread over N tenants and requests are made for the
+default tenant, so latency reflects one tenant's share of the corpus.
+
+Results are printed (or written with `--output`) as JSON with throughput and
+p50/p95/p99 latency per scenario and corpus size, plus the git commit, so two runs
+can be diffed with `python -m benchmarks.compare`. The search and transcript scenarios
+also report `scheduler_wait_ms`, the mean time their OpenAI requests waited in the
+request scheduler. Its rate limits are off unless given with `--openai-requests-per-minute`
+and `--openai-tokens-per-minute`, so a run measures the code rather than the limits.
+
+    uv run python -m benchmarks.run --sizes 10 1000 10000 --output before.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+from typing import Awaitable, Callable
+from .fake_openai import FakeOpenAIServer
+
+SCENARIOS = ("search", "full_policy", "transcript", "ingestion", "startup")
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(scenario: str, situations: int, timings: list[float], errors: int, elapsed: float, concurrency: int) -> dict:
+    timings = sorted(timings)
+    result = {
+        "scenario": scenario,
+        "corpus_situations": situations,
+        "requests": len(timings) + errors,
+        "errors": errors,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "throughput_per_s": (len(timings) + errors) / elapsed if elapsed else 0.0,
+    }
+    if timings:
+        result.update(
+            mean_ms=statistics.fmean(timings),
+            p50_ms=percentile(timings, 50),
+            p95_ms=percentile(timings, 95),
+            p99_ms=percentile(timings, 99),
+        )
+    return result
+
+
+async def load(operation: Callable[[int], Awaitable[None]], requests: int, concurrency: int, warmup: int = 0) -> tuple[list[float], int, float]:
+    """
+    Run `operation(i)` for i in range(requests) with at most `concurrency` in flight.
+    Operations with i < 0 (the first `warmup` ones, run sequentially) are not measured.
+    """
+    for i in range(-warmup, 0):
+        await operation(i)
+
+    timings: list[float] = []
+    errors = 0
+    next_request = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in next_request:
+            started = time.perf_counter()
+            try:
+                await operation(i)
+            except Exception as e:
+                errors += 1
+                logging.getLogger("benchmarks").warning(f"Request {i} failed: {e!r}")
+                continue
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return timings, errors, time.perf_counter() - started
+
+
+def measure_startup(db_path: str, runs: int) -> tuple[list[float], list[dict], int, float]:
+    """Launch `benchmarks.startup` `runs` times; returns launch-to-ready times, the reported parts and failures"""
+    timings, parts, errors = [], [], 0
+    env = dict(os.environ, DB_PATH=db_path)
+    begun = time.perf_counter()
+    for _ in range(runs):
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.startup"],
+            cwd=path.dirname(path.dirname(path.abspath(__file__))),
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        # The process prints its report once ready, then shuts down; shutdown isn't timed
+        line = process.stdout.readline()
+        elapsed = (time.perf_counter() - started) * 1000
+        if process.wait() != 0 or not line:
+            errors += 1
+            logging.getLogger("benchmarks").warning(f"Startup run failed with exit code {process.returncode}")
+            continue
+        timings.append(elapsed)
+        parts.append(json.loads(line))
+    return timings, parts, errors, time.perf_counter() - begun
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args: argparse.Namespace, workdir: str, server: FakeOpenAIServer) -> list[dict]:
+    # Imported here: app modules read their configuration from the environment on import
+    import httpx
+    from openai import AsyncOpenAI
+    import main as app_main
+    from app.db.db import get_full_policy, search_situation
+    from app.db.embeddings import embedding_cache
+    from app.db.pool import pool
+    from app.db.vector_index import vector_index
+    from app.utils.metrics import openai_queue_wait_seconds
+    from ingestion.ingestion import CorpusSettings, PolicyFile, connect, create_vector_tables, ingest, setup_schema
+    from .corpus import SyntheticCorpus, build_corpus
+
+    for name in ("app", "main", "ingestion", "httpx", "openai", "agents"):
+        logging.getLogger(name).setLevel(args.log_level)
+
+    def with_scheduler_wait(result: dict, before: tuple[int, float]) -> dict:
+        count, total = openai_queue_wait_seconds.totals()
+        if count > before[0]:
+            result["scheduler_wait_ms"] = (total - before[1]) / (count - before[0]) * 1000
+        return result
+
+    results = []
+    for size in args.sizes:
+        corpus_path = path.join(workdir, f"corpus-{size}.sqlite")
+        started = time.perf_counter()
+        corpus = build_corpus(corpus_path, size, dimensions=args.dimensions, seed=args.seed, tenants=args.tenants)
+        print(f"Built corpus of {size} situations in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        # Every corpus is searched through the app's singletons, pointed at it in turn
+        pool.db_path = corpus_path
+        vector_index.db_path = corpus_path
+
+        if "search" in args.scenarios or "full_policy" in args.scenarios:
+            await pool.open()
+            await embedding_cache.open()
+            try:
+                if "search" in args.scenarios:
+                    queries = [corpus.transcript() for _ in range(args.warmup + args.requests)]
+                    waited = openai_queue_wait_seconds.totals()
+                    timings, errors, elapsed = await load(
+                        lambda i: search_situation(queries[args.warmup + i]), args.requests, args.concurrency, args.warmup
+                    )
+                    results.append(with_scheduler_wait(summarize("search", size, timings, errors, elapsed, args.concurrency), waited))
+
+                if "full_policy" in args.scenarios:
+                    ids = [[random.randint(1, size) for _ in range(3)] for _ in range(args.warmup + args.requests)]
+                    timings, errors, elapsed = await load(
+                        lambda i: get_full_policy(ids[args.warmup + i]), args.requests, args.concurrency, args.warmup
+                    )
+                    results.append(summarize("full_policy", size, timings, errors, elapsed, args.concurrency))
+            finally:
+                await embedding_cache.close()
+                await pool.close()
+
+        if "transcript" in args.scenarios:
+            transcripts = [corpus.transcript() for _ in range(args.warmup + args.requests)]
+            async with app_main.lifespan(app_main.app):
+                await app_main.warmup.wait()
+                transport = httpx.ASGITransport(app=app_main.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                    async def post(i: int):
+                        response = await client.post("/api/v1/transcript", data={"text": transcripts[args.warmup + i]})
+                        response.raise_for_status()
+
+                    waited = openai_queue_wait_seconds.totals()
+                    timings, errors, elapsed = await load(post, args.requests, args.concurrency, args.warmup)
+            results.append(with_scheduler_wait(summarize("transcript", size, timings, errors, elapsed, args.concurrency), waited))
+
+        if "ingestion" in args.scenarios:
+            db_path = path.join(workdir, f"ingest-{size}.sqlite")
+            source = SyntheticCorpus(max(1, size // args.array_items), seed=args.seed)
+            policies = [
+                PolicyFile(file_path="", policy_path=f"synthetic/{i}.md", full_policy_text=source.policy_text(i), content_hash=str(i))
+                for i in range(len(source.topics))
+            ]
+            settings = CorpusSettings(dimensions=args.dimensions)
+            db = connect(db_path)
+            try:
+                setup_schema(db)
+                create_vector_tables(db, settings)
+                progress = await ingest(policies, db, AsyncOpenAI(), settings, concurrency=args.ingest_concurrency)
+            finally:
+                db.close()
+            result = summarize("ingestion", size, [], progress.failed, progress.elapsed, args.ingest_concurrency)
+            result.update(
+                requests=len(policies),
+                throughput_per_s=progress.inserted / progress.elapsed if progress.elapsed else 0.0,
+                situations_per_s=progress.situations / progress.elapsed if progress.elapsed else 0.0,
+            )
+            results.append(result)
+
+        if "startup" in args.scenarios:
+            timings, parts, errors, elapsed = measure_startup(corpus_path, args.startup_runs)
+            result = summarize("startup", size, timings, errors, elapsed, 1)
+            if parts:
+                result.update(
+                    import_ms=statistics.fmean(p["import_ms"] for p in parts),
+                    warmup_ms=statistics.fmean(p["warmup_ms"] for p in parts),
+                )
+            results.append(result)
+
+        print(f"Finished corpus of {size} situations", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000], help="Corpus sizes in situations (up to 100000)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before each scenario")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Processes launched by the startup scenario")
+    parser.add_argument("--ingest-concurrency", type=int, default=8, help="Concurrent situation generation requests during ingestion")
+    parser.add_argument("--embedding-latency", type=float, default=50, help="Fake embedding request latency (ms)")
+    parser.add_argument("--response-latency", type=float, default=500, help="Fake model response latency (ms)")
+    parser.add_argument("--array-items", type=int, default=5, help="Items in every array the fake model generates, e.g. situations per policy")
+    parser.add_argument("--openai-requests-per-minute", type=int, default=0, help="OPENAI_REQUESTS_PER_MINUTE for the app; 0 disables the limit")
+    parser.add_argument("--openai-tokens-per-minute", type=int, default=0, help="OPENAI_TOKENS_PER_MINUTE for the app; 0 disables the limit")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--tenants", type=int, default=1, help="Tenants each corpus is spread over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results to this file instead of stdout")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as workdir, FakeOpenAIServer(
+        embedding_latency=args.embedding_latency / 1000,
+        response_latency=args.response_latency / 1000,
+        array_items=args.array_items,
+    ) as server:
+        os.environ.update(
+            OPENAI_BASE_URL=server.base_url,
+            OPENAI_API_KEY="benchmark",
+            OPENAI_AGENTS_DISABLE_TRACING="1",
+            DB_PATH=path.join(workdir, "corpus.sqlite"),
+            EMBEDDING_CACHE_PATH=path.join(workdir, "embedding_cache.sqlite"),
+            JOBS_DB_PATH=path.join(workdir, "jobs.sqlite"),
+            # Set explicitly, so a limit in the environment can't skew the comparison
+            OPENAI_REQUESTS_PER_MINUTE=str(args.openai_requests_per_minute),
+            OPENAI_TOKENS_PER_MINUTE=str(args.openai_tokens_per_minute),
+        )
+        results = asyncio.run(run(args, workdir, server))
+        report = {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("output", "log_level")},
+            "openai_requests": server.requests,
+            "results": results,
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare the vec0 and numpy search engines on the configured policy database.
+
+Queries are random vectors, so no OpenAI calls are made.
+
+    uv run --extra numpy python -m benchmarks.search_engines --queries 500
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from app.db.db import vec0_search
+from app.db.pool import pool
+from app.db.vector_index import vector_index
+
+
+async def run_engine(search, queries: list[list[float]], k: int) -> dict:
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        await search(query, k=k)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "queries": len(timings),
+        "mean_ms": statistics.fmean(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    try:
+        await pool.open()
+        started = time.perf_counter()
+        await vector_index.load()
+        load_ms = (time.perf_counter() - started) * 1000
+
+        dims = vector_index.dimensions
+        queries = [[random.uniform(-1, 1) for _ in range(dims)] for _ in range(args.queries)]
+        results = {
+            "vec0": await run_engine(vec0_search, queries, args.k),
+            "numpy": {**await run_engine(vector_index.search, queries, args.k), "load_ms": load_ms},
+        }
+        print(json.dumps(results, indent=2))
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+"""
+Cold start of the API in this process: time to import `main`, then time from the
+lifespan starting until the startup warmup has finished. Prints one JSON line once
+ready, so `benchmarks.run` can also time the whole process from launch.
+
+    DB_PATH=db/askEmma.sqlite uv run python -m benchmarks.startup
+"""
+import asyncio
+import json
+import time
+
+
+async def start(app_main, imported: float):
+    started = time.perf_counter()
+    async with app_main.lifespan(app_main.app):
+        await app_main.warmup.wait()
+        ready = time.perf_counter() - started
+        if not app_main.warmup.ready:
+            raise RuntimeError(f"Warmup did not complete: {app_main.warmup.status()['steps']}")
+        print(json.dumps({"import_ms": imported * 1000, "warmup_ms": ready * 1000}), flush=True)
+
+
+def main():
+    started = time.perf_counter()
+    import main as app_main
+    asyncio.run(start(app_main, time.perf_counter() - started))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,101 @@
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
 import sqlite3
-import sqlite_vec
-from os import listdir, path
-from os.path import isfile, join
-from pydantic import BaseModel
-from openai import OpenAI
 import struct
+import sys
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from os import listdir, makedirs, path
+from os.path import isfile, join, relpath
+import sqlite_vec
 from dotenv import load_dotenv
+from openai import AsyncOpenAI
+from pydantic import BaseModel
 
-load_dotenv()
+logger = logging.getLogger("ingestion")
 
 POLICY_PATH = join(path.dirname(__file__), "policies")
 DB_PATH = join(path.dirname(__file__), "../db/askEmma.sqlite")
 
-client = OpenAI()
-db = sqlite3.connect(DB_PATH)
-db.enable_load_extension(True)
-sqlite_vec.load(db)
-db.enable_load_extension(False)
+GENERATION_MODEL = "gpt-4o-mini"
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 1536  # model default; --dimensions shortens it
 
-# Setup Tables
-db.execute(
-    """
-        CREATE TABLE IF NOT EXISTS situations (
-          id INTEGER PRIMARY KEY,
-          full_policy_text TEXT,
-          situation_description TEXT
-        );
-    """
-)
+# Each tenant (care organisation) has its own policies, and searches only ever see one
+# tenant's corpus. Databases from before tenants existed are moved into DEFAULT_TENANT.
+DEFAULT_TENANT = "default"
+TENANT_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
 
-db.execute(
-    """
-        CREATE VIRTUAL TABLE IF NOT EXISTS vec_situations USING vec0(
-          id INTEGER PRIMARY KEY,
-          situation_embedding FLOAT[1536]
-        );
-    """
-)
+# Coarse first-pass columns searched before exact re-ranking against vec_situations
+QUANTIZATIONS = ("none", "int8", "binary")
+QUANTIZED_COLUMNS = {"int8": "INT8", "binary": "BIT"}
+QUANTIZERS = {"int8": "vec_quantize_int8({}, 'unit')", "binary": "vec_quantize_binary({})"}
+
+# Policies are split at their headings into sections of at most this many (estimated)
+# tokens, so search can hand the agent the relevant part of a long policy, not all of it
+SECTION_MAX_TOKENS = 400
+_HEADING = re.compile(r"^#{1,6}\s+\S")
+
+# OpenAI embedding request limits: 2048 inputs and 300k tokens per request
+MAX_EMBEDDING_INPUTS = 2048
+MAX_EMBEDDING_TOKENS = 300_000
+
+
+# The policies table doubles as the ingestion manifest: one row per tenant and policy file
+CREATE_POLICIES = """
+    CREATE TABLE IF NOT EXISTS {table} (
+      id INTEGER PRIMARY KEY,
+      tenant TEXT NOT NULL DEFAULT 'default',
+      policy_path TEXT NOT NULL,
+      full_policy_text TEXT NOT NULL,
+      content_hash TEXT NOT NULL,
+      version INTEGER NOT NULL,
+      ingested_at REAL NOT NULL,
+      UNIQUE (tenant, policy_path)
+    );
+"""
+
+# Embedding settings every vector in the corpus was built with, read by the API at search time
+CREATE_CORPUS_SETTINGS = """
+    CREATE TABLE IF NOT EXISTS corpus_settings (
+      key TEXT PRIMARY KEY,
+      value TEXT NOT NULL
+    );
+"""
+
+CREATE_SITUATIONS = """
+    CREATE TABLE IF NOT EXISTS situations (
+      id INTEGER PRIMARY KEY,
+      policy_id INTEGER NOT NULL REFERENCES policies(id) ON DELETE CASCADE,
+      situation_description TEXT,
+      section_id INTEGER REFERENCES policy_sections(id) ON DELETE SET NULL
+    );
+"""
+
+# Sections of each policy in document order. `section_id` links every situation to the
+# section whose embedding is closest to its own, which is what search returns for it.
+CREATE_SECTIONS = """
+    CREATE TABLE IF NOT EXISTS policy_sections (
+      id INTEGER PRIMARY KEY,
+      policy_id INTEGER NOT NULL REFERENCES policies(id) ON DELETE CASCADE,
+      position INTEGER NOT NULL,
+      heading TEXT,
+      section_text TEXT NOT NULL
+    );
+"""
+
+
+# Full-text indexes over situation descriptions and policy text for lexical and hybrid
+# search. They are external-content tables kept in step with their source by triggers.
+FTS_TABLES = {
+    "fts_situations": ("situations", "situation_description"),
+    "fts_policies": ("policies", "full_policy_text"),
+}
 
 
 # Types and Utils
@@ -44,9 +103,48 @@ class PolicyExamples(BaseModel):
     situation_descriptions: list[str]
 
 
-class Policy(PolicyExamples):
+@dataclass
+class PolicyFile:
+    file_path: str
+    policy_path: str  # path relative to the policies directory, unique per policy
     full_policy_text: str
-    situation_embeddings: list[bytes]
+    content_hash: str
+
+
+@dataclass
+class PolicySection:
+    heading: str | None  # the markdown heading the section falls under, if any
+    text: str
+
+
+@dataclass
+class GeneratedPolicy:
+    policy: PolicyFile
+    situation_descriptions: list[str]
+    sections: list[PolicySection] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class CorpusSettings:
+    dimensions: int = EMBEDDING_DIMENSIONS
+    quantization: str = "none"
+
+    @property
+    def vector_tables(self) -> list[str]:
+        """Tables holding situation vectors"""
+        return ["vec_situations"] + (["vec_situations_quantized"] if self.quantization != "none" else [])
+
+
+@dataclass
+class IngestionPlan:
+    new: list[PolicyFile]
+    changed: list[PolicyFile]
+    unchanged: list[PolicyFile]
+    removed: list[str]
+
+    @property
+    def to_ingest(self) -> list[PolicyFile]:
+        return self.new + self.changed
 
 
 def serialize(vector: list[float]) -> bytes:
@@ -54,57 +152,894 @@ def serialize(vector: list[float]) -> bytes:
     return struct.pack("%sf" % len(vector), *vector)
 
 
-def insert_policy(policy: Policy):
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), used only to size batches and sections"""
+    return len(text) // 4 + 1
+
+
+def _split_long(paragraph: str, max_tokens: int) -> list[str]:
+    """Cut a paragraph with no breaks of its own into pieces of about `max_tokens`, at spaces"""
+    pieces, current = [], []
+    for word in paragraph.split(" "):
+        if current and estimate_tokens(" ".join(current + [word])) > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+        current.append(word)
+    return pieces + [" ".join(current)] if current else pieces
+
+
+def split_sections(policy_text: str, max_tokens: int = SECTION_MAX_TOKENS) -> list[PolicySection]:
+    """
+    Split a policy at its markdown headings, then pack each heading's paragraphs into
+    sections of at most `max_tokens`. Text before the first heading has no heading, and
+    a heading directly followed by another is folded into the next section.
+    """
+    blocks: list[tuple[str | None, list[str]]] = [(None, [])]
+    for line in policy_text.splitlines():
+        if _HEADING.match(line):
+            heading, lines = blocks[-1]
+            if heading is not None and not any(previous.strip() and not _HEADING.match(previous) for previous in lines):
+                # Nothing under the previous heading: carry it into this one
+                blocks[-1] = (line.lstrip("#").strip(), lines + [line])
+            else:
+                blocks.append((line.lstrip("#").strip(), [line]))
+        else:
+            blocks[-1][1].append(line)
+
+    sections = []
+    for heading, lines in blocks:
+        paragraphs = []
+        for paragraph in re.split(r"\n\s*\n", "\n".join(lines)):
+            if paragraph.strip():
+                paragraphs.extend(_split_long(paragraph.strip(), max_tokens))
+        current: list[str] = []
+        for paragraph in paragraphs:
+            if current and estimate_tokens("\n\n".join(current + [paragraph])) > max_tokens:
+                sections.append(PolicySection(heading, "\n\n".join(current)))
+                current = []
+            current.append(paragraph)
+        if current:
+            sections.append(PolicySection(heading, "\n\n".join(current)))
+    return sections
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    makedirs(path.dirname(path.abspath(db_path)), exist_ok=True)
+    db = sqlite3.connect(db_path)
+    db.enable_load_extension(True)
+    sqlite_vec.load(db)
+    db.enable_load_extension(False)
+    # WAL lets the API keep reading while ingestion writes
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA foreign_keys = ON")
+    return db
+
+
+def stage_database(db_path: str) -> str:
+    """
+    Copy the live database to a staging file next to it and return the staging path,
+    so a run can be built without touching the file the API is serving.
+    """
+    staging = db_path + ".next"
+    discard_staging(staging)
+    if path.exists(db_path):
+        with closing(sqlite3.connect(db_path)) as source, closing(sqlite3.connect(staging)) as target:
+            source.backup(target)
+    return staging
+
+
+def discard_staging(staging: str):
+    """Delete a staging database and its WAL and shared-memory files"""
+    for file in (staging, staging + "-wal", staging + "-shm"):
+        if path.exists(file):
+            os.remove(file)
+
+
+def publish_database(staging: str, db_path: str):
+    """
+    Atomically replace `db_path` with a finished staging database. The staging file is
+    folded back into rollback-journal mode first so it is complete on its own, as
+    immutable readers ignore WAL files. API workers notice the new file on their next
+    pool refresh; queries already running finish against the old one.
+    """
+    with closing(sqlite3.connect(staging)) as db:
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.execute("PRAGMA journal_mode = DELETE")
+    with open(staging, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(staging, db_path)
+    directory = os.open(path.dirname(path.abspath(db_path)), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def setup_schema(db: sqlite3.Connection):
+    migrate_legacy_schema(db)
+    migrate_policy_tenants(db)
+
+    # Parents first: situations reference both policies and sections
+    db.execute(CREATE_POLICIES.format(table="policies"))
+    db.execute(CREATE_SECTIONS)
+    db.execute("CREATE INDEX IF NOT EXISTS policy_sections_policy_id ON policy_sections(policy_id)")
+    db.execute(CREATE_SITUATIONS)
+    if "section_id" not in {row[1] for row in db.execute("PRAGMA table_info(situations)")}:
+        db.execute("ALTER TABLE situations ADD COLUMN section_id INTEGER REFERENCES policy_sections(id) ON DELETE SET NULL")
+    db.execute("CREATE INDEX IF NOT EXISTS situations_policy_id ON situations(policy_id)")
+    db.execute(CREATE_CORPUS_SETTINGS)
+    setup_fts(db)
+
+
+def setup_fts(db: sqlite3.Connection):
+    for fts_table, (table, column) in FTS_TABLES.items():
+        exists = db.execute("SELECT 1 FROM sqlite_master WHERE name = ?", [fts_table]).fetchone()
+        db.execute(
+            f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5(
+                  {column},
+                  content='{table}',
+                  content_rowid='id',
+                  tokenize='porter unicode61'
+                );
+            """
+        )
+        db.executescript(
+            f"""
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_insert AFTER INSERT ON {table} BEGIN
+                  INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column});
+                END;
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_delete AFTER DELETE ON {table} BEGIN
+                  INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+                END;
+                CREATE TRIGGER IF NOT EXISTS {fts_table}_update AFTER UPDATE OF {column} ON {table} BEGIN
+                  INSERT INTO {fts_table}({fts_table}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+                  INSERT INTO {fts_table}(rowid, {column}) VALUES (new.id, new.{column});
+                END;
+            """
+        )
+        if not exists:
+            # Index rows ingested before full-text search existed
+            with db:
+                db.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+            logger.info(f"Built full-text index {fts_table}")
+
+
+def read_corpus_settings(db: sqlite3.Connection) -> CorpusSettings:
+    """Settings the existing vectors were built with; databases predating them used the defaults"""
+    stored = dict(db.execute("SELECT key, value FROM corpus_settings"))
+    return CorpusSettings(
+        dimensions=int(stored.get("embedding_dimensions", EMBEDDING_DIMENSIONS)),
+        quantization=stored.get("quantization", "none"),
+    )
+
+
+def write_corpus_settings(db: sqlite3.Connection, settings: CorpusSettings):
+    db.executemany(
+        "INSERT INTO corpus_settings(key, value) VALUES(?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        [
+            ["embedding_model", EMBEDDING_MODEL],
+            ["embedding_dimensions", str(settings.dimensions)],
+            ["quantization", settings.quantization],
+        ],
+    )
+
+
+def create_vector_tables(db: sqlite3.Connection, settings: CorpusSettings):
+    """
+    Full-precision vectors always; a quantized copy for the coarse first pass if enabled.
+    Both are partitioned by tenant, so a KNN query only scans the chunks of one tenant.
+    Section vectors are only compared with their policy's situations, never searched.
+    """
+    db.execute(
+        f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS vec_situations USING vec0(
+              id INTEGER PRIMARY KEY,
+              tenant TEXT PARTITION KEY,
+              situation_embedding FLOAT[{settings.dimensions}]
+            );
+        """
+    )
+    db.execute(
+        f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS vec_sections USING vec0(
+              id INTEGER PRIMARY KEY,
+              section_embedding FLOAT[{settings.dimensions}]
+            );
+        """
+    )
+    if settings.quantization != "none":
+        db.execute(
+            f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS vec_situations_quantized USING vec0(
+                  id INTEGER PRIMARY KEY,
+                  tenant TEXT PARTITION KEY,
+                  situation_embedding {QUANTIZED_COLUMNS[settings.quantization]}[{settings.dimensions}]
+                );
+            """
+        )
+
+
+def quantize_vectors(db: sqlite3.Connection, settings: CorpusSettings):
+    """Rebuild the quantized table from the full-precision vectors, no API calls needed"""
     with db:
-        for index, embedding in enumerate(policy.situation_embeddings):
+        db.execute("BEGIN")
+        db.execute("DROP TABLE IF EXISTS vec_situations_quantized")
+        create_vector_tables(db, settings)
+        if settings.quantization != "none":
             db.execute(
-                "INSERT INTO situations(full_policy_text, situation_description) VALUES(?, ?)",
-                [policy.full_policy_text, policy.situation_descriptions[index]],
+                f"""
+                    INSERT INTO vec_situations_quantized(id, tenant, situation_embedding)
+                    SELECT id, tenant, {QUANTIZERS[settings.quantization].format("situation_embedding")} FROM vec_situations
+                """
             )
-            situation_id = db.execute("SELECT last_insert_rowid()").fetchone()[0]
+        write_corpus_settings(db, settings)
 
+
+async def reembed_situations(db: sqlite3.Connection, client: AsyncOpenAI, settings: CorpusSettings, batch_size: int = MAX_EMBEDDING_INPUTS):
+    """
+    Re-embed every stored situation at `settings.dimensions` without regenerating
+    situations. The new vectors are collected in temp tables first and swapped in with one
+    short transaction, so the API keeps searching the old vectors until the new ones are
+    complete and no write lock is held while waiting on the embeddings API.
+    """
+    situations = db.execute(
+        """
+            SELECT situations.id, situation_description, policies.tenant
+            FROM situations
+            JOIN policies ON policies.id = situations.policy_id
+            ORDER BY policies.tenant, situations.id
+        """
+    ).fetchall()
+    logger.info(f"Re-embedding {len(situations)} situations at {settings.dimensions} dimensions")
+    sections = db.execute("SELECT id, section_text FROM policy_sections ORDER BY id").fetchall()
+
+    # Temp tables live in the connection's own temp database, so filling them locks nothing
+    db.execute("CREATE TEMP TABLE IF NOT EXISTS reembedded_situations(id INTEGER PRIMARY KEY, tenant TEXT NOT NULL, embedding BLOB NOT NULL)")
+    db.execute("CREATE TEMP TABLE IF NOT EXISTS reembedded_sections(id INTEGER PRIMARY KEY, embedding BLOB NOT NULL)")
+    try:
+        for start in range(0, len(situations), batch_size):
+            batch = situations[start:start + batch_size]
+            embeddings = await vectorise_situation_descriptions(client, [row[1] or "" for row in batch], settings.dimensions)
+            with db:
+                db.executemany(
+                    "INSERT INTO reembedded_situations(id, tenant, embedding) VALUES(?, ?, ?)",
+                    [(row[0], row[2], embedding) for row, embedding in zip(batch, embeddings)],
+                )
+        for start in range(0, len(sections), batch_size):
+            batch = sections[start:start + batch_size]
+            embeddings = await vectorise_situation_descriptions(client, [row[1] for row in batch], settings.dimensions)
+            with db:
+                db.executemany("INSERT INTO reembedded_sections(id, embedding) VALUES(?, ?)", zip([row[0] for row in batch], embeddings))
+
+        with db:
+            db.execute("BEGIN")
+            db.execute("DROP TABLE IF EXISTS vec_situations")
+            db.execute("DROP TABLE IF EXISTS vec_situations_quantized")
+            db.execute("DROP TABLE IF EXISTS vec_sections")
+            create_vector_tables(db, settings)
             db.execute(
-                "INSERT INTO vec_situations(id, situation_embedding) VALUES(?, ?)",
-                [situation_id, embedding],
+                """
+                    INSERT INTO vec_situations(id, tenant, situation_embedding)
+                    SELECT id, tenant, embedding FROM reembedded_situations ORDER BY tenant, id
+                """
             )
+            if settings.quantization != "none":
+                db.execute(
+                    f"""
+                        INSERT INTO vec_situations_quantized(id, tenant, situation_embedding)
+                        SELECT id, tenant, {QUANTIZERS[settings.quantization].format("situation_embedding")} FROM vec_situations
+                    """
+                )
+            db.execute("INSERT INTO vec_sections(id, section_embedding) SELECT id, embedding FROM reembedded_sections ORDER BY id")
+            link_sections(db, [row[0] for row in db.execute("SELECT id FROM policies")])
+            write_corpus_settings(db, settings)
+    finally:
+        db.execute("DROP TABLE IF EXISTS temp.reembedded_situations")
+        db.execute("DROP TABLE IF EXISTS temp.reembedded_sections")
+
+
+def migrate_legacy_schema(db: sqlite3.Connection):
+    """
+    Move databases that copy full_policy_text into every situation onto the normalized
+    policies table. Situation ids are kept so vec_situations rows stay linked. Policies
+    without a manifest entry get a `legacy:` path until `adopt_legacy_policies` matches
+    them to a file.
+    """
+    columns = {row[1] for row in db.execute("PRAGMA table_info(situations)")}
+    if "full_policy_text" not in columns:
+        return
 
+    logger.info("Migrating situations to the normalized policies schema")
+    has_path = "policy_path" in columns
+    manifest = {}
+    if db.execute("SELECT 1 FROM sqlite_master WHERE name = 'policy_manifest'").fetchone():
+        manifest = {row[0]: row[1] for row in db.execute("SELECT policy_path, version FROM policy_manifest")}
+
+    with db:
+        # sqlite3 does not open transactions for DDL on its own
+        db.execute("BEGIN")
+        db.execute("ALTER TABLE situations RENAME TO legacy_situations")
+        db.execute(CREATE_POLICIES.format(table="policies"))
+        db.execute(CREATE_SECTIONS)
+        db.execute(CREATE_SITUATIONS)
+
+        policy_ids: dict[str, int] = {}
+        rows = db.execute(
+            f"SELECT id, full_policy_text, situation_description, {'policy_path' if has_path else 'NULL'} FROM legacy_situations"
+        ).fetchall()
+        for situation_id, policy_text, description, policy_path in rows:
+            policy_text = policy_text or ""
+            content_hash = hashlib.sha256(policy_text.encode("utf-8")).hexdigest()
+            policy_path = policy_path or f"legacy:{content_hash}"
+            if policy_path not in policy_ids:
+                policy_ids[policy_path] = db.execute(
+                    """
+                        INSERT INTO policies(policy_path, full_policy_text, content_hash, version, ingested_at)
+                        VALUES(?, ?, ?, ?, ?)
+                    """,
+                    [policy_path, policy_text, content_hash, manifest.get(policy_path, 1), time.time()],
+                ).lastrowid
+            db.execute(
+                "INSERT INTO situations(id, policy_id, situation_description) VALUES(?, ?, ?)",
+                [situation_id, policy_ids[policy_path], description],
+            )
 
-def vectorise_situation_descriptions(descriptions: list[str]) -> list[bytes]:
-    embeddings = client.embeddings.create(
-        input=descriptions, model="text-embedding-3-small"
+        db.execute("DROP TABLE legacy_situations")
+        db.execute("DROP TABLE IF EXISTS policy_manifest")
+    logger.info(f"Migrated {len(rows)} situations into {len(policy_ids)} policies")
+
+
+def migrate_policy_tenants(db: sqlite3.Connection):
+    """
+    Give policies of databases from before tenants existed a `tenant` column, moving them
+    into DEFAULT_TENANT. Policy paths become unique per tenant rather than overall, which
+    needs the table rebuilt; ids are kept so situations and full-text rows stay linked.
+    """
+    columns = {row[1] for row in db.execute("PRAGMA table_info(policies)")}
+    if not columns or "tenant" in columns:
+        return
+
+    logger.info(f"Moving existing policies into tenant {DEFAULT_TENANT}")
+    # Dropping the old table must not cascade to situations; the pragma is a no-op inside a transaction
+    db.execute("PRAGMA foreign_keys = OFF")
+    try:
+        with db:
+            db.execute("BEGIN")
+            db.execute(CREATE_POLICIES.format(table="tenant_policies"))
+            db.execute(
+                """
+                    INSERT INTO tenant_policies(id, policy_path, full_policy_text, content_hash, version, ingested_at)
+                    SELECT id, policy_path, full_policy_text, content_hash, version, ingested_at FROM policies
+                """
+            )
+            # Also drops the full-text triggers on policies; setup_fts recreates them
+            db.execute("DROP TABLE policies")
+            db.execute("ALTER TABLE tenant_policies RENAME TO policies")
+    finally:
+        db.execute("PRAGMA foreign_keys = ON")
+
+
+def partition_vector_tables(db: sqlite3.Connection, settings: CorpusSettings):
+    """
+    Rebuild vector tables created before tenants existed with a tenant partition key,
+    taking each situation's tenant from its policy. vec0 tables can't be renamed, so the
+    vectors are staged in a temporary table. The quantized copy is rebuilt from them.
+    """
+    row = db.execute("SELECT sql FROM sqlite_master WHERE name = 'vec_situations'").fetchone()
+    if row is None or "partition key" in row[0].lower():
+        return
+
+    logger.info("Partitioning vector tables by tenant")
+    with db:
+        db.execute("BEGIN")
+        db.execute(
+            """
+                CREATE TEMP TABLE staged_vectors AS
+                SELECT vec_situations.id, policies.tenant, vec_situations.situation_embedding
+                FROM vec_situations
+                JOIN situations ON situations.id = vec_situations.id
+                JOIN policies ON policies.id = situations.policy_id
+            """
+        )
+        db.execute("DROP TABLE vec_situations")
+        db.execute("DROP TABLE IF EXISTS vec_situations_quantized")
+        create_vector_tables(db, CorpusSettings(dimensions=settings.dimensions))
+        db.execute(
+            "INSERT INTO vec_situations(id, tenant, situation_embedding) SELECT id, tenant, situation_embedding FROM staged_vectors"
+        )
+        db.execute("DROP TABLE temp.staged_vectors")
+    if settings.quantization != "none":
+        quantize_vectors(db, settings)
+
+
+def list_policy_files(policy_path: str) -> list[str]:
+    return sorted(
+        join(policy_path, f) for f in listdir(policy_path) if isfile(join(policy_path, f))
     )
-    serialized_embeddings = [serialize(arr.embedding) for arr in embeddings.data]
-    return serialized_embeddings
 
 
-policyFiles: list[str] = [
-    POLICY_PATH + "/" + f for f in listdir(POLICY_PATH) if isfile(join(POLICY_PATH, f))
-]
-for policy in policyFiles:
-    with open(policy) as data:
+def read_policy_file(policy_root: str, file_path: str) -> PolicyFile:
+    with open(file_path) as data:
         policy_text = data.read()
-        response = client.responses.parse(
-            model="gpt-4o-mini",
-            input=[
-                {
-                    "role": "system",
-                    "content": """
-                    Your job is to take a policy description and produce a variety example situations that would tightly and loosely match fit the policy. 
-                    """,
-                },
-                {
-                    "role": "user",
-                    "content": f"Here is the policy:\n{policy_text}",
-                },
-            ],
-            text_format=PolicyExamples,
+    return PolicyFile(
+        file_path=file_path,
+        policy_path=relpath(file_path, policy_root),
+        full_policy_text=policy_text,
+        content_hash=hashlib.sha256(policy_text.encode("utf-8")).hexdigest(),
+    )
+
+
+def adopt_legacy_policies(db: sqlite3.Connection, policies: list[PolicyFile], tenant: str = DEFAULT_TENANT):
+    """Give migrated `legacy:` policies of `tenant` the path of the file with the same content"""
+    with db:
+        for policy in policies:
+            adopted = db.execute(
+                """
+                    UPDATE policies SET policy_path = ?
+                    WHERE tenant = ? AND policy_path = ?
+                        AND NOT EXISTS (SELECT 1 FROM policies WHERE tenant = ? AND policy_path = ?)
+                """,
+                [policy.policy_path, tenant, f"legacy:{policy.content_hash}", tenant, policy.policy_path],
+            ).rowcount
+            if adopted:
+                logger.info(f"Adopted existing situations for {policy.policy_path}")
+
+
+def plan_ingestion(db: sqlite3.Connection, policies: list[PolicyFile], full: bool = False, tenant: str = DEFAULT_TENANT) -> IngestionPlan:
+    """Compare policy files against the tenant's rows in the policies table to decide what needs (re)ingesting"""
+    adopt_legacy_policies(db, policies, tenant)
+    manifest = dict(db.execute("SELECT policy_path, content_hash FROM policies WHERE tenant = ?", [tenant]))
+    on_disk = {policy.policy_path for policy in policies}
+
+    plan = IngestionPlan(new=[], changed=[], unchanged=[], removed=[])
+    for policy in policies:
+        if policy.policy_path not in manifest:
+            plan.new.append(policy)
+        elif full or manifest[policy.policy_path] != policy.content_hash:
+            plan.changed.append(policy)
+        else:
+            plan.unchanged.append(policy)
+    plan.removed = sorted(set(manifest) - on_disk)
+    return plan
+
+
+def delete_situations(db: sqlite3.Connection, policy_paths: list[str], settings: CorpusSettings, tenant: str = DEFAULT_TENANT):
+    """Delete situations, sections and their embeddings of the given policies of `tenant`. Call inside a transaction."""
+    for policy_path in policy_paths:
+        db.execute(
+            """
+                DELETE FROM vec_sections WHERE id IN (
+                    SELECT policy_sections.id FROM policy_sections
+                    JOIN policies ON policies.id = policy_sections.policy_id
+                    WHERE policies.tenant = ? AND policies.policy_path = ?
+                )
+            """,
+            [tenant, policy_path],
+        )
+        db.execute(
+            "DELETE FROM policy_sections WHERE policy_id IN (SELECT id FROM policies WHERE tenant = ? AND policy_path = ?)",
+            [tenant, policy_path],
+        )
+        for table in settings.vector_tables:
+            db.execute(
+                f"""
+                    DELETE FROM {table} WHERE id IN (
+                        SELECT situations.id FROM situations
+                        JOIN policies ON policies.id = situations.policy_id
+                        WHERE policies.tenant = ? AND policies.policy_path = ?
+                    )
+                """,
+                [tenant, policy_path],
+            )
+        db.execute(
+            "DELETE FROM situations WHERE policy_id IN (SELECT id FROM policies WHERE tenant = ? AND policy_path = ?)",
+            [tenant, policy_path],
+        )
+
+
+def remove_policies(db: sqlite3.Connection, policy_paths: list[str], settings: CorpusSettings, tenant: str = DEFAULT_TENANT):
+    with db:
+        delete_situations(db, policy_paths, settings, tenant)
+        db.executemany("DELETE FROM policies WHERE tenant = ? AND policy_path = ?", [[tenant, p] for p in policy_paths])
+
+
+def insert_vectors(db: sqlite3.Connection, situation_ids: list[int], embeddings: list[bytes], settings: CorpusSettings, tenant: str = DEFAULT_TENANT):
+    rows = [(situation_id, tenant, embedding) for situation_id, embedding in zip(situation_ids, embeddings)]
+    db.executemany("INSERT INTO vec_situations(id, tenant, situation_embedding) VALUES(?, ?, ?)", rows)
+    if settings.quantization != "none":
+        db.executemany(
+            f"INSERT INTO vec_situations_quantized(id, tenant, situation_embedding) VALUES(?, ?, {QUANTIZERS[settings.quantization].format('?')})",
+            rows,
+        )
+
+
+def insert_sections(db: sqlite3.Connection, policy_sections: list[tuple[int, list[PolicySection]]], embeddings: list[bytes]) -> dict[int, bytes]:
+    """Store (policy id, sections) pairs and one embedding per section, in order. Returns the embeddings by section id."""
+    next_id = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM policy_sections").fetchone()[0]
+    rows = []
+    for policy_id, sections in policy_sections:
+        for position, section in enumerate(sections):
+            rows.append((next_id, policy_id, position, section.heading, section.text))
+            next_id += 1
+    db.executemany(
+        "INSERT INTO policy_sections(id, policy_id, position, heading, section_text) VALUES(?, ?, ?, ?, ?)",
+        rows,
+    )
+    vectors = dict(zip([row[0] for row in rows], embeddings))
+    db.executemany("INSERT INTO vec_sections(id, section_embedding) VALUES(?, ?)", vectors.items())
+    return vectors
+
+
+def _read_vectors(db: sqlite3.Connection, table: str, column: str, ids: set[int]) -> dict[int, bytes]:
+    vectors = {}
+    ids = sorted(ids)
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        placeholders = ",".join("?" * len(batch))
+        vectors.update(db.execute(f"SELECT id, {column} FROM {table} WHERE id IN ({placeholders})", batch).fetchall())
+    return vectors
+
+
+def link_sections(
+    db: sqlite3.Connection,
+    policy_ids: list[int],
+    situation_vectors: dict[int, bytes] | None = None,
+    section_vectors: dict[int, bytes] | None = None,
+):
+    """
+    Point every situation of the given policies at its policy's section with the closest
+    embedding. Embeddings not passed in by id are read from the vector tables.
+    """
+    situations, sections = [], {}
+    for start in range(0, len(policy_ids), 500):
+        batch = policy_ids[start:start + 500]
+        placeholders = ",".join("?" * len(batch))
+        situations += db.execute(f"SELECT id, policy_id FROM situations WHERE policy_id IN ({placeholders})", batch).fetchall()
+        for section_id, policy_id in db.execute(f"SELECT id, policy_id FROM policy_sections WHERE policy_id IN ({placeholders})", batch):
+            sections.setdefault(policy_id, []).append(section_id)
+    situations = [(situation_id, policy_id) for situation_id, policy_id in situations if policy_id in sections]
+    if situation_vectors is None:
+        situation_vectors = _read_vectors(db, "vec_situations", "situation_embedding", {row[0] for row in situations})
+    if section_vectors is None:
+        section_vectors = _read_vectors(db, "vec_sections", "section_embedding", {i for ids in sections.values() for i in ids})
+
+    # Every situation is compared with its own policy's sections in a single query
+    for table in ("link_situations", "link_sections"):
+        db.execute(f"CREATE TEMP TABLE IF NOT EXISTS {table}(id INTEGER PRIMARY KEY, policy_id INTEGER NOT NULL, embedding BLOB NOT NULL)")
+    db.execute("CREATE INDEX IF NOT EXISTS temp.link_sections_policy_id ON link_sections(policy_id)")
+    try:
+        db.executemany(
+            "INSERT INTO link_situations(id, policy_id, embedding) VALUES(?, ?, ?)",
+            [(situation_id, policy_id, situation_vectors[situation_id]) for situation_id, policy_id in situations if situation_id in situation_vectors],
+        )
+        db.executemany(
+            "INSERT INTO link_sections(id, policy_id, embedding) VALUES(?, ?, ?)",
+            [(section_id, policy_id, section_vectors[section_id]) for policy_id, ids in sections.items() for section_id in ids],
+        )
+        # With MIN(), SQLite takes the bare section.id from the row with the smallest distance
+        links = db.execute(
+            """
+                SELECT section.id, situation.id, MIN(vec_distance_l2(section.embedding, situation.embedding))
+                FROM link_situations AS situation
+                JOIN link_sections AS section ON section.policy_id = situation.policy_id
+                GROUP BY situation.id
+            """
+        ).fetchall()
+    finally:
+        db.execute("DELETE FROM link_situations")
+        db.execute("DELETE FROM link_sections")
+    db.executemany("UPDATE situations SET section_id = ? WHERE id = ?", [(section_id, situation_id) for section_id, situation_id, _ in links])
+
+
+def insert_policies(
+    db: sqlite3.Connection,
+    policies: list[GeneratedPolicy],
+    embeddings: list[bytes],
+    settings: CorpusSettings,
+    tenant: str = DEFAULT_TENANT,
+    section_embeddings: list[bytes] = (),
+):
+    """
+    Insert a batch of policies of `tenant` with their situation embeddings and, when the
+    policies carry sections, one embedding per section in the same order, in one
+    transaction, replacing the situations and sections of any previous version. A
+    changed policy keeps its id.
+    """
+    with db:
+        delete_situations(db, [p.policy.policy_path for p in policies], settings, tenant)
+
+        now = time.time()
+        policy_ids = {}
+        for generated in policies:
+            policy = generated.policy
+            policy_ids[policy.policy_path] = db.execute(
+                """
+                    INSERT INTO policies(tenant, policy_path, full_policy_text, content_hash, version, ingested_at)
+                    VALUES(?, ?, ?, ?, 1, ?)
+                    ON CONFLICT(tenant, policy_path) DO UPDATE SET
+                        full_policy_text = excluded.full_policy_text,
+                        content_hash = excluded.content_hash,
+                        version = version + 1,
+                        ingested_at = excluded.ingested_at
+                    RETURNING id
+                """,
+                [tenant, policy.policy_path, policy.full_policy_text, policy.content_hash, now],
+            ).fetchone()[0]
+
+        next_id = db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM situations").fetchone()[0]
+        situation_rows = []
+        for generated in policies:
+            for description in generated.situation_descriptions:
+                situation_rows.append((next_id, policy_ids[generated.policy.policy_path], description))
+                next_id += 1
+
+        db.executemany(
+            "INSERT INTO situations(id, policy_id, situation_description) VALUES(?, ?, ?)",
+            situation_rows,
         )
-        situation_descriptions = response.output_parsed.situation_descriptions
-        vectorised_descriptions = vectorise_situation_descriptions(situation_descriptions)
-        newPolicy = Policy(
-            situation_embeddings=vectorised_descriptions,
-            full_policy_text=policy_text,
-            situation_descriptions=situation_descriptions,
+        insert_vectors(db, [row[0] for row in situation_rows], embeddings, settings, tenant)
+
+        sectioned = [(policy_ids[p.policy.policy_path], p.sections) for p in policies if p.sections]
+        if sectioned:
+            section_vectors = insert_sections(db, sectioned, list(section_embeddings))
+            situation_vectors = dict(zip([row[0] for row in situation_rows], embeddings))
+            link_sections(db, [policy_id for policy_id, _ in sectioned], situation_vectors, section_vectors)
+
+
+async def add_missing_sections(db: sqlite3.Connection, client: AsyncOpenAI, settings: CorpusSettings, batch_size: int = MAX_EMBEDDING_INPUTS):
+    """
+    Split, embed and link sections for policies ingested before sections existed, without
+    regenerating their situations.
+    """
+    policies = db.execute(
+        """
+            SELECT id, full_policy_text FROM policies
+            WHERE NOT EXISTS (SELECT 1 FROM policy_sections WHERE policy_sections.policy_id = policies.id)
+        """
+    ).fetchall()
+    sectioned = [(policy_id, sections) for policy_id, text in policies if (sections := split_sections(text))]
+    if not sectioned:
+        return
+    logger.info(f"Adding sections to {len(sectioned)} policies ingested without them")
+
+    async def flush(batch: list[tuple[int, list[PolicySection]]]):
+        texts = [section.text for _, sections in batch for section in sections]
+        embeddings = await vectorise_situation_descriptions(client, texts, settings.dimensions)
+        with db:
+            section_vectors = insert_sections(db, batch, embeddings)
+            link_sections(db, [policy_id for policy_id, _ in batch], section_vectors=section_vectors)
+
+    batch, pending = [], 0
+    for policy_id, sections in sectioned:
+        batch.append((policy_id, sections))
+        pending += len(sections)
+        if pending >= batch_size:
+            await flush(batch)
+            batch, pending = [], 0
+    if batch:
+        await flush(batch)
+
+
+async def generate_situations(client: AsyncOpenAI, policy_text: str) -> list[str]:
+    response = await client.responses.parse(
+        model=GENERATION_MODEL,
+        input=[
+            {
+                "role": "system",
+                "content": """
+                Your job is to take a policy description and produce a variety example situations that would tightly and loosely match fit the policy.
+                """,
+            },
+            {
+                "role": "user",
+                "content": f"Here is the policy:\n{policy_text}",
+            },
+        ],
+        text_format=PolicyExamples,
+    )
+    return response.output_parsed.situation_descriptions
+
+
+async def vectorise_situation_descriptions(client: AsyncOpenAI, descriptions: list[str], dimensions: int = EMBEDDING_DIMENSIONS) -> list[bytes]:
+    """Embed descriptions using as few maximum-size requests as the API limits allow"""
+    requests: list[list[str]] = [[]]
+    tokens = 0
+    for description in descriptions:
+        cost = estimate_tokens(description)
+        if requests[-1] and (len(requests[-1]) >= MAX_EMBEDDING_INPUTS or tokens + cost > MAX_EMBEDDING_TOKENS):
+            requests.append([])
+            tokens = 0
+        requests[-1].append(description)
+        tokens += cost
+
+    responses = await asyncio.gather(
+        *(client.embeddings.create(input=batch, model=EMBEDDING_MODEL, dimensions=dimensions) for batch in requests if batch)
+    )
+    return [
+        serialize(item.embedding)
+        for response in responses
+        for item in sorted(response.data, key=lambda item: item.index)
+    ]
+
+
+class Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.generated = 0
+        self.inserted = 0
+        self.situations = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self, event: str):
+        rate = self.inserted / self.elapsed if self.elapsed else 0.0
+        logger.info(
+            f"{event} | generated {self.generated}/{self.total}, inserted {self.inserted}, "
+            f"failed {self.failed}, {self.situations} situations, {rate:.2f} policies/s"
         )
-        insert_policy(newPolicy)
-        print(f"Inserted policy: {policy_text[:100]}...")
\ No newline at end of file
+
+
+async def ingest(
+    policies: list[PolicyFile],
+    db: sqlite3.Connection,
+    client: AsyncOpenAI,
+    settings: CorpusSettings = CorpusSettings(),
+    concurrency: int = 8,
+    batch_size: int = MAX_EMBEDDING_INPUTS,
+    tenant: str = DEFAULT_TENANT,
+) -> Progress:
+    """
+    Generate, embed and store situations for `policies`, as part of `tenant`'s corpus.
+
+    Situation generation runs on up to `concurrency` policies at once. Finished policies
+    are buffered until they hold `batch_size` situations, then embedded together and
+    written in a single transaction while generation carries on.
+    """
+    progress = Progress(total=len(policies))
+    generated: asyncio.Queue[GeneratedPolicy | None] = asyncio.Queue()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def generate(policy: PolicyFile):
+        async with semaphore:
+            try:
+                descriptions = await generate_situations(client, policy.full_policy_text)
+            except Exception as e:
+                progress.failed += 1
+                logger.error(f"Failed to generate situations for {policy.policy_path}: {str(e)}")
+                return
+        progress.generated += 1
+        await generated.put(GeneratedPolicy(policy, descriptions, split_sections(policy.full_policy_text)))
+
+    async def produce():
+        await asyncio.gather(*(generate(p) for p in policies))
+        await generated.put(None)
+
+    async def flush(batch: list[GeneratedPolicy]):
+        descriptions = [d for policy in batch for d in policy.situation_descriptions]
+        sections = [s.text for policy in batch for s in policy.sections]
+        try:
+            # Sections ride along in the situations' embedding requests
+            embeddings = await vectorise_situation_descriptions(client, descriptions + sections, settings.dimensions)
+            insert_policies(db, batch, embeddings[:len(descriptions)], settings, tenant, embeddings[len(descriptions):])
+        except Exception as e:
+            progress.failed += len(batch)
+            logger.error(f"Failed to embed/insert batch of {len(batch)} policies: {str(e)}")
+            return
+        progress.inserted += len(batch)
+        progress.situations += len(descriptions)
+        progress.report(f"Inserted batch of {len(batch)} policies")
+
+    producer = asyncio.create_task(produce())
+    batch: list[GeneratedPolicy] = []
+    pending = 0
+    while (policy := await generated.get()) is not None:
+        batch.append(policy)
+        pending += len(policy.situation_descriptions) + len(policy.sections)
+        if pending >= batch_size:
+            await flush(batch)
+            batch, pending = [], 0
+    if batch:
+        await flush(batch)
+    await producer
+
+    progress.report(f"Finished in {progress.elapsed:.1f}s")
+    return progress
+
+
+def configure_corpus(db: sqlite3.Connection, dimensions: int | None, quantization: str | None, batch_size: int) -> CorpusSettings:
+    """
+    Apply requested embedding settings to the corpus. A new dimension count re-embeds the
+    stored situations; a new quantization is rebuilt from the stored vectors.
+    """
+    stored = read_corpus_settings(db)
+    settings = CorpusSettings(
+        dimensions=dimensions or stored.dimensions,
+        quantization=quantization or stored.quantization,
+    )
+    partition_vector_tables(db, stored)
+    create_vector_tables(db, stored)
+    if settings.dimensions != stored.dimensions:
+        asyncio.run(reembed_situations(db, AsyncOpenAI(), settings, batch_size=batch_size))
+    elif settings != stored or not db.execute("SELECT 1 FROM corpus_settings").fetchone():
+        quantize_vectors(db, settings)
+    logger.info(f"Corpus uses {settings.dimensions}-dimension embeddings, quantization {settings.quantization}")
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate situations for policy files and load them into the vector database.")
+    parser.add_argument("--policies", default=POLICY_PATH, help="Directory of policy text files")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database to write to")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="Tenant whose corpus --policies replaces; other tenants' policies are untouched")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent situation generation requests")
+    parser.add_argument("--batch-size", type=int, default=MAX_EMBEDDING_INPUTS, help="Situations embedded per batch")
+    parser.add_argument("--full", action="store_true", help="Re-ingest every policy, even unchanged ones")
+    parser.add_argument("--dimensions", type=int, help=f"Embedding dimensions (default: the corpus's current setting, else {EMBEDDING_DIMENSIONS})")
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, help="Quantized first-pass column (default: the corpus's current setting, else none)")
+    parser.add_argument("--publish", action="store_true", help="Build a copy of the database and atomically swap it in when done, instead of writing in place")
+    args = parser.parse_args()
+    if not TENANT_PATTERN.fullmatch(args.tenant):
+        parser.error("--tenant must be 1-64 letters, digits, '_', '.' or '-', starting with a letter or digit")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    load_dotenv()
+
+    db_path = stage_database(args.db) if args.publish else args.db
+    published = False
+    try:
+        run_ingestion(args, db_path)
+        if args.publish:
+            publish_database(db_path, args.db)
+            published = True
+            logger.info(f"Published {args.db}")
+    finally:
+        # A failed or interrupted run leaves the live database as it was
+        if args.publish and not published:
+            discard_staging(db_path)
+
+
+def run_ingestion(args: argparse.Namespace, db_path: str):
+    """Ingest `args.policies` into the database at `db_path`, exiting with status 1 if any policy failed"""
+    progress = None
+    db = connect(db_path)
+    try:
+        setup_schema(db)
+        settings = configure_corpus(db, args.dimensions, args.quantization, batch_size=args.batch_size)
+
+        policies = [read_policy_file(args.policies, f) for f in list_policy_files(args.policies)]
+        plan = plan_ingestion(db, policies, full=args.full, tenant=args.tenant)
+        logger.info(
+            f"{len(plan.new)} new, {len(plan.changed)} changed, {len(plan.unchanged)} unchanged, "
+            f"{len(plan.removed)} removed policies for tenant {args.tenant} in {args.db}"
+        )
+
+        if plan.removed:
+            remove_policies(db, plan.removed, settings, args.tenant)
+            logger.info(f"Removed {len(plan.removed)} policies: {', '.join(plan.removed)}")
+
+        if plan.to_ingest:
+            progress = asyncio.run(
+                ingest(
+                    plan.to_ingest, db, AsyncOpenAI(), settings,
+                    concurrency=args.concurrency, batch_size=args.batch_size, tenant=args.tenant,
+                )
+            )
+        else:
+            logger.info("Nothing to ingest")
+        asyncio.run(add_missing_sections(db, AsyncOpenAI(), settings, batch_size=args.batch_size))
+    finally:
+        db.close()
+
+    if progress is not None and progress.failed:
+        if args.publish:
+            logger.error(f"Not publishing: {progress.failed} policies failed; {args.db} is unchanged")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
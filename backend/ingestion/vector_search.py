@@ -61,6 +61,7 @@ results = db.execute(
         situation_description
       FROM vec_situations
       LEFT JOIN situations ON situations.id = vec_situations.id
+      LEFT JOIN policies ON policies.id = situations.policy_id
       WHERE situation_embedding MATCH ?
         AND k = 1
       ORDER BY distance
@@ -1,7 +1,16 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import time
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1 import processor
 from app.api.v1 import health
+from app.api.v1 import jobs
+from app.db.pool import pool
+from app.db.embeddings import embedding_cache
+from app.utils.metrics import request_seconds, start_request
+from app.utils.processing import job_queue
+from app.utils.warmup import warmup
+from app import config
 import logging
 
 # Configure logging
@@ -15,15 +24,57 @@ logging.basicConfig(
 logging.getLogger("app").setLevel(logging.INFO)
 logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Database, index, embedding cache and OpenAI client warm up in the background;
+    # /ready reports when they're done
+    warmup.start()
+    await job_queue.start()
+    yield
+    await warmup.stop()
+    await job_queue.close()
+    await embedding_cache.close()
+    await pool.close()
+
+
 app = FastAPI(
     title="Incident Report Backend",
     version="0.1.0",
     description="Incident Report Backend for AskEmma take home",
+    lifespan=lifespan,
 )
 
 app.include_router(processor.router)
+app.include_router(jobs.router)
 app.include_router(health.router)
 
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    timings = start_request()
+    response = await call_next(request)
+    # Label by route template rather than raw path to keep the series bounded
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    # Headers go out before a streamed body is generated, so the header only covers the
+    # time to the first byte; the SSE stream ends with a `timing` event covering all of it
+    if config.SERVER_TIMING:
+        response.headers["Server-Timing"] = timings.server_timing()
+    body = response.body_iterator
+
+    async def observed_body():
+        # A streamed request's duration is only known once its body has been sent
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            request_seconds.observe(time.perf_counter() - timings.started, method=request.method, route=route, status=str(response.status_code))
+
+    response.body_iterator = observed_body()
+    return response
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,5 +82,6 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache", "Server-Timing"],
 )
 
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# app.config reads the environment on import, so point every database at a scratch
+# directory before any test module imports the app
+_scratch = tempfile.mkdtemp(prefix="askemma-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+for name, file in (("DB_PATH", "askEmma.sqlite"), ("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite"), ("JOBS_DB_PATH", "jobs.sqlite")):
+    os.environ[name] = os.path.join(_scratch, file)
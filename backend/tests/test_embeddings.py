@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+from app.db import embeddings
+from app.db.embeddings import EmbeddingCache, embedding_space
+
+
+class Embeddings:
+    """Stands in for the OpenAI embeddings API, recording every request"""
+
+    def __init__(self):
+        self.requests: list[dict] = []
+
+    async def create(self, input, model, **options):
+        self.requests.append({"input": input, "model": model, **options})
+        texts = input if isinstance(input, list) else [input]
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(text)), 1.0]) for i, text in enumerate(texts)])
+
+
+def cache(tmp_path, **options) -> EmbeddingCache:
+    return EmbeddingCache(str(tmp_path / "cache.sqlite"), **{"max_entries": 10, "max_rows": 100, "ttl": 60, **options})
+
+
+def test_embedding_space_includes_the_effective_size():
+    assert embedding_space("text-embedding-3-small") == embedding_space("text-embedding-3-small", 1536)
+    assert embedding_space("text-embedding-3-small", 512) != embedding_space("text-embedding-3-small")
+    assert embedding_space("text-embedding-3-large") == "text-embedding-3-large:3072"
+
+
+def test_get_many_reads_memory_then_disk(tmp_path):
+    async def run():
+        first = cache(tmp_path)
+        await first.set_many("m:2", {"a fall": [1.0, 0.0], "a burn": [0.0, 1.0]})
+        assert await first.get_many("m:2", ["A  FALL", "a burn", "a cut"]) == [[1.0, 0.0], [0.0, 1.0], None]
+        assert (first.memory_hits, first.disk_hits, first.misses) == (2, 0, 1)
+        await first.close()
+
+        # A new process only has the persistent tier
+        second = cache(tmp_path)
+        assert await second.get_many("m:2", ["a fall", "a cut", "a fall"]) == [[1.0, 0.0], None, [1.0, 0.0]]
+        assert (second.memory_hits, second.disk_hits, second.misses) == (0, 2, 1)
+        assert await second.get("m:512", "a fall") is None
+        await second.close()
+
+    asyncio.run(run())
+
+
+def test_expired_rows_miss(tmp_path):
+    async def run():
+        first = cache(tmp_path, ttl=-1)
+        await first.set("m:2", "a fall", [1.0, 0.0])
+        await first.close()
+        second = cache(tmp_path, ttl=-1)
+        assert await second.get("m:2", "a fall") is None
+        await second.close()
+
+    asyncio.run(run())
+
+
+def test_embed_many_requests_only_the_missing_texts_once(tmp_path, monkeypatch):
+    api = Embeddings()
+    monkeypatch.setattr(embeddings, "embedding_cache", cache(tmp_path))
+    monkeypatch.setattr(embeddings, "get_client", lambda: SimpleNamespace(embeddings=api))
+
+    async def run():
+        await embeddings.embed("a fall", model="text-embedding-3-small")
+        vectors = await embeddings.embed_many(["a fall", "a burn", "a burn"], model="text-embedding-3-small", dimensions=1536)
+        await embeddings.embedding_cache.close()
+        return vectors
+
+    assert asyncio.run(run()) == [[6.0, 1.0], [6.0, 1.0], [6.0, 1.0]]
+    assert [request["input"] for request in api.requests] == ["a fall", ["a burn"]]
+
+
+def test_embed_and_embed_many_share_entries_at_the_default_size(tmp_path, monkeypatch):
+    api = Embeddings()
+    monkeypatch.setattr(embeddings, "embedding_cache", cache(tmp_path))
+    monkeypatch.setattr(embeddings, "get_client", lambda: SimpleNamespace(embeddings=api))
+
+    async def run():
+        await embeddings.embed("a fall", model="text-embedding-3-small", dimensions=1536)
+        await embeddings.embed_many(["a fall"], model="text-embedding-3-small")
+        await embeddings.embed_many(["a fall"], model="text-embedding-3-small", dimensions=512)
+        await embeddings.embedding_cache.close()
+
+    asyncio.run(run())
+    assert [request.get("dimensions") for request in api.requests] == [1536, 512]
@@ -0,0 +1,54 @@
+import os
+import sys
+import pytest
+from ingestion import ingestion
+from ingestion.ingestion import connect, setup_schema
+
+
+def live_database(tmp_path) -> str:
+    db_path = str(tmp_path / "askEmma.sqlite")
+    db = connect(db_path)
+    setup_schema(db)
+    db.close()
+    return db_path
+
+
+def publish(monkeypatch, db_path: str, run_ingestion):
+    monkeypatch.setattr(sys, "argv", ["ingestion", "--db", db_path, "--publish"])
+    monkeypatch.setattr(ingestion, "run_ingestion", run_ingestion)
+    ingestion.main()
+
+
+def write_to(args, db_path: str):
+    # Leaves the staging file with an open WAL, as a run cut short would
+    db = connect(db_path)
+    db.execute("CREATE TABLE written (id INTEGER)")
+    db.commit()
+    return db
+
+
+@pytest.mark.parametrize("failure", [RuntimeError("embedding request failed"), SystemExit(1), KeyboardInterrupt()])
+def test_failed_publish_removes_the_staging_files(tmp_path, monkeypatch, failure):
+    db_path = live_database(tmp_path)
+    before = open(db_path, "rb").read()
+    connections = []
+
+    def fail(args, staging: str):
+        connections.append(write_to(args, staging))
+        assert os.path.exists(staging + "-wal")
+        raise failure
+
+    with pytest.raises(type(failure)):
+        publish(monkeypatch, db_path, fail)
+    connections[0].close()
+    assert sorted(os.listdir(tmp_path)) == ["askEmma.sqlite"]
+    assert open(db_path, "rb").read() == before
+
+
+def test_publish_swaps_in_the_staging_database(tmp_path, monkeypatch):
+    db_path = live_database(tmp_path)
+    publish(monkeypatch, db_path, lambda args, staging: write_to(args, staging).close())
+    assert sorted(os.listdir(tmp_path)) == ["askEmma.sqlite"]
+    db = connect(db_path)
+    assert db.execute("SELECT COUNT(*) FROM written").fetchone() == (0,)
+    db.close()
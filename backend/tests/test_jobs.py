@@ -0,0 +1,149 @@
+import asyncio
+import time
+import aiosqlite
+import pytest
+from fastapi import HTTPException
+from app.db.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobQueue
+
+
+async def echo(payload: dict) -> dict:
+    return {"echo": payload}
+
+
+def queue(db_path, handler=echo, workers=2, **options) -> JobQueue:
+    return JobQueue(str(db_path), workers=workers, handler=handler, **options)
+
+
+async def rows(db_path) -> dict[str, dict]:
+    async with aiosqlite.connect(db_path) as db:
+        db.row_factory = aiosqlite.Row
+        return {row["id"]: dict(row) for row in await db.execute_fetchall("SELECT * FROM jobs")}
+
+
+def test_job_runs_with_its_inputs_and_drops_them(tmp_path):
+    async def run():
+        jobs = queue(tmp_path / "jobs.sqlite")
+        try:
+            job_id = await jobs.submit({"tenant": "a"}, inputs={"text": "transcript"})
+            assert await jobs.wait(job_id) == {"echo": {"tenant": "a", "text": "transcript"}}
+            job = await jobs.get(job_id)
+            assert job["status"] == SUCCEEDED
+            assert job["attempts"] == 1
+        finally:
+            await jobs.close()
+        async with aiosqlite.connect(tmp_path / "jobs.sqlite") as db:
+            assert await db.execute_fetchall("SELECT * FROM job_inputs") == []
+
+    asyncio.run(run())
+
+
+def test_http_exception_fails_the_job(tmp_path):
+    async def reject(payload: dict) -> dict:
+        raise HTTPException(status_code=422, detail="Unusable transcript")
+
+    async def run():
+        jobs = queue(tmp_path / "jobs.sqlite", handler=reject)
+        try:
+            job_id = await jobs.submit({})
+            with pytest.raises(HTTPException) as raised:
+                await jobs.wait(job_id)
+            assert raised.value.status_code == 422
+            job = await jobs.get(job_id)
+            assert (job["status"], job["status_code"], job["error"]) == (FAILED, 422, "Unusable transcript")
+        finally:
+            await jobs.close()
+
+    asyncio.run(run())
+
+
+def test_job_is_claimed_once(tmp_path):
+    async def run():
+        jobs = queue(tmp_path / "jobs.sqlite", workers=0)
+        try:
+            job_id = await jobs.submit({})
+            claims = await asyncio.gather(jobs._claim(job_id), jobs._claim(job_id))
+            assert sum(claim is not None for claim in claims) == 1
+            assert (await jobs.get(job_id))["status"] == RUNNING
+        finally:
+            await jobs.close()
+
+    asyncio.run(run())
+
+
+def test_running_job_is_only_taken_over_once_its_lease_expires(tmp_path):
+    db_path = tmp_path / "jobs.sqlite"
+    started = asyncio.Event()
+
+    async def hang(payload: dict) -> dict:
+        started.set()
+        await asyncio.Event().wait()
+
+    async def run():
+        first = queue(db_path, handler=hang, lease=60)
+        job_id = await first.submit({"n": 1})
+        await started.wait()
+        await first.close()
+
+        # The lease is still held: another queue leaves the job alone
+        second = queue(db_path, lease=60)
+        await second.start()
+        await second.close()
+        assert (await rows(db_path))[job_id]["status"] == RUNNING
+
+        # Once it has expired the job is requeued and run again
+        async with aiosqlite.connect(db_path) as db:
+            await db.execute("UPDATE jobs SET lease_until = ?", [time.time() - 1])
+            await db.commit()
+        third = queue(db_path, lease=60)
+        try:
+            await third.start()
+            assert await third.wait(job_id) == {"echo": {"n": 1}}
+            job = await third.get(job_id)
+            assert (job["status"], job["attempts"]) == (SUCCEEDED, 2)
+        finally:
+            await third.close()
+
+    asyncio.run(run())
+
+
+def test_recovered_job_fails_after_max_attempts(tmp_path):
+    db_path = tmp_path / "jobs.sqlite"
+
+    async def run():
+        first = queue(db_path, workers=0)
+        job_id = await first.submit({})
+        await first.close()
+        async with aiosqlite.connect(db_path) as db:
+            await db.execute("UPDATE jobs SET status = ?, attempts = 3, lease_until = NULL", [RUNNING])
+            await db.commit()
+
+        second = queue(db_path, max_attempts=3)
+        try:
+            await second.start()
+            with pytest.raises(HTTPException):
+                await second.wait(job_id)
+            assert (await second.get(job_id))["status"] == FAILED
+        finally:
+            await second.close()
+        assert (await rows(db_path))[job_id]["attempts"] == 4
+
+    asyncio.run(run())
+
+
+def test_close_leaves_queued_jobs_to_recover(tmp_path):
+    db_path = tmp_path / "jobs.sqlite"
+
+    async def run():
+        first = queue(db_path, workers=0, lease=0.01)
+        job_id = await first.submit({"n": 2})
+        await first.close()
+        assert (await rows(db_path))[job_id]["status"] == QUEUED
+
+        await asyncio.sleep(0.02)
+        second = queue(db_path)
+        try:
+            assert await second.wait(job_id) == {"echo": {"n": 2}}
+        finally:
+            await second.close()
+
+    asyncio.run(run())
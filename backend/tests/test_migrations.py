@@ -0,0 +1,147 @@
+import sqlite3
+import struct
+
+import pytest
+
+from ingestion.ingestion import DEFAULT_TENANT, configure_corpus, connect, setup_schema
+
+# Schemas of databases written by earlier versions of the ingestion script
+BASELINE = """
+    CREATE TABLE situations (
+      id INTEGER PRIMARY KEY,
+      full_policy_text TEXT,
+      situation_description TEXT
+    );
+"""
+
+MANIFEST = """
+    CREATE TABLE situations (
+      id INTEGER PRIMARY KEY,
+      full_policy_text TEXT,
+      situation_description TEXT,
+      policy_path TEXT
+    );
+    CREATE TABLE policy_manifest (
+      policy_path TEXT PRIMARY KEY,
+      content_hash TEXT NOT NULL,
+      version INTEGER NOT NULL,
+      ingested_at REAL NOT NULL
+    );
+"""
+
+NORMALIZED = """
+    CREATE TABLE policies (
+      id INTEGER PRIMARY KEY,
+      policy_path TEXT NOT NULL UNIQUE,
+      full_policy_text TEXT NOT NULL,
+      content_hash TEXT NOT NULL,
+      version INTEGER NOT NULL,
+      ingested_at REAL NOT NULL
+    );
+    CREATE TABLE situations (
+      id INTEGER PRIMARY KEY,
+      policy_id INTEGER NOT NULL REFERENCES policies(id) ON DELETE CASCADE,
+      situation_description TEXT
+    );
+"""
+
+UNPARTITIONED_VECTORS = """
+    CREATE VIRTUAL TABLE vec_situations USING vec0(
+      id INTEGER PRIMARY KEY,
+      situation_embedding FLOAT[1536]
+    );
+"""
+
+
+def vector(seed: int) -> bytes:
+    return struct.pack("1536f", *([0.0] * seed + [1.0] + [0.0] * (1535 - seed)))
+
+
+def build(db_path, schema: str, rows: list[tuple], insert: str):
+    db = connect(db_path)
+    db.executescript(schema + UNPARTITIONED_VECTORS)
+    with db:
+        db.executemany(insert, rows)
+        db.executemany("INSERT INTO vec_situations(id, situation_embedding) VALUES(?, ?)", [(row[0], vector(row[0])) for row in rows])
+    db.close()
+
+
+def migrate(db_path) -> sqlite3.Connection:
+    db = connect(db_path)
+    setup_schema(db)
+    configure_corpus(db, None, None, batch_size=100)
+    return db
+
+
+def assert_current_schema(db: sqlite3.Connection, situations: int):
+    tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master")}
+    assert {"policies", "situations", "policy_sections", "corpus_settings", "fts_situations", "fts_policies"} <= tables
+    assert "legacy_situations" not in tables and "policy_manifest" not in tables
+    assert "section_id" in {row[1] for row in db.execute("PRAGMA table_info(situations)")}
+    assert db.execute("PRAGMA foreign_key_check").fetchall() == []
+    vectors = db.execute("SELECT id, tenant FROM vec_situations ORDER BY id").fetchall()
+    assert vectors == [(i, DEFAULT_TENANT) for i in range(1, situations + 1)]
+
+
+def test_migrates_baseline_database(tmp_path):
+    db_path = str(tmp_path / "legacy.sqlite")
+    rows = [(1, "Fire policy", "smoke in the kitchen"), (2, "Fire policy", "alarm going off"), (3, "Flood policy", "water on the floor")]
+    build(db_path, BASELINE, rows, "INSERT INTO situations(id, full_policy_text, situation_description) VALUES(?, ?, ?)")
+
+    db = migrate(db_path)
+    assert_current_schema(db, situations=3)
+    policies = db.execute("SELECT tenant, policy_path, full_policy_text FROM policies ORDER BY id").fetchall()
+    assert [(tenant, text) for tenant, _, text in policies] == [(DEFAULT_TENANT, "Fire policy"), (DEFAULT_TENANT, "Flood policy")]
+    assert all(path.startswith("legacy:") for _, path, _ in policies)
+    linked = db.execute(
+        "SELECT situations.id, full_policy_text FROM situations JOIN policies ON policies.id = situations.policy_id ORDER BY situations.id"
+    ).fetchall()
+    assert linked == [(1, "Fire policy"), (2, "Fire policy"), (3, "Flood policy")]
+    # Full-text indexes were built over the migrated rows
+    assert db.execute("SELECT rowid FROM fts_situations WHERE fts_situations MATCH 'kitchen'").fetchall() == [(1,)]
+    db.close()
+
+
+def test_migrates_manifest_database(tmp_path):
+    db_path = str(tmp_path / "manifest.sqlite")
+    rows = [(1, "Fire policy", "smoke", "fire.md"), (2, "Flood policy", "water", "flood.md")]
+    build(db_path, MANIFEST, rows, "INSERT INTO situations(id, full_policy_text, situation_description, policy_path) VALUES(?, ?, ?, ?)")
+    db = sqlite3.connect(db_path)
+    with db:
+        db.execute("INSERT INTO policy_manifest VALUES('fire.md', 'x', 3, 0)")
+    db.close()
+
+    db = migrate(db_path)
+    assert_current_schema(db, situations=2)
+    assert db.execute("SELECT policy_path, version FROM policies ORDER BY policy_path").fetchall() == [("fire.md", 3), ("flood.md", 1)]
+    db.close()
+
+
+def test_moves_untenanted_policies_into_default_tenant(tmp_path):
+    db_path = str(tmp_path / "normalized.sqlite")
+    db = connect(db_path)
+    db.executescript(NORMALIZED + UNPARTITIONED_VECTORS)
+    with db:
+        db.execute("INSERT INTO policies VALUES(7, 'fire.md', 'Fire policy', 'x', 2, 0)")
+        db.executemany("INSERT INTO situations(id, policy_id, situation_description) VALUES(?, 7, ?)", [(1, "smoke"), (2, "alarm")])
+        db.executemany("INSERT INTO vec_situations(id, situation_embedding) VALUES(?, ?)", [(1, vector(1)), (2, vector(2))])
+    db.close()
+
+    db = migrate(db_path)
+    assert_current_schema(db, situations=2)
+    assert db.execute("SELECT id, tenant, policy_path, version FROM policies").fetchall() == [(7, DEFAULT_TENANT, "fire.md", 2)]
+    assert db.execute("SELECT COUNT(*) FROM situations WHERE policy_id = 7").fetchone() == (2,)
+    db.close()
+
+
+@pytest.mark.parametrize("schema", ["baseline", "current"])
+def test_setup_schema_is_idempotent(tmp_path, schema):
+    db_path = str(tmp_path / "db.sqlite")
+    if schema == "baseline":
+        build(db_path, BASELINE, [(1, "Fire policy", "smoke")], "INSERT INTO situations(id, full_policy_text, situation_description) VALUES(?, ?, ?)")
+    migrate(db_path).close()
+    db = migrate(db_path)
+    before = db.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+    setup_schema(db)
+    assert db.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == before
+    db.close()
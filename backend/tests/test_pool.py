@@ -0,0 +1,69 @@
+import asyncio
+import sqlite3
+import pytest
+from app.db.pool import ConnectionPool
+
+
+class CountingPool(ConnectionPool):
+    """Counts the health checks run on checkout"""
+
+    checks = 0
+
+    async def _is_healthy(self, conn) -> bool:
+        self.checks += 1
+        return await super()._is_healthy(conn)
+
+
+def database(tmp_path) -> str:
+    db_path = str(tmp_path / "askEmma.sqlite")
+    sqlite3.connect(db_path).close()
+    return db_path
+
+
+def test_recently_used_connections_are_not_checked(tmp_path):
+    async def run():
+        pool = CountingPool(database(tmp_path), size=1, timeout=1, idle_check=60)
+        try:
+            for _ in range(3):
+                async with pool.acquire() as conn:
+                    await conn.execute("SELECT 1")
+            return pool.checks
+        finally:
+            await pool.close()
+
+    assert asyncio.run(run()) == 0
+
+
+def test_idle_connections_are_checked(tmp_path):
+    async def run():
+        pool = CountingPool(database(tmp_path), size=1, timeout=1, idle_check=0.01)
+        try:
+            async with pool.acquire():
+                pass
+            await asyncio.sleep(0.02)
+            async with pool.acquire():
+                pass
+            return pool.checks
+        finally:
+            await pool.close()
+
+    assert asyncio.run(run()) == 1
+
+
+def test_connection_returned_after_an_error_is_checked_and_replaced(tmp_path):
+    async def run():
+        pool = CountingPool(database(tmp_path), size=1, timeout=1, idle_check=60)
+        try:
+            with pytest.raises(ValueError):
+                async with pool.acquire() as broken:
+                    # Closing the connection under the pool is the failure its check must catch
+                    await broken.close()
+                    await broken.execute("SELECT 1")
+            async with pool.acquire() as conn:
+                async with conn.execute("SELECT 1") as cur:
+                    assert tuple(await cur.fetchone()) == (1,)
+            return pool.checks, conn is broken
+        finally:
+            await pool.close()
+
+    assert asyncio.run(run()) == (1, False)
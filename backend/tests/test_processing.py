@@ -0,0 +1,85 @@
+import asyncio
+from typing import Optional
+import pytest
+from fastapi import HTTPException
+from app.schemas import PolicySelection
+from app.utils import processing
+
+POLICIES = [
+    {"id": 1, "situation_description": "Fall", "full_policy_text": "Falls policy"},
+    {"id": 2, "situation_description": "Medication", "full_policy_text": "Medication policy"},
+]
+
+
+class Parts:
+    """Stands in for the part agents: selection answers with `selected` (None fails), every other part waits to be released"""
+
+    def __init__(self, monkeypatch, selected: Optional[list[str]]):
+        self.selected = selected
+        self.started: list[tuple[str, str]] = []
+        self.cancelled: list[str] = []
+        self.release = asyncio.Event()
+        monkeypatch.setattr(processing, "_run_part", self.run)
+        monkeypatch.setattr(processing, "create_part_agents", lambda: dict.fromkeys(("policies", "report", "reasoning")))
+
+    async def run(self, part: str, agent, prompt: str, tenant: str):
+        if part == "policies":
+            await asyncio.sleep(0)
+            if self.selected is None:
+                raise RuntimeError("model unavailable")
+            return PolicySelection(policy_ids=self.selected)
+        self.started.append((part, prompt))
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled.append(part)
+            raise
+        return part
+
+
+def test_parts_run_during_selection_and_are_kept_when_every_policy_applies(monkeypatch):
+    parts = Parts(monkeypatch, ["1", "2"])
+
+    async def run():
+        result = await processing.plan_parts("Carer: she fell.", "", "prompt with both", POLICIES, None, "default")
+        assert [part for part, _ in parts.started] == ["report", "reasoning"]
+        parts.release.set()
+        await asyncio.gather(*result.tasks.values())
+        return result
+
+    result = asyncio.run(run())
+    assert result.policy_ids == ["1", "2"]
+    assert result.prompt == "prompt with both"
+    assert parts.cancelled == []
+
+
+def test_parts_restart_with_the_policies_that_apply(monkeypatch):
+    parts = Parts(monkeypatch, ["2"])
+
+    async def run():
+        result = await processing.plan_parts("Carer: she fell.", "", "prompt with both", POLICIES, None, "default")
+        assert parts.cancelled == ["report", "reasoning"]
+        processing.run_parts(result, "default")
+        parts.release.set()
+        await asyncio.gather(*result.tasks.values())
+        return result
+
+    result = asyncio.run(run())
+    assert result.policy_ids == ["2"]
+    assert "Medication policy" in result.prompt and "Falls policy" not in result.prompt
+    assert [prompt for _, prompt in parts.started[2:]] == [result.prompt] * 2
+
+
+@pytest.mark.parametrize("selected", [[], None])
+def test_parts_are_cancelled_when_no_policy_applies_or_selection_fails(monkeypatch, selected):
+    parts = Parts(monkeypatch, selected)
+
+    async def run():
+        return await processing.plan_parts("Carer: she fell.", "", "prompt with both", POLICIES, None, "default")
+
+    if selected is None:
+        with pytest.raises(HTTPException):
+            asyncio.run(run())
+    else:
+        assert asyncio.run(run()) is None
+    assert sorted(parts.cancelled) == ["reasoning", "report"]
@@ -0,0 +1,41 @@
+from app import config
+from app.db.db import merge_results, reciprocal_rank_fusion
+
+
+def row(policy_id: int, distance=None, situation: int = 0) -> dict:
+    return {"id": situation or policy_id, "policy_id": policy_id, "distance": distance}
+
+
+def test_rank_fusion_favours_policies_ranked_well_in_both_lists(monkeypatch):
+    monkeypatch.setattr(config, "RRF_K", 60)
+    vector = [row(1, 0.1), row(2, 0.2), row(3, 0.3)]
+    lexical = [row(2), row(5), row(6)]
+    fused = reciprocal_rank_fusion([vector, lexical], k=10)
+    # Ties keep the order policies were first seen in
+    assert [r["policy_id"] for r in fused] == [2, 1, 5, 3, 6]
+
+
+def test_rank_fusion_keeps_the_first_list_row_and_cuts_at_k():
+    vector = [row(1, 0.1), row(2, 0.2)]
+    lexical = [row(2), row(1), row(5)]
+    fused = reciprocal_rank_fusion([vector, lexical], k=2)
+    assert [(r["policy_id"], r["distance"]) for r in fused] == [(1, 0.1), (2, 0.2)]
+
+
+def test_rank_fusion_of_one_list_keeps_its_order():
+    lexical = [row(4), row(9), row(1)]
+    assert reciprocal_rank_fusion([lexical], k=10) == lexical
+    assert reciprocal_rank_fusion([], k=10) == []
+
+
+def test_merge_results_keeps_each_policys_closest_situation():
+    first = [row(1, 0.4, situation=10), row(2, 0.5, situation=20)]
+    second = [row(1, 0.2, situation=11), row(3, 0.3, situation=30)]
+    merged = merge_results([first, second], k=10)
+    assert [(r["policy_id"], r["id"], r["distance"]) for r in merged] == [(1, 11, 0.2), (3, 30, 0.3), (2, 20, 0.5)]
+
+
+def test_merge_results_cuts_at_k():
+    results = [[row(policy, policy / 10) for policy in range(1, 6)], [row(6, 0.05)]]
+    assert [r["policy_id"] for r in merge_results(results, k=3)] == [6, 1, 2]
+    assert merge_results([], k=3) == []
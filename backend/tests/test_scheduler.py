@@ -0,0 +1,101 @@
+import asyncio
+
+from app.utils.scheduler import BATCH, INTERACTIVE, RequestScheduler, TokenBucket, lane, parse_duration
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)  # one unit per second
+    assert bucket.wait_time(60, now=bucket.updated) == 0
+    bucket.take(60, now=bucket.updated)
+    assert bucket.wait_time(1, now=bucket.updated) == 1
+    assert bucket.wait_time(1, now=bucket.updated + 1) == 0
+
+
+def test_token_bucket_caps_requests_at_capacity():
+    bucket = TokenBucket(10)
+    # A request larger than the whole bucket waits for a full bucket, not forever
+    assert bucket.wait_time(1000, now=bucket.updated) == 0
+    bucket.take(1000, now=bucket.updated)
+    assert bucket.level == 0
+
+
+def test_token_bucket_limit_never_raises_level():
+    bucket = TokenBucket(100)
+    bucket.limit(5, now=bucket.updated)
+    assert bucket.level == 5
+    bucket.limit(50, now=bucket.updated)
+    assert bucket.level == 5
+
+
+def test_parse_duration():
+    assert parse_duration("20ms") == 0.02
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("1.5s") == 1.5
+    assert parse_duration("") is None
+
+
+def test_zero_limits_admit_everything():
+    async def run():
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, max_concurrency=0)
+        await asyncio.wait_for(asyncio.gather(*(scheduler.acquire(10) for _ in range(50))), timeout=1)
+        return scheduler.active
+
+    assert asyncio.run(run()) == 50
+
+
+def test_concurrency_cap_admits_on_release():
+    async def run():
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, max_concurrency=1)
+        await scheduler.acquire(1)
+        second = asyncio.ensure_future(scheduler.acquire(1))
+        await asyncio.sleep(0)
+        waiting = not second.done()
+        scheduler.release()
+        await asyncio.wait_for(second, timeout=1)
+        return waiting, scheduler.active
+
+    assert asyncio.run(run()) == (True, 1)
+
+
+def test_interactive_lane_is_admitted_first():
+    async def run():
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, max_concurrency=1)
+        await scheduler.acquire(1)
+        order = []
+
+        async def request(name):
+            with lane(name):
+                order.append(await scheduler.acquire(1))
+            scheduler.release()
+
+        tasks = [asyncio.ensure_future(request(BATCH)), asyncio.ensure_future(request(INTERACTIVE))]
+        await asyncio.sleep(0)
+        scheduler.release()
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=1)
+        return order
+
+    assert asyncio.run(run()) == [INTERACTIVE, BATCH]
+
+
+def test_rate_limit_response_pauses_requests():
+    async def run():
+        scheduler = RequestScheduler(requests_per_minute=0, tokens_per_minute=0, max_concurrency=0)
+        scheduler.observe(INTERACTIVE, 429, {"retry-after-ms": "100"})
+        started = asyncio.get_running_loop().time()
+        await asyncio.wait_for(scheduler.acquire(1), timeout=1)
+        return asyncio.get_running_loop().time() - started
+
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_requests_per_minute_delays_the_next_request():
+    async def run():
+        scheduler = RequestScheduler(requests_per_minute=600, tokens_per_minute=0, max_concurrency=0)
+        scheduler.requests.level = 1
+        await scheduler.acquire(1)
+        started = asyncio.get_running_loop().time()
+        await asyncio.wait_for(scheduler.acquire(1), timeout=1)
+        return asyncio.get_running_loop().time() - started
+
+    # 600 per minute refills one request every 0.1s
+    assert asyncio.run(run()) >= 0.09
@@ -0,0 +1,180 @@
+import asyncio
+import io
+import random
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from app import config
+from app.schemas import TranscriptNotes
+from app.utils import processing, transcripts
+from app.utils.transcripts import Segmenter, compact_transcript, condense_pieces, segment
+
+
+def transcript(lines: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = "the carer said she found him on the floor by the bed and called the nurse at once".split()
+    speakers = ("Carer", "Nurse", "Service user")
+    return "\n".join(
+        f"{rng.choice(speakers)}: {' '.join(rng.choices(words, k=rng.randint(3, 30)))}." + ("\n" if rng.random() < 0.1 else "")
+        for _ in range(lines)
+    )
+
+
+def upload(text: str) -> UploadFile:
+    return UploadFile(io.BytesIO(text.encode()), filename="transcript.txt", headers=Headers({"content-type": "text/plain"}))
+
+
+class SummaryModel:
+    """Stands in for the summary model: every chunk becomes one incident naming its part"""
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.running = 0
+        self.peak = 0
+
+    async def extract_notes(self, chunk: str, part: int) -> TranscriptNotes:
+        self.chunks.append(chunk)
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.001)
+        self.running -= 1
+        return TranscriptNotes(incidents=[f"incident {part}"], details=[])
+
+
+@pytest.fixture
+def model(monkeypatch) -> SummaryModel:
+    model = SummaryModel()
+    monkeypatch.setattr(transcripts, "extract_notes", model.extract_notes)
+    monkeypatch.setattr(config, "TRANSCRIPT_CHUNK_TOKENS", 250)
+    monkeypatch.setattr(config, "TRANSCRIPT_CONDENSE_TOKENS", 1000)
+    monkeypatch.setattr(config, "TRANSCRIPT_MAP_CONCURRENCY", 2)
+    return model
+
+
+def compacted(text: str) -> str:
+    return compact_transcript("", text).file_text
+
+
+def test_compaction_drops_scaffolding_and_filler():
+    text = """WEBVTT
+
+1
+00:00:01.000 --> 00:00:03.000
+Carer: Hello.
+
+2
+00:00:03.000 --> 00:00:06.000
+Carer: Um, she fell  by the bed, uh, at 14:05:00.
+Nurse: [00:07] Is she hurt?
+Nurse: Is she hurt?
+Carer: Hello.
+"""
+    assert compacted(text) == "Carer: Hello. she fell by the bed, at 14:05:00.\nNurse: Is she hurt?"
+
+
+def test_compaction_merges_consecutive_lines_of_one_speaker():
+    assert compacted("Carer: She fell.\nCarer: I called the nurse.\nNurse: Noted.") == (
+        "Carer: She fell. I called the nurse.\nNurse: Noted."
+    )
+
+
+def test_compaction_keeps_numbers_that_are_not_cue_numbers():
+    assert compacted("Nurse: Which room?\n12\nNurse: Thanks.") == "Nurse: Which room?\n12\nNurse: Thanks."
+
+
+@pytest.mark.parametrize("heading", ["Note", "Action", "Re", "NB", "Action point", "Date"])
+def test_note_headings_are_not_speakers(heading):
+    text = f"{heading}: check her hip.\n{heading}: call her son.\nCarer: Done."
+    assert compacted(text) == f"{heading}: check her hip.\n{heading}: call her son.\nCarer: Done."
+
+
+def test_pasted_copy_of_the_upload_is_dropped():
+    upload = transcript(50)
+    compaction = compact_transcript(upload.replace("\n\n", "\n") + "\nCarer: And one more thing.", upload)
+    assert compaction.file_text == ""
+    assert compaction.textarea_text.endswith("And one more thing.")
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_segmenter_cuts_the_chunks_segment_does(seed):
+    text = transcript(400, seed)
+    rng = random.Random(seed)
+    segmenter = Segmenter(500)
+    chunks = []
+    start = 0
+    while start < len(text):
+        size = rng.randint(1, 700)
+        chunks += segmenter.feed(text[start:start + size])
+        start += size
+    chunks += segmenter.finish()
+    assert chunks == segment(text, 500)
+    assert all(len(chunk) <= 500 for chunk in chunks)
+
+
+def test_condense_pieces_condenses_as_the_pieces_arrive(model):
+    text = transcript(400)
+    read = 0
+
+    async def pieces():
+        nonlocal read
+        for start in range(0, len(text), 300):
+            read += 1
+            yield text[start:start + 300]
+
+    async def run():
+        return await condense_pieces(pieces())
+
+    condensed = asyncio.run(run())
+    assert condensed.chunks == len(model.chunks) > 1
+    assert condensed.incidents == [f"incident {part}" for part in range(1, len(model.chunks) + 1)]
+    assert model.peak <= config.TRANSCRIPT_MAP_CONCURRENCY
+    assert read == -(-len(text) // 300)
+    assert model.chunks == [transcripts.compact_transcript("", chunk).file_text for chunk in segment(text, 1000)]
+
+
+def test_failed_chunk_stops_reading(model, monkeypatch):
+    read = 0
+
+    async def fail(chunk: str, part: int) -> TranscriptNotes:
+        raise RuntimeError("model unavailable")
+
+    async def pieces():
+        nonlocal read
+        for line in transcript(2000).splitlines(keepends=True):
+            read += 1
+            yield line
+
+    monkeypatch.setattr(transcripts, "extract_notes", fail)
+    with pytest.raises(RuntimeError):
+        asyncio.run(condense_pieces(pieces()))
+    assert read < 2000
+
+
+def test_read_transcript_condenses_long_uploads(model):
+    text = transcript(2000)
+
+    async def run():
+        return await processing.read_transcript("Pasted note about the fall.", upload(text))
+
+    textarea_text, file_text, condensed = asyncio.run(run())
+    assert (textarea_text, file_text) == ("", "")
+    assert condensed.chunks > 1
+    assert model.chunks[0].startswith("Pasted note about the fall.")
+
+
+def test_read_transcript_reads_short_uploads_whole(model):
+    async def run():
+        return await processing.read_transcript("", upload(transcript(20)))
+
+    _, file_text, condensed = asyncio.run(run())
+    assert condensed is None
+    assert file_text.startswith(("Carer:", "Nurse:", "Service user:"))
+    assert model.chunks == []
+
+
+def test_read_transcript_rejects_oversized_uploads_while_condensing(model, monkeypatch):
+    monkeypatch.setattr("app.utils.file_processing.MAX_BYTES", 50_000)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(processing.read_transcript("", upload(transcript(5000))))
+    assert raised.value.status_code == 413
@@ -0,0 +1,58 @@
+import asyncio
+import struct
+
+import pytest
+
+from app.db.vector_index import VectorIndex
+from ingestion.ingestion import CorpusSettings, connect, create_vector_tables, insert_vectors, publish_database, setup_schema
+
+pytest.importorskip("numpy")
+
+SETTINGS = CorpusSettings(dimensions=4)
+
+
+def build_corpus(db_path, policies: dict[str, list[list[float]]], tenant: str = "default"):
+    """One policy per name with one situation per vector"""
+    db = connect(db_path)
+    setup_schema(db)
+    create_vector_tables(db, SETTINGS)
+    with db:
+        for name, vectors in policies.items():
+            policy_id = db.execute(
+                "INSERT INTO policies(tenant, policy_path, full_policy_text, content_hash, version, ingested_at) VALUES(?, ?, ?, '', 1, 0)",
+                [tenant, name, f"{name} text"],
+            ).lastrowid
+            ids = [
+                db.execute("INSERT INTO situations(policy_id, situation_description) VALUES(?, ?)", [policy_id, f"{name} {i}"]).lastrowid
+                for i in range(len(vectors))
+            ]
+            insert_vectors(db, ids, [struct.pack("4f", *v) for v in vectors], SETTINGS, tenant)
+    db.close()
+
+
+def test_search_returns_nearest_policy_per_tenant(tmp_path):
+    db_path = str(tmp_path / "corpus.sqlite")
+    build_corpus(db_path, {"fire": [[1, 0, 0, 0], [0.9, 0.1, 0, 0]], "flood": [[0, 1, 0, 0]]})
+    index = VectorIndex(db_path, refresh_interval=0)
+
+    results = asyncio.run(index.search([1, 0, 0, 0], k=5))
+    assert [r["full_policy_text"] for r in results] == ["fire text", "flood text"]
+    assert results[0]["distance"] == pytest.approx(0)
+    assert asyncio.run(index.search([1, 0, 0, 0], k=5, tenant="other")) == []
+
+
+def test_reloads_after_publish_swap(tmp_path):
+    db_path = str(tmp_path / "corpus.sqlite")
+    build_corpus(db_path, {"fire": [[1, 0, 0, 0]]})
+    index = VectorIndex(db_path, refresh_interval=0)
+
+    async def run():
+        before = await index.search([1, 0, 0, 0], k=5)
+        staging = str(tmp_path / "corpus.sqlite.next")
+        build_corpus(staging, {"flood": [[1, 0, 0, 0]]})
+        publish_database(staging, db_path)
+        return before, await index.search([1, 0, 0, 0], k=5)
+
+    before, after = asyncio.run(run())
+    assert [r["full_policy_text"] for r in before] == ["fire text"]
+    assert [r["full_policy_text"] for r in after] == ["flood text"]